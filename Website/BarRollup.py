@@ -0,0 +1,199 @@
+"""
+Weekly and monthly price bars maintained at ingest time.
+
+bars_weekly and bars_monthly hold one open/high/low/close/volume/turnover bar per issuer and
+week (Monday..Sunday) or calendar month. DatabaseManager.write_rows refreshes the buckets
+touched by every batch in the same transaction as the daily prices, by re-aggregating just
+those buckets from stock_prices, so the bars are always consistent with the daily rows
+(replaced days included). Analysis reads the bars instead of resampling all daily history.
+Rows inserted through the stock_data compatibility view bypass write_rows; its trigger
+records their days in bars_stale, and DatabaseManager re-aggregates those buckets the next
+time it opens the database (refresh_stale_bars).
+
+Buckets are numbered as weeks since the week of 1970-01-01 and months since January 1970.
+Bars are labelled with the Sunday ending the week or the last day of the month, the labels of
+DataFrame.resample('W' / 'ME'); IndicatorEngine.resample_bars builds the same bars in memory.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+BAR_TABLES = {'weekly': 'bars_weekly', 'monthly': 'bars_monthly'}
+
+# Days written through the stock_data view whose buckets haven't been re-aggregated yet
+STALE_TABLE = 'bars_stale'
+
+# Columns of the loaded bars; close is named like the daily price so indicators run on either
+BAR_COLUMNS = ['issuer_code', 'Date', 'Open', 'Last Trade Price', 'Max', 'Min', 'Volume',
+               'Turnover in BEST (denars)']
+
+BAR_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        issuer_id INTEGER NOT NULL REFERENCES issuers (issuer_id),
+        bucket INTEGER NOT NULL,
+        first_day INTEGER NOT NULL,
+        last_day INTEGER NOT NULL,
+        trading_days INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        turnover REAL,
+        PRIMARY KEY (issuer_id, bucket)
+    ) WITHOUT ROWID
+'''
+
+# Re-aggregates the buckets listed in temp.bar_refresh; each one is a range scan of stock_prices
+REFRESH_BARS = '''
+    INSERT OR REPLACE INTO {table}
+    SELECT
+        r.issuer_id, r.bucket, MIN(p.day), MAX(p.day), COUNT(*),
+        (SELECT o.last_trade_price FROM stock_prices o
+         WHERE o.issuer_id = r.issuer_id AND o.day BETWEEN r.first_day AND r.last_day
+           AND o.last_trade_price IS NOT NULL
+         ORDER BY o.day LIMIT 1),
+        MAX(p.max_price), MIN(p.min_price),
+        (SELECT c.last_trade_price FROM stock_prices c
+         WHERE c.issuer_id = r.issuer_id AND c.day BETWEEN r.first_day AND r.last_day
+           AND c.last_trade_price IS NOT NULL
+         ORDER BY c.day DESC LIMIT 1),
+        TOTAL(p.volume), TOTAL(p.turnover)
+    FROM temp.bar_refresh r
+    CROSS JOIN stock_prices p ON p.issuer_id = r.issuer_id AND p.day BETWEEN r.first_day AND r.last_day
+    GROUP BY r.issuer_id, r.bucket
+'''
+
+
+def day_buckets(days: np.ndarray, period: str) -> np.ndarray:
+    """Bucket number of every epoch day."""
+    days = np.asarray(days, dtype=np.int64)
+    if period == 'weekly':
+        # Epoch day 3 (1970-01-04) is a Sunday; weeks run Monday..Sunday
+        return (days + 3) // 7
+    if period == 'monthly':
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    raise ValueError("Invalid period. Must be 'weekly' or 'monthly'.")
+
+
+def bucket_first_days(buckets: np.ndarray, period: str) -> np.ndarray:
+    buckets = np.asarray(buckets, dtype=np.int64)
+    if period == 'weekly':
+        return buckets * 7 - 3
+    return buckets.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+
+
+def bucket_last_days(buckets: np.ndarray, period: str) -> np.ndarray:
+    """Last day of every bucket, which is also its label."""
+    return bucket_first_days(np.asarray(buckets, dtype=np.int64) + 1, period) - 1
+
+
+def bucket_labels(buckets: np.ndarray, period: str) -> np.ndarray:
+    """Bar dates as datetime64[ns], the type of the Date columns."""
+    return bucket_last_days(buckets, period).astype('datetime64[D]').astype('datetime64[ns]')
+
+
+def create_bar_tables(cursor):
+    for table in BAR_TABLES.values():
+        cursor.execute(BAR_SCHEMA.format(table=table))
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {STALE_TABLE} (
+            issuer_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            PRIMARY KEY (issuer_id, day)
+        ) WITHOUT ROWID
+    ''')
+
+
+def has_bar_tables(conn) -> bool:
+    return conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)", tuple(BAR_TABLES.values())
+    ).fetchone()[0] == len(BAR_TABLES)
+
+
+def refresh_bars(conn, issuer_ids: np.ndarray, days: np.ndarray):
+    """
+    Re-aggregate the weekly and monthly buckets containing the given (issuer_id, day) pairs.
+    Runs inside the caller's transaction.
+    """
+    if len(days) == 0:
+        return
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS bar_refresh "
+        "(issuer_id INTEGER, bucket INTEGER, first_day INTEGER, last_day INTEGER, PRIMARY KEY (issuer_id, bucket))"
+    )
+    issuer_ids = np.asarray(issuer_ids, dtype=np.int64).tolist()
+    for period, table in BAR_TABLES.items():
+        touched_ids, buckets = zip(*sorted(set(zip(issuer_ids, day_buckets(days, period).tolist()))))
+        conn.execute("DELETE FROM temp.bar_refresh")
+        conn.executemany("INSERT INTO temp.bar_refresh VALUES (?, ?, ?, ?)", zip(
+            touched_ids, buckets,
+            bucket_first_days(buckets, period).tolist(), bucket_last_days(buckets, period).tolist()
+        ))
+        conn.execute(REFRESH_BARS.format(table=table))
+    conn.execute("DELETE FROM temp.bar_refresh")
+
+
+def refresh_stale_bars(conn) -> int:
+    """Re-aggregate the buckets of the days listed in bars_stale and clear it; returns the days."""
+    stale = conn.execute(f"SELECT issuer_id, day FROM {STALE_TABLE}").fetchall()
+    if stale:
+        pairs = np.array(stale, dtype=np.int64)
+        refresh_bars(conn, pairs[:, 0], pairs[:, 1])
+        conn.execute(f"DELETE FROM {STALE_TABLE}")
+    return len(stale)
+
+
+def rebuild_bars(conn):
+    """Recompute every bar from stock_prices (used once for databases that predate the bar tables)."""
+    days = conn.execute("SELECT issuer_id, day FROM stock_prices").fetchall()
+    for table in BAR_TABLES.values():
+        conn.execute(f"DELETE FROM {table}")
+    if days:
+        pairs = np.array(days, dtype=np.int64)
+        refresh_bars(conn, pairs[:, 0], pairs[:, 1])
+
+
+def load_bars(conn, period: str, starts: Optional[Dict[str, Optional[pd.Timestamp]]] = None) -> pd.DataFrame:
+    """
+    Load the bars of a period sorted by (issuer_code, Date), with the columns of BAR_COLUMNS.
+    With starts ({issuer_code: start date or None for the full history}) only those issuers
+    are loaded, each from the bucket containing its start date.
+    """
+    table = BAR_TABLES[period]
+    query = f'''
+    SELECT
+        i.issuer_code,
+        b.bucket,
+        b.open AS "Open",
+        b.close AS "Last Trade Price",
+        b.high AS "Max",
+        b.low AS "Min",
+        b.volume AS "Volume",
+        b.turnover AS "Turnover in BEST (denars)"
+    '''
+    if starts is None:
+        query += f'''
+    FROM {table} b
+    JOIN issuers i ON i.issuer_id = b.issuer_id
+    ORDER BY i.issuer_code, b.bucket
+    '''
+    else:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS bar_window (issuer_code TEXT PRIMARY KEY, start_bucket INTEGER)")
+        conn.execute("DELETE FROM temp.bar_window")
+        windows = []
+        for issuer, start in starts.items():
+            start_day = None if start is None else np.datetime64(start, 'D').astype(np.int64)
+            windows.append((issuer, None if start_day is None else int(day_buckets([start_day], period)[0])))
+        conn.executemany("INSERT INTO temp.bar_window VALUES (?, ?)", windows)
+        # CROSS JOIN keeps the join order, so every issuer is read as one range of the primary key
+        query += f'''
+    FROM temp.bar_window w
+    CROSS JOIN issuers i ON i.issuer_code = w.issuer_code
+    CROSS JOIN {table} b ON b.issuer_id = i.issuer_id AND b.bucket >= IFNULL(w.start_bucket, -2147483648)
+    ORDER BY i.issuer_code, b.bucket
+    '''
+    bars = pd.read_sql_query(query, conn)
+    bars.insert(1, 'Date', bucket_labels(bars.pop('bucket').to_numpy(dtype=np.int64), period))
+    return bars
@@ -0,0 +1,199 @@
+"""
+Columnar copy of stock_data for fast bulk reads.
+
+Prices are stored per issuer and year as one .npy file holding a (columns x rows) float64
+block: row 0 is the trading day (days since epoch), the others are the price columns of
+stock_data. Files are memory-mapped on read, so a column of a partition is a zero-copy
+view, and a read only touches the partitions of the requested issuers and years.
+DatabaseManager.write_rows keeps the store in sync with stock_data when it is enabled
+(MSE_COLUMNAR_PATH); manifest.json records the last day stored per issuer so readers can
+check that the store matches the issuer watermarks before trusting it.
+
+Usage: python ColumnarStore.py --rebuild | --export out.csv [--issuer ALK] [--start 2020-01-01] [--end ...]
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+import DatabaseAccess
+
+# stock_data columns stored after the day row, in block order
+VALUE_COLUMNS = ['Last Trade Price', 'Max', 'Min', 'Volume', 'Turnover in BEST (denars)']
+
+# Rows fetched from SQLite at a time while rebuilding the store
+REBUILD_CHUNK_ROWS = 500000
+
+
+def to_day(value) -> Optional[int]:
+    """Day since epoch of one date string, date or timestamp (None stays None)."""
+    return None if value is None else int(np.datetime64(value, 'D').astype(np.int64))
+
+
+def to_years(days) -> np.ndarray:
+    return np.asarray(days).astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+class ColumnarStore:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.manifest_path = os.path.join(path, 'manifest.json')
+        os.makedirs(path, exist_ok=True)
+
+    def issuer_dir(self, issuer_code: str) -> str:
+        return os.path.join(self.path, quote(issuer_code, safe=''))
+
+    def partition_path(self, issuer_code: str, year: int) -> str:
+        return os.path.join(self.issuer_dir(issuer_code), f"{year}.npy")
+
+    def read_manifest(self) -> Dict[str, str]:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def write_manifest(self, manifest: Dict[str, str]):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def in_sync(self, stock_last_dates: Dict[str, pd.Timestamp]) -> bool:
+        """Whether the store holds exactly the issuers and last days of stock_data."""
+        return self.read_manifest() == {
+            issuer: last_date.strftime('%Y-%m-%d') for issuer, last_date in stock_last_dates.items()
+        }
+
+    def write_rows(self, rows: Iterable[Tuple]):
+        """Merge stock_data rows (see DatabaseManager.prepare_rows) into the partitions; new rows win."""
+        frame = pd.DataFrame(rows, columns=['issuer_code', 'day', *VALUE_COLUMNS]).dropna(subset=['day'])
+        if frame.empty:
+            return
+        days = frame['day'].to_numpy(dtype=np.int64)
+        years = to_years(days)
+        values = frame[VALUE_COLUMNS].to_numpy(dtype=float, na_value=np.nan)
+
+        manifest = self.read_manifest()
+        groups = pd.DataFrame({'issuer_code': frame['issuer_code'].to_numpy(), 'year': years})
+        for (issuer_code, year), index in groups.groupby(['issuer_code', 'year']).indices.items():
+            block = np.vstack([days[index].astype(float), values[index].T])
+            self.merge_partition(issuer_code, int(year), block)
+            last_day = np.datetime_as_string(np.datetime64(int(days[index].max()), 'D'))
+            manifest[issuer_code] = max(manifest.get(issuer_code, last_day), last_day)
+        self.write_manifest(manifest)
+
+    def merge_partition(self, issuer_code: str, year: int, block: np.ndarray):
+        path = self.partition_path(issuer_code, year)
+        if os.path.exists(path):
+            block = np.hstack([np.load(path), block])
+
+        # Sort by day keeping the last copy of every day, so rewritten rows replace the stored ones
+        order = np.argsort(block[0], kind='stable')
+        block = block[:, order]
+        keep = np.r_[block[0, 1:] != block[0, :-1], True]
+        block = np.ascontiguousarray(block[:, keep])
+
+        # Replace the file atomically; readers holding the old mapping keep a consistent view
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, block)
+        os.replace(tmp_path, path)
+
+    def issuers(self):
+        return sorted(unquote(entry.name) for entry in os.scandir(self.path) if entry.is_dir())
+
+    def read(self, windows: Optional[Dict[str, Optional[str]]] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """
+        Load stock data in the shape of TechnicalAnalysis.load_stock_data, sorted by (issuer_code, Date).
+        windows maps issuer codes to the first date to load (None loads the issuer's full history);
+        without windows every issuer is loaded. end limits the last date loaded.
+        """
+        if windows is None:
+            windows = dict.fromkeys(self.issuers())
+        end_day = to_day(end)
+        end_year = to_years(end_day) if end_day is not None else None
+
+        codes, blocks = [], []
+        for issuer_code in sorted(windows):
+            start_day = to_day(windows[issuer_code])
+            start_year = to_years(start_day) if start_day is not None else None
+            directory = self.issuer_dir(issuer_code)
+            if not os.path.isdir(directory):
+                continue
+            years = sorted(int(name[:-4]) for name in os.listdir(directory) if name[:-4].isdigit())
+            for year in years:
+                # Skip partitions outside the requested date range without opening them
+                if (start_year is not None and year < start_year) or (end_year is not None and year > end_year):
+                    continue
+                block = np.load(self.partition_path(issuer_code, year), mmap_mode='r')
+                lo = np.searchsorted(block[0], start_day) if start_day is not None else 0
+                hi = np.searchsorted(block[0], end_day, side='right') if end_day is not None else block.shape[1]
+                if hi > lo:
+                    codes.append((issuer_code, hi - lo))
+                    blocks.append(block[:, lo:hi])
+
+        # Partitions are copied once into a single block; its rows back the DataFrame columns
+        data = np.hstack(blocks) if blocks else np.empty((len(VALUE_COLUMNS) + 1, 0))
+        return pd.DataFrame({
+            'issuer_code': np.repeat(np.array([code for code, _ in codes], dtype=object),
+                                     [count for _, count in codes]),
+            'Date': data[0].astype(np.int64).astype('datetime64[D]').astype('datetime64[ns]'),
+            **{col: data[row] for row, col in enumerate(VALUE_COLUMNS, start=1)}
+        }, copy=False)
+
+    def rebuild(self, conn: sqlite3.Connection):
+        """Replace the store with the current contents of stock_prices."""
+        for entry in os.scandir(self.path):
+            if entry.is_dir():
+                shutil.rmtree(entry.path)
+        self.write_manifest({})
+
+        cursor = conn.execute('''
+            SELECT i.issuer_code, p.day, p.last_trade_price, p.max_price, p.min_price, p.volume, p.turnover
+            FROM stock_prices p JOIN issuers i ON i.issuer_id = p.issuer_id
+            ORDER BY p.issuer_id, p.day
+        ''')
+        while True:
+            rows = cursor.fetchmany(REBUILD_CHUNK_ROWS)
+            if not rows:
+                break
+            self.write_rows(rows)
+
+
+def open_store(path: Optional[str] = None) -> Optional[ColumnarStore]:
+    """The configured store, or None when the columnar store is disabled."""
+    path = path or DatabaseAccess.COLUMNAR_PATH
+    return ColumnarStore(path) if path else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain and export the columnar copy of stock_data.")
+    parser.add_argument('--path', default=DatabaseAccess.COLUMNAR_PATH or 'columnar',
+                        help="store directory (defaults to MSE_COLUMNAR_PATH)")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the store from the SQLite database")
+    parser.add_argument('--export', metavar='CSV', help="write the selected rows to a CSV file")
+    parser.add_argument('--issuer', action='append', help="issuer to export (repeatable, default all)")
+    parser.add_argument('--start', help="first date to export")
+    parser.add_argument('--end', help="last date to export")
+    args = parser.parse_args()
+
+    store = ColumnarStore(args.path)
+    if args.rebuild:
+        conn = sqlite3.connect(DatabaseAccess.DATABASE_PATH)
+        try:
+            store.rebuild(conn)
+        finally:
+            conn.close()
+        print(f"Rebuilt columnar store in {args.path} ({len(store.read_manifest())} issuers)")
+    if args.export:
+        windows = dict.fromkeys(args.issuer or store.issuers(), args.start)
+        store.read(windows, end=args.end).to_csv(args.export, index=False)
+        print(f"Exported to {args.export}")
@@ -1,25 +1,100 @@
 import asyncio
+import contextlib
 from datetime import datetime, date
-from typing import Optional, Dict
-from queue import Queue, Empty
+from typing import Optional, Dict, Callable
 import DatabaseManager
+import Metrics
 import MSEStockScraper
+import ProcessPool
+from DatabaseWriter import DatabaseWriter
+from HttpCache import HttpCache
+from RateLimiter import TokenBucket
 import pandas as pd
 
+STAGE_SECONDS = Metrics.histogram('mse_stage_seconds', "Time spent cleaning or validating one batch, by stage")
+ROWS_REJECTED = Metrics.counter('mse_rows_rejected_total', "Scraped rows dropped by the validate stage")
+
 
 class DataScraper:
     """Third pipe: Scrape and store missing data."""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, workers: int = 20, requests_per_second: float = 20.0,
+                 burst: int = 20, max_retries: int = 3, limit_per_host: int = 10, dns_cache_ttl: int = 300,
+                 window_concurrency: int = 10, parse_workers: Optional[int] = None, write_batch_rows: int = 50000,
+                 progress_callback: Optional[Callable[[str, int, int, int], None]] = None,
+                 http_cache: Optional[HttpCache] = None, streaming: bool = True,
+                 stream_read_ahead: Optional[int] = None, stream_queue_size: int = 32, stream_batch_rows: int = 5000,
+                 base_url: str = MSEStockScraper.BASE_URL):
         self.db_manager = db_manager
-        self.queue = Queue()
         self.error_lock = asyncio.Lock()  # Use asyncio Lock for async context
         self.errors = []
+        # Number of issuers scraped at the same time
+        self.workers = workers
+        # Token bucket settings shared by every request sent to mse.mk
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        # Connection pool settings for the session shared by all scrapers
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.session = None
+        self.rate_limiter = None
+        # Number of yearly windows fetched concurrently for a single issuer
+        self.window_concurrency = window_concurrency
+        # Size of the process pool that parses downloaded pages (defaults to the number of CPUs)
+        self.parse_workers = parse_workers
+        self.executor = None
+        # Scraped rows go through a writer stage that batches them into large transactions
+        self.write_batch_rows = write_batch_rows
+        self.writer = None
+        # Called as progress_callback(issuer_code, issuers_done, issuers_total, rows_saved) after every issuer
+        self.progress_callback = progress_callback
+        # On-disk page cache shared by all scrapers (None downloads every page)
+        self.http_cache = http_cache
+        self.base_url = base_url
+        # Streaming: every yearly window goes through the clean -> validate -> write stages as soon
+        # as it is parsed, instead of collecting an issuer's whole history first
+        self.streaming = streaming
+        # Windows of one issuer downloaded ahead of the clean stage (defaults to window_concurrency)
+        self.stream_read_ahead = stream_read_ahead or window_concurrency
+        self.stream_queue_size = stream_queue_size  # Windows buffered between two stages
+        self.stream_batch_rows = stream_batch_rows  # Smaller write transactions keep the writer's buffer small
+        self.clean_queue = None
+        self.validate_queue = None
+        self.rejected_rows = 0
+        # Rows the validate stage handed to the writer, per issuer still being streamed
+        self.accepted_rows = {}
+        self.completed = 0
+        self.total = 0
+
+    def create_scraper(self, issuer_code: str) -> MSEStockScraper.MSEStockScraper:
+        return MSEStockScraper.MSEStockScraper(
+            issuer_code, session=self.session, base_url=self.base_url,
+            window_concurrency=self.stream_read_ahead if self.streaming else self.window_concurrency,
+            rate_limiter=self.rate_limiter, max_retries=self.max_retries, executor=self.executor,
+            http_cache=self.http_cache
+        )
+
+    @staticmethod
+    def clean_batch(data: pd.DataFrame) -> pd.DataFrame:
+        """Convert every column except the date to numbers (columns the parser already converted are kept as is)."""
+        for col in data.columns:
+            if col != 'Date':  # Skip date column
+                data[col] = MSEStockScraper.clean_numeric_series(data[col])
+        return data
 
-    async def scrape_issuer(self, issuer_code: str, start_date: Optional[date] = None):
-        """Scrape data for a single issuer from a specified start date."""
+    @staticmethod
+    def validate_batch(data: pd.DataFrame) -> pd.DataFrame:
+        """Drop rows without a usable date or with negative values; a repeated date keeps its last row."""
+        dates = pd.to_datetime(data['Date'], errors='coerce')
+        numbers = data.drop(columns='Date')
+        valid = dates.notna() & ~(numbers < 0).any(axis=1)
+        return data[valid & ~dates.duplicated(keep='last')]
+
+    async def scrape_issuer(self, issuer_code: str, start_date: Optional[date] = None) -> int:
+        """Scrape data for a single issuer from a specified start date. Returns the number of rows saved."""
         try:
-            scraper = MSEStockScraper.MSEStockScraper(issuer_code)
+            scraper = self.create_scraper(issuer_code)
             today = datetime.now().date()
 
             # If no start_date was specified, default to fetching 10 years of data
@@ -31,12 +106,12 @@ class DataScraper:
 
             if data is not None and not data.empty:
                 # Clean the DataFrame
-                for col in data.columns:
-                    if col != 'Date':  # Skip date column
-                        data[col] = data[col].apply(MSEStockScraper.clean_numeric)
+                with STAGE_SECONDS.time(stage='clean'):
+                    data = self.clean_batch(data)
 
-                # Save the data to the database
-                self.db_manager.save_data(data, issuer_code)
+                # Hand the data to the writer stage
+                await self.writer.put(data, issuer_code)
+                return len(data)
             else:
                 async with self.error_lock:
                     self.errors.append(f"No data retrieved for {issuer_code}")
@@ -44,35 +119,159 @@ class DataScraper:
         except Exception as e:
             async with self.error_lock:
                 self.errors.append(f"Error scraping {issuer_code}: {str(e)}")
+        return 0
+
+    async def stream_issuer(self, issuer_code: str, start_date: Optional[date] = None) -> int:
+        """
+        Streaming scrape_issuer: each window is handed to the clean stage as soon as it is parsed.
+        Returns the number of rows passed on to the writer, once the stages have processed every
+        window of the issuer. When a window fails, to download or to write, the earlier windows
+        still get saved and the next run resumes after them.
+        """
+        scraper = self.create_scraper(issuer_code)
+        today = datetime.now().date()
+        if not start_date:
+            start_date = today - pd.Timedelta(days=365 * 10)
+
+        rows = 0
+        self.accepted_rows[issuer_code] = 0
+        try:
+            async with contextlib.aclosing(scraper.stream_historical_data(start_date, today)) as windows:
+                async for data in windows:
+                    if issuer_code in self.writer.failed:
+                        break  # The writer drops the rest of this issuer anyway
+                    await self.clean_queue.put((data, issuer_code))
+                    rows += len(data)
+            if not rows:
+                async with self.error_lock:
+                    self.errors.append(f"No data retrieved for {issuer_code}")
+        except Exception as e:
+            async with self.error_lock:
+                self.errors.append(f"Error scraping {issuer_code} after {rows} rows: {str(e)}")
 
-    async def process_queue(self):
-        """Process items from the queue asynchronously."""
+        # The stages keep the queue order, so the marker comes out after the issuer's last window
+        done = asyncio.get_running_loop().create_future()
+        await self.clean_queue.put((done, issuer_code))
+        await done
+        return self.accepted_rows.pop(issuer_code)
+
+    async def accept(self, data, issuer_code: str):
+        """Last stage output: count validated windows and hand them to the writer; resolve markers."""
+        if isinstance(data, asyncio.Future):
+            data.set_result(None)
+            return
+        if issuer_code in self.writer.failed:
+            return
+        self.accepted_rows[issuer_code] = self.accepted_rows.get(issuer_code, 0) + len(data)
+        await self.writer.put(data, issuer_code)
+
+    async def run_stage(self, stage: str, transform: Callable[[pd.DataFrame], pd.DataFrame], inbox: asyncio.Queue,
+                        put: Callable):
+        """
+        Apply transform to every window from inbox and pass the result on with put, until None arrives.
+        End-of-issuer markers (futures, see stream_issuer) are passed on unchanged.
+        """
         while True:
+            item = await inbox.get()
+            if item is None:
+                return
+            data, issuer_code = item
+            if isinstance(data, asyncio.Future):
+                await put(data, issuer_code)
+                continue
             try:
-                issuer_code, start_date = self.queue.get_nowait()
-                await self.scrape_issuer(issuer_code, start_date)
-                self.queue.task_done()
-            except Empty:
-                break
+                rows = len(data)
+                with STAGE_SECONDS.time(stage=stage):
+                    data = transform(data)
+                self.rejected_rows += rows - len(data)
+                ROWS_REJECTED.inc(rows - len(data))
+            except Exception as e:
+                async with self.error_lock:
+                    self.errors.append(f"Error processing data for {issuer_code}: {str(e)}")
+                continue
+            if not data.empty:
+                await put(data, issuer_code)
+
+    async def worker(self, queue: asyncio.Queue):
+        """Take issuers from the queue until the scheduler cancels the worker."""
+        while True:
+            issuer_code, start_date = await queue.get()
+            try:
+                scrape = self.stream_issuer if self.streaming else self.scrape_issuer
+                rows = await scrape(issuer_code, start_date)
+                self.completed += 1
+                if self.progress_callback:
+                    self.progress_callback(issuer_code, self.completed, self.total, rows)
             except Exception as e:
                 async with self.error_lock:
                     self.errors.append(f"Queue processing error: {str(e)}")
-                self.queue.task_done()
+            finally:
+                queue.task_done()
 
-    async def update_data(self, update_info: Dict[str, Optional[datetime]], max_concurrent_tasks: int = 200):
+    async def update_data(self, update_info: Dict[str, Optional[datetime]], max_concurrent_tasks: Optional[int] = None):
         """Update data for all issuers that need updating."""
-        # Clear previous errors
+        # Clear previous errors and progress
         self.errors = []
+        self.completed = 0
+        self.rejected_rows = 0
+        self.accepted_rows = {}
+        self.total = len(update_info)
+        if not update_info:
+            return
+
+        worker_count = min(max_concurrent_tasks or self.workers, len(update_info))
+        self.rate_limiter = TokenBucket(self.requests_per_second, self.burst)
+
+        batch_rows = self.stream_batch_rows if self.streaming else self.write_batch_rows
+        self.writer = DatabaseWriter(self.db_manager, batch_rows=batch_rows)
+        await self.writer.start()
+
+        # Stages of the streaming mode; a single task per stage keeps every issuer's windows in date order
+        stages = []
+        if self.streaming:
+            self.clean_queue = asyncio.Queue(maxsize=self.stream_queue_size)
+            self.validate_queue = asyncio.Queue(maxsize=self.stream_queue_size)
+            stages = [
+                (self.clean_queue, asyncio.create_task(self.run_stage(
+                    'clean', self.clean_batch, self.clean_queue,
+                    lambda data, code: self.validate_queue.put((data, code))))),
+                (self.validate_queue, asyncio.create_task(self.run_stage(
+                    'validate', self.validate_batch, self.validate_queue, self.accept))),
+            ]
+
+        # One pooled session is shared by every scraper so connections to mse.mk get reused,
+        # and HTML parsing is spread over a process pool (see ProcessPool) so it overlaps with the downloads
+        with ProcessPool.process_pool(self.parse_workers) as executor:
+            async with MSEStockScraper.create_session(self.limit_per_host, self.dns_cache_ttl) as session:
+                self.executor = executor
+                self.session = session
 
-        # Fill queue with work items
-        for issuer_code, last_date in update_info.items():
-            self.queue.put((issuer_code, last_date))
+                # Bounded queue: issuers are only handed out as fast as the workers take them
+                queue = asyncio.Queue(maxsize=worker_count * 2)
+                workers = [asyncio.create_task(self.worker(queue)) for _ in range(worker_count)]
 
-        # Create and start worker tasks
-        tasks = [self.process_queue() for _ in range(min(max_concurrent_tasks, len(update_info)))]
+                try:
+                    for issuer_code, last_date in update_info.items():
+                        await queue.put((issuer_code, last_date))
+                    await queue.join()
+                finally:
+                    for task in workers:
+                        task.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+                    # Drain the stages in order, then the writer
+                    for inbox, task in stages:
+                        await inbox.put(None)
+                        await task
+                    await self.writer.close()
 
-        # Run tasks concurrently
-        await asyncio.gather(*tasks)
+        self.errors.extend(self.writer.errors)
+        self.session = None
+        self.executor = None
+        self.rate_limiter = None
+        self.clean_queue = None
+        self.validate_queue = None
+        if self.rejected_rows:
+            print(f"Dropped {self.rejected_rows} invalid rows")
 
         # Report any errors that occurred
         if self.errors:
@@ -0,0 +1,114 @@
+"""
+Shared SQLite access layer.
+
+Every module resolves the database file through DATABASE_PATH (set MSE_DB_PATH to override it).
+Writers open connections with connect(), which puts the database in WAL mode so the web tier's
+read-only connections never block on, or are blocked by, a running scrape or analysis.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import Metrics
+
+DATABASE_PATH = os.environ.get('MSE_DB_PATH', 'mse_stocks.db')
+
+# Directory of the optional columnar copy of stock_data (see ColumnarStore); unset disables it
+COLUMNAR_PATH = os.environ.get('MSE_COLUMNAR_PATH')
+
+# Pragmas applied to write connections
+WRITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers don't block the writer and vice versa
+    'synchronous': 'NORMAL',  # Safe with WAL, fsync only at checkpoints
+    'cache_size': -64000,  # 64 MB page cache
+    'mmap_size': 268435456,  # 256 MB memory-mapped I/O
+    'temp_store': 'MEMORY'
+}
+
+# Pragmas applied to pooled read-only connections
+READ_PRAGMAS = {
+    'cache_size': -16000,  # 16 MB page cache per connection
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY'
+}
+
+# Milliseconds a connection waits on a lock (checkpoints, schema changes) before failing
+BUSY_TIMEOUT_MS = 5000
+
+# Prepared statements kept per connection; the dashboard only runs a handful of distinct queries
+CACHED_STATEMENTS = 256
+
+# Write metrics shared by the scraper and the analysis
+WRITE_SECONDS = Metrics.histogram('mse_db_write_seconds', "Duration of write transactions and commits, by table")
+ROWS_WRITTEN = Metrics.counter('mse_rows_written_total', "Rows inserted or replaced, by table")
+
+
+def connect(db_path: str = None) -> sqlite3.Connection:
+    """Open a write connection with the write pragmas; usable from any thread."""
+    conn = sqlite3.connect(db_path or DATABASE_PATH, check_same_thread=False,
+                           cached_statements=CACHED_STATEMENTS)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    for pragma, value in WRITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Pool of read-only connections. A connection is checked out for one request and then
+    returned, so its page cache and prepared statements are reused by later requests on
+    any thread; at most max_idle connections are kept open between requests.
+    """
+
+    def __init__(self, db_path: str = None, max_idle: int = 8):
+        self.db_path = db_path or DATABASE_PATH
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def open(self) -> sqlite3.Connection:
+        uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        for pragma, value in READ_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        if conn is None:
+            conn = self.open()
+        broken = False
+        try:
+            yield conn
+        except sqlite3.Error:
+            # Don't hand a connection in an unknown state to the next request
+            broken = True
+            raise
+        finally:
+            # Any other exception leaves the connection usable; it is returned like after a success
+            if broken:
+                conn.close()
+            else:
+                self.release(conn)
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a checked out connection to the idle list, or close it when the list is full."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """Close every idle connection."""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
@@ -1,44 +1,202 @@
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from datetime import datetime, date, timedelta
+import numpy as np
 import pandas as pd
 import sqlite3
+from DatabaseAccess import DATABASE_PATH, ROWS_WRITTEN, WRITE_SECONDS, connect
+import BarRollup
+import ColumnarStore
+
+# Columns of the stock_data view in insert order
+STOCK_DATA_COLUMNS = [
+    'issuer_code', 'Date', 'Last Trade Price', 'Max', 'Min',
+    'Volume', 'Turnover in BEST (denars)'
+]
+
+# stock_data price columns and the stock_prices columns that store them
+PRICE_COLUMNS = {
+    'Last Trade Price': 'last_trade_price',
+    'Max': 'max_price',
+    'Min': 'min_price',
+    'Volume': 'volume',
+    'Turnover in BEST (denars)': 'turnover'
+}
+
+# SQL turning a date string into days since 1970-01-01 (Julian day 2440587.5)
+JULIAN_TO_DAY = "CAST(julianday({}) - 2440587.5 AS INTEGER)"
+
+EPOCH = date(1970, 1, 1)
 
 
 class DatabaseManager:
     """Second pipe: Manage SQLite database operations and check data currency."""
 
-    def __init__(self, db_path: str = 'mse_stocks.db'):
+    def __init__(self, db_path: str = DATABASE_PATH, columnar_path: Optional[str] = None):
         self.db_path = db_path
+        # Columnar copy of stock_data kept in sync by write_rows, if enabled
+        self.columnar_store = ColumnarStore.open_store(columnar_path)
         # Delete existing database to ensure clean schema (USED ONLY FOR DEBUGGING)
         # if os.path.exists(db_path):
         #     os.remove(db_path)
+        # One long-lived connection; the writer stage uses it from its own thread
+        self.conn = connect(self.db_path)
+        self.issuer_id_cache = {}
         self.setup_database()
 
+    def close(self):
+        """Close the long-lived database connection."""
+        self.conn.close()
+
     def setup_database(self):
         """Create database and tables if they don't exist."""
-        with sqlite3.connect(self.db_path) as conn:
+        if self.conn.execute(
+                "SELECT type FROM sqlite_master WHERE name = 'stock_data'").fetchone() == ('table',):
+            self.migrate_stock_data()
+
+        with self.conn as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS stock_data (
-                    issuer_code TEXT,
-                    "Date" DATE,
-                    "Last Trade Price" REAL,
-                    "Max" REAL,
-                    "Min" REAL,
-                    "Volume" REAL,
-                    "Turnover in BEST (denars)" REAL,
-                    PRIMARY KEY (issuer_code, "Date")
-                )
+            self.create_schema(cursor)
+            # Databases created before the watermark existed are backfilled once
+            if not cursor.execute("SELECT EXISTS (SELECT 1 FROM issuer_watermark)").fetchone()[0]:
+                cursor.execute('''
+                    INSERT INTO issuer_watermark (issuer_code, last_date)
+                    SELECT i.issuer_code, date(MAX(p.day) * 86400, 'unixepoch')
+                    FROM stock_prices p JOIN issuers i ON i.issuer_id = p.issuer_id
+                    GROUP BY p.issuer_id
+                ''')
+            # ...and so are the weekly and monthly bars
+            if (not cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {BarRollup.BAR_TABLES['weekly']})").fetchone()[0]
+                    and cursor.execute("SELECT EXISTS (SELECT 1 FROM stock_prices)").fetchone()[0]):
+                BarRollup.rebuild_bars(conn)
+                # Their indicators were computed on the older resampled bars (means, not closes);
+                # without them the next analysis, incremental or not, recomputes both periods in full
+                self.drop_bar_indicators(cursor)
+            # Rows inserted through the stock_data view since the last open
+            BarRollup.refresh_stale_bars(conn)
+
+    @staticmethod
+    def create_schema(cursor):
+        """Create the tables, the stock_data view and its trigger; doesn't commit."""
+        # Issuer codes are stored once; prices refer to them by integer id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS issuers (
+                issuer_id INTEGER PRIMARY KEY,
+                issuer_code TEXT NOT NULL UNIQUE
+            )
+        ''')
+        # Prices clustered by (issuer, day); day counts days since 1970-01-01
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_prices (
+                issuer_id INTEGER NOT NULL REFERENCES issuers (issuer_id),
+                day INTEGER NOT NULL,
+                last_trade_price REAL,
+                max_price REAL,
+                min_price REAL,
+                volume REAL,
+                turnover REAL,
+                PRIMARY KEY (issuer_id, day)
+            ) WITHOUT ROWID
+        ''')
+        # Compatibility view with the original stock_data columns; inserts go to stock_prices,
+        # advance the watermark like write_rows and leave their bars to refresh_stale_bars
+        cursor.execute(f'''
+            CREATE VIEW IF NOT EXISTS stock_data AS
+            SELECT i.issuer_code, date(p.day * 86400, 'unixepoch') AS "Date",
+                   {', '.join(f'p.{price} AS "{col}"' for col, price in PRICE_COLUMNS.items())}
+            FROM stock_prices p JOIN issuers i ON i.issuer_id = p.issuer_id
+        ''')
+        trigger = cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'stock_data_insert'"
+        ).fetchone()
+        if trigger and BarRollup.STALE_TABLE not in trigger[0]:
+            # Created by a version whose trigger only filled stock_prices
+            cursor.execute("DROP TRIGGER stock_data_insert")
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS stock_data_insert INSTEAD OF INSERT ON stock_data
+            BEGIN
+                INSERT OR IGNORE INTO issuers (issuer_code) VALUES (NEW.issuer_code);
+                INSERT OR REPLACE INTO stock_prices
+                SELECT issuer_id, {JULIAN_TO_DAY.format('NEW."Date"')},
+                       {', '.join(f'NEW."{col}"' for col in PRICE_COLUMNS)}
+                FROM issuers WHERE issuer_code = NEW.issuer_code AND NEW."Date" IS NOT NULL;
+                INSERT OR IGNORE INTO {BarRollup.STALE_TABLE}
+                SELECT issuer_id, {JULIAN_TO_DAY.format('NEW."Date"')}
+                FROM issuers WHERE issuer_code = NEW.issuer_code AND NEW."Date" IS NOT NULL;
+                INSERT INTO issuer_watermark (issuer_code, last_date)
+                SELECT NEW.issuer_code, date(NEW."Date") WHERE NEW."Date" IS NOT NULL
+                ON CONFLICT (issuer_code) DO UPDATE
+                SET last_date = COALESCE(MAX(last_date, excluded.last_date), excluded.last_date);
+            END
+        ''')
+        # Last stored date per issuer, kept up to date by write_rows
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS issuer_watermark (
+                issuer_code TEXT PRIMARY KEY,
+                last_date DATE
+            )
+        ''')
+        # Weekly and monthly bars, refreshed by write_rows
+        BarRollup.create_bar_tables(cursor)
+
+    @staticmethod
+    def drop_bar_indicators(cursor):
+        """Delete the weekly and monthly rows of technical_indicators and latest_snapshot, if they exist."""
+        periods = list(BarRollup.BAR_TABLES)
+        for table in ('technical_indicators', 'latest_snapshot'):
+            if cursor.execute("SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?)",
+                              (table,)).fetchone()[0]:
+                cursor.execute(f"DELETE FROM {table} WHERE time_period IN ({', '.join('?' * len(periods))})",
+                               periods)
+
+    def migrate_stock_data(self):
+        """
+        Move rows of the original stock_data table (TEXT issuer codes and dates) into issuers and
+        stock_prices, replace the table with the compatibility view and reclaim the freed pages.
+        """
+        print("Migrating stock_data to the compact schema...")
+        conn = self.conn
+        # One transaction: an interrupted migration leaves the original table in place
+        conn.execute("BEGIN")
+        try:
+            conn.execute("ALTER TABLE stock_data RENAME TO stock_data_old")
+            self.create_schema(conn.cursor())
+            conn.execute('''
+                INSERT OR IGNORE INTO issuers (issuer_code)
+                SELECT DISTINCT issuer_code FROM stock_data_old WHERE issuer_code IS NOT NULL
+            ''')
+            conn.execute(f'''
+                INSERT OR REPLACE INTO stock_prices
+                SELECT i.issuer_id, {JULIAN_TO_DAY.format('s."Date"')},
+                       {', '.join(f's."{col}"' for col in PRICE_COLUMNS)}
+                FROM stock_data_old s JOIN issuers i ON i.issuer_code = s.issuer_code
+                WHERE s."Date" IS NOT NULL
             ''')
+            conn.execute("DROP TABLE stock_data_old")
             conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        conn.execute("VACUUM")
+
+    def issuer_ids(self, codes) -> Dict[str, int]:
+        """Ids of the given issuer codes, registering new issuers. Runs in the caller's transaction."""
+        missing = [code for code in codes if code not in self.issuer_id_cache]
+        if missing:
+            self.conn.executemany("INSERT OR IGNORE INTO issuers (issuer_code) VALUES (?)",
+                                  [(code,) for code in missing])
+            placeholders = ', '.join('?' * len(missing))
+            self.issuer_id_cache.update(self.conn.execute(
+                f"SELECT issuer_code, issuer_id FROM issuers WHERE issuer_code IN ({placeholders})", missing
+            ))
+        return self.issuer_id_cache
 
     def get_last_date(self, issuer_code: str) -> Optional[date]:
         """Get the last recorded date for an issuer."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row  # This allows fetching results as dictionaries
+        with self.conn as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row  # This allows fetching results as dictionaries
             cursor.execute(
-                "SELECT MAX(date) AS max_date FROM stock_data WHERE issuer_code = ?",
+                "SELECT last_date AS max_date FROM issuer_watermark WHERE issuer_code = ?",
                 (issuer_code,)
             )
             result = cursor.fetchone()
@@ -47,14 +205,29 @@ class DatabaseManager:
             else:
                 return None
 
-    def check_data_currency(self, codes: List[str]) -> Dict[str, Optional[date]]:
-        """Check which issuers need updating and their start dates for scraping."""
+    def get_last_dates(self) -> Dict[str, date]:
+        """Get the last recorded date of every issuer with one query."""
+        with self.conn as conn:
+            rows = conn.execute("SELECT issuer_code, last_date FROM issuer_watermark WHERE last_date IS NOT NULL")
+            return {
+                issuer_code: datetime.strptime(last_date, "%Y-%m-%d").date()
+                for issuer_code, last_date in rows
+            }
+
+    def check_data_currency(self, codes: List[str],
+                            last_dates: Optional[Dict[str, date]] = None) -> Dict[str, Optional[date]]:
+        """
+        Check which issuers need updating and their start dates for scraping.
+        last_dates (from get_last_dates) can be passed in when it was loaded beforehand.
+        """
         today = datetime.now().date()  # Use only the date
         ten_years_ago = today - timedelta(days=365 * 10)
         update_info = {}
+        if last_dates is None:
+            last_dates = self.get_last_dates()
 
         for code in codes:
-            last_date = self.get_last_date(code)
+            last_date = last_dates.get(code)
             if not last_date:
                 # No data exists, start from 10 years ago
                 update_info[code] = ten_years_ago
@@ -63,40 +236,70 @@ class DatabaseManager:
 
         return update_info
 
-    def save_data(self, df: pd.DataFrame, issuer_code: str):
-        """Save data to SQLite database with proper formatting."""
-        try:
-            # Create a copy and cleanup data
-            save_df = df.copy()
-            save_df['issuer_code'] = issuer_code
-
-            # Ensure all columns exist and are in the right order
-            required_columns = [
-                'issuer_code', 'Date', 'Last Trade Price', 'Max', 'Min',
-                'Volume', 'Turnover in BEST (denars)'
-            ]
-
-            # Create missing columns if needed
-            for col in required_columns:
-                if col not in save_df.columns:
-                    save_df[col] = None
+    @staticmethod
+    def prepare_rows(df: pd.DataFrame, issuer_code: str) -> List[Tuple]:
+        """
+        Normalize a scraped DataFrame into (issuer_code, day, prices...) rows ready for write_rows,
+        with the day counted since 1970-01-01 (None when the date is missing).
+        """
+        # Convert empty strings and 'None' strings to None, then the dates to epoch days
+        dates = pd.to_datetime(df['Date'].replace(['', 'None', 'NULL'], None)).values.astype('datetime64[D]')
+        days = dates.astype(np.int64).tolist()
+        for position in np.flatnonzero(np.isnat(dates)):
+            days[position] = None
 
-            # Select and order only the required columns
-            save_df = save_df[required_columns]
+        # Convert numeric columns safely (missing columns and unparsable values become NULL;
+        # sqlite3 binds NaN as NULL)
+        columns = [
+            pd.to_numeric(df[col], errors='coerce').tolist() if col in df.columns else [None] * len(df)
+            for col in STOCK_DATA_COLUMNS[2:]
+        ]
+        return list(zip([issuer_code] * len(df), days, *columns))
 
-            # Convert empty strings and 'None' strings to None
-            save_df = save_df.replace(['', 'None', 'NULL'], None)
+    def write_rows(self, rows: List[Tuple]):
+        """
+        Insert or replace rows from prepare_rows in a single transaction. Re-running a scrape is
+        idempotent. Rows without a date are skipped. The issuer watermarks are advanced in the
+        same transaction.
+        """
+        last_days = {}
+        dated_rows = 0
+        for issuer_code, day, *_ in rows:
+            if day is not None:
+                dated_rows += 1
+                if day > last_days.get(issuer_code, day - 1):
+                    last_days[issuer_code] = day
 
-            # Convert numeric columns safely
-            numeric_columns = ['Last Trade Price', 'Max', 'Min', 'Volume', 'Turnover in BEST (denars)']
-            for col in numeric_columns:
-                save_df[col] = pd.to_numeric(save_df[col], errors='coerce')
+        try:
+            with WRITE_SECONDS.time(table='stock_prices'), self.conn as conn:
+                issuer_ids = self.issuer_ids(last_days)
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO stock_prices VALUES ({', '.join('?' * (len(PRICE_COLUMNS) + 2))})",
+                    ((issuer_ids[code], day, *prices) for code, day, *prices in rows if day is not None)
+                )
+                # Only the weekly and monthly buckets these rows fall into are re-aggregated
+                touched = np.array([(issuer_ids[code], day) for code, day, *_ in rows if day is not None],
+                                   dtype=np.int64).reshape(-1, 2)
+                BarRollup.refresh_bars(conn, touched[:, 0], touched[:, 1])
+                conn.executemany('''
+                    INSERT INTO issuer_watermark (issuer_code, last_date) VALUES (?, ?)
+                    ON CONFLICT (issuer_code) DO UPDATE
+                    SET last_date = COALESCE(MAX(last_date, excluded.last_date), excluded.last_date)
+                ''', ((code, (EPOCH + timedelta(days=day)).isoformat()) for code, day in last_days.items()))
+        except Exception:
+            # Issuer ids registered by the rolled back transaction may be handed out again
+            self.issuer_id_cache.clear()
+            raise
+        ROWS_WRITTEN.inc(dated_rows, table='stock_prices')
 
-            # Convert date column
-            save_df['Date'] = pd.to_datetime(save_df['Date']).dt.date
+        # Written after the commit; if this fails the store's manifest lags and readers fall back to SQLite
+        if self.columnar_store is not None:
+            self.columnar_store.write_rows(rows)
 
-            with sqlite3.connect(self.db_path) as conn:
-                save_df.to_sql('stock_data', conn, if_exists='append', index=False)
+    def save_data(self, df: pd.DataFrame, issuer_code: str):
+        """Save data to SQLite database with proper formatting."""
+        try:
+            self.write_rows(self.prepare_rows(df, issuer_code))
 
         except Exception as e:
             print(f"Error saving data for {issuer_code}: {str(e)}")
@@ -104,7 +307,7 @@ class DatabaseManager:
 
     def fetch_sample_data(self, issuer_code: Optional[str] = None, limit: int = 100):
         """Fetch a sample of data from the stock_data table, optionally filtered by issuer code."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.conn as conn:
             # Construct the query with an optional WHERE clause
             if issuer_code:
                 query = "SELECT * FROM stock_data WHERE issuer_code = ? LIMIT ?" #Show empty rows
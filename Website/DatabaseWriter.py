@@ -0,0 +1,86 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+import DatabaseManager
+import pandas as pd
+
+
+class DatabaseWriter:
+    """
+    Writer stage between the scrapers and the database.
+    Scraped DataFrames are queued from many issuers and coalesced into large
+    INSERT OR REPLACE transactions on the manager's single long-lived connection,
+    which run on a dedicated thread so the event loop never blocks on SQLite.
+    When a batch fails, its issuers are marked failed and their later rows are dropped: the
+    watermark then stays at the last committed row and the next run fetches the rest again.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, batch_rows: int = 50000, queue_size: int = 64,
+                 flush_interval: float = 1.0):
+        self.db_manager = db_manager
+        self.batch_rows = batch_rows  # Flush once this many rows are pending
+        self.flush_interval = flush_interval  # ...or when no new data arrived for this many seconds
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self.task = None
+        self.rows_written = 0
+        self.errors = []
+        # Issuers whose rows were lost in a failed batch; nothing after the gap may be written for them
+        self.failed = set()
+
+    async def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def put(self, df: pd.DataFrame, issuer_code: str):
+        """Queue an issuer's rows for writing. Waits when the writer falls behind. Dropped for failed issuers."""
+        if issuer_code not in self.failed:
+            await self.queue.put((df, issuer_code))
+
+    async def close(self):
+        """Flush everything still queued and stop the writer."""
+        await self.queue.put(None)
+        await self.task
+        self.executor.shutdown()
+
+    async def run(self):
+        batch = []
+        pending_rows = 0
+        while True:
+            try:
+                timeout = self.flush_interval if batch else None
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                # Producers went quiet: write what we have
+                await self.flush(batch)
+                batch, pending_rows = [], 0
+                continue
+
+            if item is None:
+                break
+            if item[1] in self.failed:
+                continue  # Queued before its issuer's batch failed
+            batch.append(item)
+            pending_rows += len(item[0])
+            if pending_rows >= self.batch_rows:
+                await self.flush(batch)
+                batch, pending_rows = [], 0
+
+        if batch:
+            await self.flush(batch)
+
+    async def flush(self, batch: List[Tuple[pd.DataFrame, str]]):
+        loop = asyncio.get_running_loop()
+        try:
+            self.rows_written += await loop.run_in_executor(self.executor, self.write_batch, batch)
+        except Exception as e:
+            issuers = list(dict.fromkeys(issuer_code for _, issuer_code in batch))
+            self.failed.update(issuers)
+            self.errors.append(f"Error saving data for {', '.join(issuers)}: {str(e)} "
+                               f"(their remaining windows were skipped)")
+
+    def write_batch(self, batch: List[Tuple[pd.DataFrame, str]]) -> int:
+        rows = []
+        for df, issuer_code in batch:
+            rows.extend(self.db_manager.prepare_rows(df, issuer_code))
+        self.db_manager.write_rows(rows)
+        return len(rows)
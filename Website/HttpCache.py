@@ -0,0 +1,157 @@
+"""
+On-disk cache of downloaded pages.
+
+Responses are stored content-addressed: the body lives under bodies/ named by its SHA-256,
+so identical pages (e.g. the many empty history windows) are kept once, and a small JSON
+entry under entries/ maps each request (URL + query parameters) to its body and validators.
+Cached pages are revalidated with If-None-Match / If-Modified-Since; pages stored as
+immutable (history windows that closed before the data could change) are served without
+any request. The scraper uses the cache from aiohttp for those settled windows only (an open
+window is asked for under a new key by every later run), Strategies through get() and
+get_async() for the listing pages.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Dict, NamedTuple, Optional
+
+import aiohttp
+
+# Directory of the page cache; an empty MSE_HTTP_CACHE disables it
+HTTP_CACHE_PATH = os.environ.get('MSE_HTTP_CACHE', 'http_cache')
+
+
+class CachedPage(NamedTuple):
+    key: str
+    body_hash: str
+    encoding: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    immutable: bool
+    stored_at: float
+
+
+def request_key(url: str, params: Optional[Dict] = None) -> str:
+    return hashlib.sha256(json.dumps([url, sorted((params or {}).items())]).encode('utf-8')).hexdigest()
+
+
+def write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class HttpCache:
+
+    def __init__(self, path: str = HTTP_CACHE_PATH):
+        self.path = path
+        self.hits = 0  # Pages served without downloading a body (fresh or 304)
+        self.misses = 0
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.path, 'entries', key[:2], f"{key}.json")
+
+    def body_path(self, body_hash: str) -> str:
+        return os.path.join(self.path, 'bodies', body_hash[:2], body_hash)
+
+    def lookup(self, url: str, params: Optional[Dict] = None) -> Optional[CachedPage]:
+        key = request_key(url, params)
+        try:
+            with open(self.entry_path(key)) as f:
+                page = CachedPage(key=key, **json.load(f))
+        except (FileNotFoundError, ValueError, TypeError):
+            return None
+        # The body may have been removed by hand; treat the entry as missing
+        return page if os.path.exists(self.body_path(page.body_hash)) else None
+
+    def is_fresh(self, page: Optional[CachedPage], max_age: float = 0) -> bool:
+        """Whether the page can be used without contacting the server (counted as a hit)."""
+        fresh = page is not None and (page.immutable or time.time() - page.stored_at < max_age)
+        if fresh:
+            self.hits += 1
+        return fresh
+
+    @staticmethod
+    def validators(page: Optional[CachedPage]) -> Dict[str, str]:
+        """Conditional request headers revalidating a cached page."""
+        headers = {}
+        if page is not None:
+            if page.etag:
+                headers['If-None-Match'] = page.etag
+            if page.last_modified:
+                headers['If-Modified-Since'] = page.last_modified
+        return headers
+
+    def body(self, page: CachedPage) -> bytes:
+        with open(self.body_path(page.body_hash), 'rb') as f:
+            return f.read()
+
+    def text(self, page: CachedPage) -> str:
+        return self.body(page).decode(page.encoding or 'utf-8', errors='replace')
+
+    def store(self, url: str, params: Optional[Dict], body: bytes, headers, encoding: Optional[str] = None,
+              immutable: bool = False) -> CachedPage:
+        body_hash = hashlib.sha256(body).hexdigest()
+        if not os.path.exists(self.body_path(body_hash)):
+            write_atomic(self.body_path(body_hash), body)
+        page = CachedPage(
+            key=request_key(url, params), body_hash=body_hash, encoding=encoding,
+            etag=headers.get('ETag'), last_modified=headers.get('Last-Modified'),
+            immutable=immutable, stored_at=time.time()
+        )
+        self.write_entry(page)
+        self.misses += 1
+        return page
+
+    def revalidated(self, page: CachedPage, immutable: bool = False) -> CachedPage:
+        """Record a 304 response: the cached body is current again."""
+        page = page._replace(stored_at=time.time(), immutable=page.immutable or immutable)
+        self.write_entry(page)
+        self.hits += 1
+        return page
+
+    def write_entry(self, page: CachedPage):
+        fields = page._asdict()
+        del fields['key']  # The key is the file name
+        write_atomic(self.entry_path(page.key), json.dumps(fields).encode('utf-8'))
+
+    def get(self, url: str, params: Optional[Dict] = None, max_age: float = 0, immutable: bool = False,
+            timeout: float = 30) -> bytes:
+        """Synchronous cached GET returning the body; raises requests.HTTPError on error statuses."""
+        page = self.lookup(url, params)
+        if self.is_fresh(page, max_age):
+            return self.body(page)
+
+        import requests  # Only the synchronous callers need it; the pipeline uses get_async
+
+        response = requests.get(url, params=params, headers=self.validators(page), timeout=timeout)
+        if response.status_code == 304 and page is not None:
+            return self.body(self.revalidated(page, immutable))
+        response.raise_for_status()
+        self.store(url, params, response.content, response.headers, response.encoding, immutable)
+        return response.content
+
+    async def get_async(self, session, url: str, params: Optional[Dict] = None, max_age: float = 0,
+                        immutable: bool = False, timeout: float = 30) -> bytes:
+        """get() for an aiohttp session; raises aiohttp.ClientResponseError on error statuses."""
+        page = self.lookup(url, params)
+        if self.is_fresh(page, max_age):
+            return self.body(page)
+
+        async with session.get(url, params=params, headers=self.validators(page),
+                               timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status == 304 and page is not None:
+                return self.body(self.revalidated(page, immutable))
+            response.raise_for_status()
+            body = await response.read()
+            self.store(url, params, body, response.headers, response.get_encoding(), immutable)
+            return body
+
+
+def open_cache(path: Optional[str] = None) -> Optional[HttpCache]:
+    """The configured cache, or None when it is disabled."""
+    path = HTTP_CACHE_PATH if path is None else path
+    return HttpCache(path) if path else None
@@ -0,0 +1,180 @@
+"""
+Vectorized indicator engine.
+
+Computes the same indicators as TechnicalAnalysis.calculate_indicators (the ta library outputs)
+for many issuers in one pass. The input holds the issuers as contiguous blocks sorted by
+(issuer_code, Date): rolling windows run over the whole column and rows whose window would
+reach into the previous issuer are masked out, and recursive EMAs run through pandas'
+grouped ewm, which handles all groups in one call.
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+import BarRollup
+
+# Rows processed at a time by the rolling mean absolute deviation, bounds its memory use
+MAD_CHUNK_ROWS = 65536
+
+
+def group_ids(keys: np.ndarray) -> np.ndarray:
+    """Increasing group number of every row; equal keys must be contiguous."""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.r_[0, np.cumsum(keys[1:] != keys[:-1])]
+
+
+def group_positions(groups: np.ndarray) -> np.ndarray:
+    """Position of every row within its group (0 for the first row of an issuer)."""
+    index = np.arange(len(groups))
+    starts = np.r_[True, groups[1:] != groups[:-1]] if len(groups) else np.zeros(0, dtype=bool)
+    return index - np.maximum.accumulate(np.where(starts, index, 0))
+
+
+def rolling(values: np.ndarray, window: int, positions: np.ndarray, how: str) -> np.ndarray:
+    """Grouped rolling mean/min/max with min_periods=window."""
+    result = getattr(pd.Series(values).rolling(window), how)().to_numpy()
+    result[positions < window - 1] = np.nan
+    return result
+
+
+def rolling_mad(values: np.ndarray, window: int, positions: np.ndarray) -> np.ndarray:
+    """Grouped rolling mean absolute deviation around the window mean."""
+    result = np.full(len(values), np.nan)
+    for start in range(0, max(len(values) - window + 1, 0), MAD_CHUNK_ROWS):
+        windows = sliding_window_view(values[start:start + MAD_CHUNK_ROWS + window - 1], window)
+        mad = np.abs(windows - windows.mean(axis=1, keepdims=True)).mean(axis=1)
+        result[start + window - 1:start + window - 1 + len(mad)] = mad
+    result[positions < window - 1] = np.nan
+    return result
+
+
+def ewm(values: np.ndarray, groups: np.ndarray, **kwargs) -> np.ndarray:
+    """Grouped exponentially weighted mean; groups are increasing so the output keeps the row order."""
+    return pd.Series(values).groupby(groups, sort=False).ewm(**kwargs).mean().to_numpy()
+
+
+def grouped_diff(values: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    diff = np.empty(len(values))
+    diff[:1] = np.nan
+    diff[1:] = values[1:] - values[:-1]
+    diff[positions == 0] = np.nan
+    return diff
+
+
+def compute_indicators(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the indicator and Signal columns to data, which holds one or more issuers
+    sorted by (issuer_code, Date).
+    """
+    close = data['Last Trade Price'].to_numpy(dtype=float)
+    high = data['Max'].to_numpy(dtype=float)
+    low = data['Min'].to_numpy(dtype=float)
+    groups = group_ids(data['issuer_code'].to_numpy())
+    positions = group_positions(groups)
+
+    # Moving averages
+    data['SMA_20'] = rolling(close, 20, positions, 'mean')
+    data['SMA_50'] = rolling(close, 50, positions, 'mean')
+    data['EMA_20'] = ewm(close, groups, span=20)
+    data['EMA_50'] = ewm(close, groups, span=50)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # RSI (14), Wilder smoothing as in ta.momentum.RSIIndicator
+        diff = grouped_diff(close, positions)
+        up = np.where(diff > 0, diff, 0.0)
+        down = np.where(diff < 0, -diff, 0.0)
+        ema_up = ewm(up, groups, alpha=1 / 14, min_periods=14, adjust=False)
+        ema_down = ewm(down, groups, alpha=1 / 14, min_periods=14, adjust=False)
+        data['RSI'] = np.where(ema_down == 0, 100, 100 - (100 / (1 + ema_up / ema_down)))
+
+        # MACD (12, 26)
+        data['MACD'] = (ewm(close, groups, span=12, min_periods=12, adjust=False)
+                        - ewm(close, groups, span=26, min_periods=26, adjust=False))
+
+        # Stochastic %K (14) and Williams %R (14)
+        lowest_low = rolling(low, 14, positions, 'min')
+        highest_high = rolling(high, 14, positions, 'max')
+        data['Stoch'] = 100 * (close - lowest_low) / (highest_high - lowest_low)
+        data['Williams %R'] = -100 * (highest_high - close) / (highest_high - lowest_low)
+
+        # CCI (20, 0.015)
+        typical_price = (high + low + close) / 3.0
+        data['CCI'] = ((typical_price - rolling(typical_price, 20, positions, 'mean'))
+                       / (0.015 * rolling_mad(typical_price, 20, positions)))
+
+    # Trading signals; later rules take precedence
+    signal = np.full(len(data), 'Hold', dtype=object)
+    rsi = data['RSI'].to_numpy()
+    sma_20 = data['SMA_20'].to_numpy()
+    signal[rsi < 30] = 'Buy'
+    signal[rsi > 70] = 'Sell'
+    signal[close > sma_20] = 'Buy'
+    signal[close < sma_20] = 'Sell'
+    data['Signal'] = signal
+
+    return data
+
+
+def resample_bars(data: pd.DataFrame, period: str) -> pd.DataFrame:
+    """
+    Resample daily rows of many issuers to weekly (weeks ending Sunday) or month-end OHLC bars,
+    the same bars as BarRollup stores and the same buckets as DataFrame.resample('W' / 'ME').
+    """
+    days = data['Date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    bars = pd.DataFrame({
+        'issuer_code': data['issuer_code'].to_numpy(),
+        'bucket': BarRollup.day_buckets(days, period),
+        'Open': data['Last Trade Price'].to_numpy(dtype=float),
+        'Last Trade Price': data['Last Trade Price'].to_numpy(dtype=float),
+        'Max': data['Max'].to_numpy(dtype=float),
+        'Min': data['Min'].to_numpy(dtype=float),
+        'Volume': data['Volume'].to_numpy(dtype=float),
+        'Turnover in BEST (denars)': data['Turnover in BEST (denars)'].to_numpy(dtype=float),
+    }).groupby(['issuer_code', 'bucket'], sort=True).agg({
+        'Open': 'first',
+        'Last Trade Price': 'last',
+        'Max': 'max',
+        'Min': 'min',
+        'Volume': 'sum',
+        'Turnover in BEST (denars)': 'sum'
+    }).reset_index()
+    bars.insert(1, 'Date', BarRollup.bucket_labels(bars.pop('bucket').to_numpy(), period))
+    return bars
+
+
+def fill_empty_buckets(bars: pd.DataFrame, period: str) -> pd.DataFrame:
+    """Add the empty buckets between each issuer's first and last bar, like DataFrame.resample."""
+    codes = bars['issuer_code'].to_numpy()
+    buckets = BarRollup.day_buckets(bars['Date'].to_numpy().astype('datetime64[D]').astype(np.int64), period)
+    first = pd.Series(buckets).groupby(codes, sort=False).agg(['min', 'max'])
+    counts = (first['max'] - first['min'] + 1).to_numpy()
+    if counts.sum() == len(bars):
+        return bars
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    full_index = pd.MultiIndex.from_arrays(
+        [np.repeat(first.index.to_numpy(), counts), np.repeat(first['min'].to_numpy(), counts) + offsets],
+        names=['issuer_code', 'bucket']
+    )
+    bars = bars.drop(columns='Date').set_index(pd.MultiIndex.from_arrays(
+        [codes, buckets], names=['issuer_code', 'bucket']
+    )).drop(columns='issuer_code').reindex(full_index)
+    bars['Volume'] = bars['Volume'].fillna(0.0)
+    bars['Turnover in BEST (denars)'] = bars['Turnover in BEST (denars)'].fillna(0.0)
+    bars = bars.reset_index()
+    bars.insert(1, 'Date', BarRollup.bucket_labels(bars.pop('bucket').to_numpy(), period))
+    return bars
+
+
+def analyze(data: pd.DataFrame, period: str, resample: bool = True) -> pd.DataFrame:
+    """
+    Vectorized counterpart of TechnicalAnalysis.analyze_for_time_period for many issuers.
+    With resample=False weekly and monthly data are already bars (see BarRollup.load_bars).
+    """
+    if period == 'daily':
+        bars = data.copy()
+    else:
+        bars = fill_empty_buckets(resample_bars(data, period) if resample else data, period)
+    analyzed_data = compute_indicators(bars)
+    analyzed_data['time_period'] = period
+    return analyzed_data
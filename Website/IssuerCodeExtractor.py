@@ -1,6 +1,6 @@
-from bs4 import BeautifulSoup
-from typing import List
-import requests
+from typing import List, Sequence
+import asyncio
+import aiohttp
 
 from Strategies import IssuerCodeStrategy
 
@@ -17,6 +17,35 @@ class IssuerCodeExtractor:
         """Fetch issuer codes using the current strategy"""
         return self.filter_codes(self._strategy.get_issuer_codes())
 
+    async def get_issuer_codes_async(self, session: aiohttp.ClientSession,
+                                     racers: Sequence[IssuerCodeStrategy] = ()) -> List[str]:
+        """
+        Fetch issuer codes with the current strategy, racing it against the racers: the first
+        strategy that returns codes wins and the others are cancelled. Raises the first error
+        if every strategy fails.
+        """
+        tasks = [asyncio.create_task(strategy.get_issuer_codes_async(session))
+                 for strategy in (self._strategy, *racers)]
+        errors = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    codes = self.filter_codes(await next_done)
+                except Exception as e:
+                    # A failed strategy leaves the race to the others
+                    errors.append(e)
+                    continue
+                if codes:
+                    return codes
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if errors:
+            raise errors[0]
+        return []
+
     def filter_codes(self, codes: List[str]) -> List[str]:
         return [code for code in codes if
                 not any(char.isdigit() for char in code)]
\ No newline at end of file
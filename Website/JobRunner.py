@@ -0,0 +1,112 @@
+import itertools
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class Job:
+    """State of one background run, updated by the job function while it runs."""
+
+    def __init__(self, job_id: str, kind: str):
+        self.id = job_id
+        self.kind = kind
+        self.state = 'queued'  # queued -> running -> succeeded | failed
+        self.phase = 'queued'
+        self.issuers_done = 0
+        self.issuers_total = 0
+        self.rows_written = 0
+        self.message = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def update(self, **fields):
+        with self.lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    @property
+    def active(self) -> bool:
+        return self.state in ('queued', 'running')
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                'job_id': self.id,
+                'kind': self.kind,
+                'state': self.state,
+                'phase': self.phase,
+                'issuers_done': self.issuers_done,
+                'issuers_total': self.issuers_total,
+                'rows_written': self.rows_written,
+                'message': self.message,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+
+
+class JobRunner:
+    """
+    Runs scrape and analysis jobs one at a time on a single background thread.
+    Submitting a kind that is already queued or running returns the existing job.
+    """
+
+    def __init__(self, history: int = 100, on_finish: Optional[Callable[[Job], None]] = None):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job-runner')
+        self.jobs = OrderedDict()
+        self.history = history  # Finished jobs kept for the status endpoint
+        self.on_finish = on_finish
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+
+    def submit(self, kind: str, func: Callable[[Job], Optional[str]]):
+        """
+        Queue func(job) unless a job of the same kind is pending.
+        Returns (job, created); func may return a completion message.
+        """
+        with self.lock:
+            for job in self.jobs.values():
+                if job.kind == kind and job.active:
+                    return job, False
+
+            job = Job(f"{kind}-{next(self.ids)}", kind)
+            self.jobs[job.id] = job
+            self.prune()
+        self.executor.submit(self.run, job, func)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if not job.active]
+        for job_id in finished[:max(len(finished) - self.history, 0)]:
+            del self.jobs[job_id]
+
+    def run(self, job: Job, func):
+        job.update(state='running', phase='starting', started_at=time.time())
+        try:
+            message = func(job)
+            job.update(state='succeeded', phase='done', message=message)
+        except Exception as e:
+            traceback.print_exc()
+            job.update(state='failed', error=str(e))
+        finally:
+            job.update(finished_at=time.time())
+            if self.on_finish:
+                self.on_finish(job)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -1,17 +1,53 @@
-from datetime import timedelta
+import asyncio
+import random
+import re
+import time
+import warnings
+from collections import deque
+from concurrent.futures import Executor
+from datetime import date, timedelta
+from html.parser import HTMLParser
 
 import aiohttp
+import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
-import warnings
+
+import Metrics
+from HttpCache import HttpCache
+from RateLimiter import TokenBucket
 
 # no_table_codes = []
 
-warnings.filterwarnings("ignore", category=FutureWarning, message="Passing literal html to 'read_html' is deprecated")
+
+# Responses worth retrying: rate limiting and server-side errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Symbol history pages of mse.mk; the issuer code is appended
+BASE_URL = "https://www.mse.mk/en/stats/symbolhistory"
+
+# Windows that ended at least this many days ago are final; their cached pages are never refetched
+SETTLED_DAYS = 7
+
+# Macedonian notation: ',' marks the decimals and '.' (or a space) groups the thousands,
+# e.g. 1.234,56 or 1.234.567; matched after whitespace is removed
+MK_NUMBER = r'-?\d[\d.]*,\d{1,2}|-?\d{1,3}(?:\.\d{3}){2,}'
+
+# Cheap test over a whole newline-joined column for cells that may be in Macedonian notation
+MK_HINT = re.compile(r',\d\d?(?:\n|$)|\.\d{3}\.')
+
+# Whitespace np.fromstring would also take as a separator (spaces are removed before parsing)
+INNER_WHITESPACE = re.compile(r'[\t\r\x0b\x0c]')
+
+HTTP_REQUESTS = Metrics.counter('mse_http_requests_total', "Symbol history requests sent, by response status")
+HTTP_SECONDS = Metrics.histogram('mse_http_request_seconds', "Latency of symbol history requests")
+HTTP_BYTES = Metrics.counter('mse_http_response_bytes_total', "Bytes of symbol history pages downloaded")
+HTTP_RETRIES = Metrics.counter('mse_http_retries_total', "Symbol history requests retried after a failure")
+HTTP_CACHE_HITS = Metrics.counter('mse_http_cache_hits_total', "Symbol history pages served from the HTTP cache")
+PARSE_SECONDS = Metrics.histogram('mse_parse_seconds', "Time spent parsing one symbol history page")
 
 
 def clean_numeric(value):
-    """Clean numeric values, handling both string and numeric inputs"""
+    """Clean numeric values, handling both string and numeric inputs (per value; see clean_numeric_series)"""
     if pd.isna(value):
         return None
     if isinstance(value, (int, float)):
@@ -21,10 +57,169 @@ def clean_numeric(value):
     return None
 
 
+def clean_numeric_series(values: pd.Series) -> pd.Series:
+    """
+    Convert a column of scraped numbers to float64 in one vectorized pass. Accepts the English
+    format of mse.mk (1,234.56), the Macedonian one (1.234,56) and spaces as thousands separators;
+    missing, empty and unparsable cells become NaN. Numeric columns are returned unchanged.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float, copy=False)
+    if values.empty:
+        return values.astype(float)
+
+    # Fast path: the column is joined into one string, the separators are removed from it at once
+    # and NumPy parses all numbers in C
+    joined = '\n'.join(map(str, values.fillna('nan').tolist())).replace(' ', '').replace('\xa0', '')
+    # Empty cells and whitespace inside cells merge into the separators, which can shift values
+    # into other rows while the number count still matches
+    aligned = (joined and '\n\n' not in joined and not joined.startswith('\n') and not joined.endswith('\n')
+               and not INNER_WHITESPACE.search(joined))
+    if aligned and not MK_HINT.search(joined):
+        with warnings.catch_warnings():
+            # fromstring warns and stops early at the first cell it can't parse
+            warnings.simplefilter('error', DeprecationWarning)
+            try:
+                numbers = np.fromstring(joined.replace(',', ''), sep='\n')
+            except (ValueError, DeprecationWarning):
+                numbers = None
+        if numbers is not None and len(numbers) == len(values):
+            return pd.Series(numbers, index=values.index, name=values.name)
+
+    # Macedonian or unparsable cells: convert cell by cell with the pandas string methods
+    text = values.astype('string').str.replace(r'\s', '', regex=True)
+    macedonian = text.str.fullmatch(MK_NUMBER).fillna(False).astype(bool)
+    if macedonian.any():
+        text = text.where(~macedonian, text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    text = text.str.replace(',', '', regex=False)
+    return pd.to_numeric(text, errors='coerce').astype(float)
+
+
+class ResultsTableParser(HTMLParser):
+    """Targeted extractor that only collects the cell texts of the rows in table#resultsTable."""
+
+    def __init__(self, table_id: str = "resultsTable"):
+        super().__init__()
+        self.table_id = table_id
+        self.found = False
+        self.rows = []
+        self._depth = 0  # Table nesting depth while inside the results table
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            if self._depth:
+                self._depth += 1
+            elif dict(attrs).get("id") == self.table_id:
+                self.found = True
+                self._depth = 1
+        elif self._depth == 1:
+            if tag == "tr":
+                self._row = []
+            elif tag == "td" and self._row is not None:
+                self._cell = []
+            elif tag == "th":
+                # Header rows are not data rows
+                self._row = None
+
+    def handle_endtag(self, tag):
+        if not self._depth:
+            return
+        if tag == "table":
+            self._depth -= 1
+        elif self._depth == 1:
+            if tag == "td" and self._cell is not None:
+                text = "".join(self._cell).strip()
+                self._row.append(text or None)
+                self._cell = None
+            elif tag == "tr" and self._row:
+                self.rows.append(self._row)
+                self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def parse_results_table(html, column_names, columns_to_keep):
+    """
+    Parse the symbol history page into a cleaned DataFrame, or None when the page has no results table.
+    Module-level so it can run in a worker process.
+    """
+    parser = ResultsTableParser()
+    parser.feed(html)
+    parser.close()
+    if not parser.found:
+        return None
+
+    rows = [row for row in parser.rows if len(row) == len(column_names)]
+    df = pd.DataFrame(rows, columns=column_names)
+
+    # Keep only the desired columns
+    df = df[columns_to_keep]
+
+    # Convert numeric columns
+    numeric_columns = ['Last Trade Price', 'Max', 'Min', 'Volume', 'Turnover in BEST (denars)']
+    for col in numeric_columns:
+        if col in df.columns:
+            df[col] = clean_numeric_series(df[col])
+
+    # Convert date column to datetime
+    df['Date'] = pd.to_datetime(df['Date']).dt.date
+
+    # Drop rows with missing important data (Last Trade Price, Max, Min)
+    df = df.dropna(subset=['Last Trade Price', 'Max', 'Min'])
+
+    # Optional: If you prefer to fill missing values instead of dropping them
+    # df['Last Trade Price'].fillna(method='ffill', inplace=True)
+    # df['Max'].fillna(method='ffill', inplace=True)
+    # df['Min'].fillna(method='ffill', inplace=True)
+
+    return df
+
+
+def timed_parse_results_table(html, column_names, columns_to_keep):
+    """parse_results_table and the seconds it took, measured in the process that parsed the page."""
+    started = time.perf_counter()
+    df = parse_results_table(html, column_names, columns_to_keep)
+    return df, time.perf_counter() - started
+
+
+def create_session(limit_per_host: int = 10, dns_cache_ttl: int = 300, keepalive_timeout: float = 30,
+                   timeout: float = 60) -> aiohttp.ClientSession:
+    """
+    Create a pooled aiohttp session meant to be shared by every scraper.
+    Connections to mse.mk are kept alive and reused between requests,
+    the number of open connections per host is capped and DNS lookups are cached.
+    """
+    connector = aiohttp.TCPConnector(
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=dns_cache_ttl,
+        keepalive_timeout=keepalive_timeout
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout))
+
+
 class MSEStockScraper:
-    def __init__(self, issuer_code):
-        self.url = f"https://www.mse.mk/en/stats/symbolhistory/{issuer_code}"
+    def __init__(self, issuer_code, session: aiohttp.ClientSession = None,
+                 base_url: str = BASE_URL, window_concurrency: int = 10,
+                 rate_limiter: TokenBucket = None, max_retries: int = 3, backoff_base: float = 0.5,
+                 executor: Executor = None, http_cache: HttpCache = None):
+        self.url = f"{base_url}/{issuer_code}"
         self.symbol = issuer_code
+        # Shared session owned by the caller; when missing, a session is opened per request
+        self.session = session
+        # Maximum number of yearly windows of this issuer fetched at the same time
+        self.window_concurrency = window_concurrency
+        # Every request takes a token from the shared bucket; failed requests are retried
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        # Pages are parsed in this executor (the event loop's default thread pool when missing)
+        self.executor = executor
+        # Downloaded pages are kept here and revalidated instead of downloaded again
+        self.http_cache = http_cache
         self.data = []
         # Column names in order as they appear
         self.column_names = [
@@ -98,50 +293,90 @@ class MSEStockScraper:
     #         print(f"Error scraping table: {self.symbol} - {str(e)}")
     #         return None
 
-    async def scrape_table(self, start_date, end_date):
-        """Scrape the data table for the entire date range and return as a DataFrame."""
-        try:
-            # Convert start_date and end_date to strings in "YYYY-MM-DD" format
-            params = {
-                "FromDate": start_date.strftime("%Y-%m-%d"),
-                "ToDate": end_date.strftime("%Y-%m-%d")
-            }
-            all_data = []
+    async def fetch_html(self, session: aiohttp.ClientSession, params, immutable: bool = False):
+        """
+        Download the symbol history page for the given query parameters.
+        429/5xx responses, timeouts and dropped connections are retried with jittered exponential backoff.
+        With an HTTP cache, immutable pages are stored and then served from disk. Windows that are
+        still open aren't cached: the next run asks for a later window under a new key, so they
+        would only grow the cache.
+        """
+        http_cache = self.http_cache if immutable else None
+        page = http_cache.lookup(self.url, params) if http_cache is not None else None
+        if page is not None and http_cache.is_fresh(page):
+            HTTP_CACHE_HITS.inc(validation='none')
+            return http_cache.text(page)
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.url, params=params) as response:
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                async with session.get(self.url, params=params, headers=HttpCache.validators(page)) as response:
+                    HTTP_REQUESTS.inc(status=response.status)
+                    if response.status == 304 and page is not None:
+                        HTTP_SECONDS.observe(time.perf_counter() - started)
+                        HTTP_CACHE_HITS.inc(validation='304')
+                        return http_cache.text(http_cache.revalidated(page, immutable))
+                    response.raise_for_status()
                     html = await response.text()
-                    soup = BeautifulSoup(html, "html.parser")
+                    body = await response.read()  # Already buffered by text()
+                    HTTP_SECONDS.observe(time.perf_counter() - started)
+                    HTTP_BYTES.inc(len(body))
+                    if http_cache is not None:
+                        http_cache.store(self.url, params, body, response.headers, response.get_encoding(), immutable)
+                    return html
+            except aiohttp.ClientResponseError as e:
+                if e.status not in RETRY_STATUSES or attempt == self.max_retries:
+                    raise
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError):
+                HTTP_REQUESTS.inc(status='error')
+                if attempt == self.max_retries:
+                    raise
+
+            HTTP_RETRIES.inc()
 
-                    table = soup.find("table", id="resultsTable")
-                    if table:
-                        # Read table without headers
-                        df = pd.read_html(str(table), header=None)[0]
-                        df.columns = self.column_names
+            # Full jitter keeps retries from many scrapers from arriving in bursts
+            await asyncio.sleep(random.uniform(0, self.backoff_base * 2 ** attempt))
 
-                        # Keep only the desired columns
-                        df = df[self.columns_to_keep]
+    async def fetch_window(self, start_date, end_date):
+        """
+        Download and parse the data table of one date range.
+        Returns None when the page has no results table; download errors are raised.
+        """
+        # Convert start_date and end_date to strings in "YYYY-MM-DD" format
+        params = {
+            "FromDate": start_date.strftime("%Y-%m-%d"),
+            "ToDate": end_date.strftime("%Y-%m-%d")
+        }
 
-                        # Convert numeric columns
-                        numeric_columns = ['Last Trade Price', 'Max', 'Min', 'Volume', 'Turnover in BEST (denars)']
-                        for col in numeric_columns:
-                            if col in df.columns:
-                                df[col] = df[col].apply(clean_numeric)
+        # Prices of a window that closed long enough ago won't change any more
+        immutable = end_date <= date.today() - timedelta(days=SETTLED_DAYS)
 
-                        # Convert date column to datetime
-                        df['Date'] = pd.to_datetime(df['Date']).dt.date
+        if self.session is not None:
+            html = await self.fetch_html(self.session, params, immutable)
+        else:
+            async with aiohttp.ClientSession() as session:
+                html = await self.fetch_html(session, params, immutable)
 
-                        # Drop rows with missing important data (Last Trade Price, Max, Min)
-                        df = df.dropna(subset=['Last Trade Price', 'Max', 'Min'])
+        # Parsing is CPU-bound, so it runs off the event loop while other downloads continue
+        loop = asyncio.get_running_loop()
+        df, parse_seconds = await loop.run_in_executor(
+            self.executor, timed_parse_results_table, html, self.column_names, self.columns_to_keep
+        )
+        PARSE_SECONDS.observe(parse_seconds)
+        return df
 
-                        # Optional: If you prefer to fill missing values instead of dropping them
-                        # df['Last Trade Price'].fillna(method='ffill', inplace=True)
-                        # df['Max'].fillna(method='ffill', inplace=True)
-                        # df['Min'].fillna(method='ffill', inplace=True)
+    async def scrape_table(self, start_date, end_date):
+        """Scrape the data table for the entire date range and return as a DataFrame."""
+        try:
+            all_data = []
 
-                        all_data.append(df)
-                    else:
-                        print(f"No table found for {self.symbol}")
+            df = await self.fetch_window(start_date, end_date)
+            if df is not None:
+                all_data.append(df)
+            else:
+                print(f"No table found for {self.symbol}")
 
             if all_data:
                 final_data = pd.concat(all_data, ignore_index=True)
@@ -155,31 +390,52 @@ class MSEStockScraper:
             print(f"Error scraping table: {self.symbol} - {str(e)}")
             return None
 
+    @staticmethod
+    def date_windows(start_date, end_date):
+        """
+        Split the date range into consecutive windows of at most one calendar year. Aligning
+        them to calendar years keeps the requests of past years identical between runs, so
+        their pages can be served from the HTTP cache.
+        """
+        windows = []
+        current_start = start_date
+        while current_start < end_date:
+            # The current window ends with its calendar year
+            current_end = min(date(current_start.year, 12, 31), end_date)
+            windows.append((current_start, current_end))
+
+            # Move to the next year
+            current_start = current_end + timedelta(days=1)
+        return windows
+
+    async def scrape_window(self, semaphore, current_start, current_end):
+        """Scrape a single yearly window while holding the window semaphore."""
+        async with semaphore:
+            data = await self.scrape_table(current_start, current_end)
+        if data is not None and not data.empty:
+            print(f"Scraped {len(data)} rows from {current_start} to {current_end} for {self.symbol}")
+            return data
+        print(f"No data found from {current_start} to {current_end}")
+        return None
+
     async def scrape_historical_data(self, start_date, end_date):
-        """Scrape data for the specified date range in yearly increments."""
+        """Scrape data for the specified date range, fetching the yearly windows concurrently."""
         try:
             print(f"Scraping data for code: {self.symbol}")
-            all_data = []  # To store the combined data from each yearly scrape
-
-            current_start = start_date
-            while current_start < end_date:
-                # Calculate the end of the current one-year period
-                current_end = min(current_start + timedelta(days=365), end_date)
-
-                # Scrape data for the current year range
-                data = await self.scrape_table(current_start, current_end)
-                if data is not None and not data.empty:
-                    all_data.append(data)
-                    print(f"Scraped {len(data)} rows from {current_start} to {current_end} for {self.symbol}")
-                else:
-                    print(f"No data found from {current_start} to {current_end}")
+            semaphore = asyncio.Semaphore(self.window_concurrency)
 
-                # Move to the next year
-                current_start = current_end + timedelta(days=1)
+            # The windows don't depend on each other, so they are fetched at the same time;
+            # gather keeps the results in window (date) order
+            results = await asyncio.gather(*(
+                self.scrape_window(semaphore, current_start, current_end)
+                for current_start, current_end in self.date_windows(start_date, end_date)
+            ))
+            all_data = [data for data in results if data is not None]
 
             # Combine all data into a single DataFrame if any data was found
             if all_data:
                 final_data = pd.concat(all_data, ignore_index=True)
+                final_data = final_data.drop_duplicates(ignore_index=True)
                 print(f"Successfully scraped {len(final_data)} rows in total for code: {self.symbol}")
                 return final_data
             else:
@@ -189,3 +445,35 @@ class MSEStockScraper:
         except Exception as e:
             print(f"Error scraping historical data for code: {self.symbol} - {str(e)}")
             return None
+
+    async def stream_historical_data(self, start_date, end_date):
+        """
+        Yield the windows of the date range one DataFrame at a time, in date order.
+        At most window_concurrency windows are downloaded ahead of the consumer, so memory stays
+        the same however long the range is. A failed window is raised after every earlier window
+        was yielded and later ones are dropped, so stored history never has gaps.
+        """
+        windows = iter(self.date_windows(start_date, end_date))
+        pending = deque()
+        try:
+            while True:
+                # Keep the read-ahead full
+                while len(pending) < self.window_concurrency:
+                    window = next(windows, None)
+                    if window is None:
+                        break
+                    pending.append((window, asyncio.create_task(self.fetch_window(*window))))
+                if not pending:
+                    break
+
+                (current_start, current_end), task = pending.popleft()
+                data = await task
+                if data is not None and not data.empty:
+                    print(f"Scraped {len(data)} rows from {current_start} to {current_end} for {self.symbol}")
+                    yield data.drop_duplicates(ignore_index=True)
+                else:
+                    print(f"No data found from {current_start} to {current_end}")
+        finally:
+            for _, task in pending:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
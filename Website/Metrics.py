@@ -0,0 +1,252 @@
+"""
+Lightweight in-process metrics for the scrape and analysis pipelines.
+
+Counters and histograms are registered in the module-level REGISTRY by the modules that record
+them. The Flask app exposes the registry in the Prometheus text format at /metrics, and
+run_pipeline() writes a JSON summary of every run (the difference between two snapshots).
+With MSE_METRICS=0 nothing is recorded and every call returns right away.
+"""
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Optional, Tuple
+
+METRICS_ENABLED = os.environ.get('MSE_METRICS', '1') != '0'
+
+# JSON summary written at the end of each scrape run; an empty MSE_RUN_SUMMARY disables it
+RUN_SUMMARY_PATH = os.environ.get('MSE_RUN_SUMMARY', 'run_summary.json')
+
+# Upper bounds in seconds of the default histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Buckets for whole pipeline phases, which run for seconds to hours
+PHASE_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0, 7200.0)
+
+
+def label_key(labels: Dict) -> Tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(key: Tuple) -> str:
+    """Prometheus label set, e.g. {status="200",le="0.5"}; empty without labels."""
+    if not key:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in key)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + '}'
+
+
+def label_text(key: Tuple) -> str:
+    """Label set as used in JSON snapshots, e.g. "status=200"; "all" without labels."""
+    return ','.join(f"{name}={value}" for name, value in key) or 'all'
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing value per label set."""
+    kind = 'counter'
+
+    def __init__(self, registry: 'Registry', name: str, help_text: str):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not self.registry.enabled:
+            return
+        key = label_key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def clear(self):
+        self.values = {}
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self.values.items()]
+
+    def snapshot(self) -> Dict:
+        return {label_text(key): value for key, value in self.values.items()}
+
+
+class Timer:
+    """Context manager observing the seconds spent in its block into a histogram."""
+
+    def __init__(self, histogram: 'Histogram', labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        if self.histogram.registry.enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram:
+    """Distribution of observed values per label set, counted in cumulative buckets."""
+    kind = 'histogram'
+
+    def __init__(self, registry: 'Registry', name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # label key -> [count per bucket (last one is +Inf), count, sum]
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        key = label_key(labels)
+        with self.registry.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += 1
+            series[2] += value
+
+    def time(self, **labels) -> Timer:
+        return Timer(self, labels)
+
+    def clear(self):
+        self.series = {}
+
+    def samples(self):
+        samples = []
+        for key, (counts, count, total) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", key + (('le', format_value(bound)),), cumulative))
+            samples.append((f"{self.name}_sum", key, total))
+            samples.append((f"{self.name}_count", key, count))
+        return samples
+
+    def snapshot(self) -> Dict:
+        return {
+            label_text(key): {'buckets': list(counts), 'count': count, 'sum': total}
+            for key, (counts, count, total) in self.series.items()
+        }
+
+
+class Registry:
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric_class, name: str, help_text: str, **options):
+        # Modules may be imported more than once (e.g. by worker processes); reuse the metric
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(self, name, help_text, **options)
+        return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self.register(Counter, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self.lock:
+            for metric in self.metrics.values():
+                lines.append(f"# HELP {metric.name} {metric.help_text}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                for name, key, value in metric.samples():
+                    lines.append(f"{name}{format_labels(key)} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def reset(self):
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.clear()
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+
+PHASE_SECONDS = histogram('mse_phase_seconds', "Duration of scrape and analysis phases, by phase",
+                          buckets=PHASE_BUCKETS)
+
+
+def quantile(buckets, bounds, count: int, q: float) -> Optional[float]:
+    """Upper bound of the bucket holding the q-quantile (None above the last finite bucket)."""
+    rank = q * count
+    cumulative = 0
+    for bound, bucket_count in zip((*bounds, None), buckets):
+        cumulative += bucket_count
+        if cumulative >= rank:
+            return bound
+    return None
+
+
+def summarize(before: Dict, after: Dict) -> Dict:
+    """What was recorded between two snapshots: counter increments and histogram statistics."""
+    summary = {}
+    for name, series in after.items():
+        metric = REGISTRY.metrics.get(name)
+        values = {}
+        for labels, value in series.items():
+            previous = before.get(name, {}).get(labels)
+            if isinstance(value, dict):
+                previous = previous or {'buckets': [0] * len(value['buckets']), 'count': 0, 'sum': 0.0}
+                count = value['count'] - previous['count']
+                if not count:
+                    continue
+                total = value['sum'] - previous['sum']
+                buckets = [now - then for now, then in zip(value['buckets'], previous['buckets'])]
+                values[labels] = {
+                    'count': count, 'sum': round(total, 6), 'mean': round(total / count, 6),
+                    'p50': quantile(buckets, metric.buckets, count, 0.5),
+                    'p95': quantile(buckets, metric.buckets, count, 0.95),
+                }
+            else:
+                increment = value - (previous or 0)
+                if increment:
+                    values[labels] = increment
+        if values:
+            summary[name] = values
+    return summary
+
+
+def write_run_summary(path: Optional[str], before: Dict, started_at: float, **fields) -> Optional[Dict]:
+    """Write the summary of a run started at started_at (time.time()) with a snapshot taken then."""
+    if not path:
+        return None
+    finished_at = time.time()
+    summary = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started_at)),
+        'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(finished_at)),
+        'duration_seconds': round(finished_at - started_at, 3),
+        **fields,
+        'metrics': summarize(before, REGISTRY.snapshot()),
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
@@ -0,0 +1,17 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# Modules the fork server imports once, so the workers forked from it start with them loaded
+PRELOAD_MODULES = ['MSEStockScraper', 'TechnicalAnalysis']
+
+
+def process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Process pool whose workers are forked from a fork server instead of from this process.
+    The web app runs scrapes and analyses on job threads, and forking a process while other
+    threads hold locks can deadlock the children (Python 3.12 warns about it).
+    """
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(PRELOAD_MODULES)
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
@@ -0,0 +1,28 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by all coroutines that talk to the same host."""
+
+    def __init__(self, rate: float, capacity: Optional[int] = None):
+        self.rate = rate  # Tokens added per second
+        self.capacity = capacity or max(1, int(rate))  # Largest allowed burst
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it. Waiters are served in arrival order."""
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
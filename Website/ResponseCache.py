@@ -0,0 +1,54 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional
+
+
+class CachedResponse(NamedTuple):
+    body: bytes  # Serialized JSON, sent as is
+    status: int
+    etag: str
+    expires_at: float
+    encoding: Optional[str] = None  # Content-Encoding of body (e.g. gzip), None when uncompressed
+
+
+class ResponseCache:
+    """Thread-safe, bounded LRU cache with a TTL for pre-serialized JSON responses."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl  # Bounds staleness when the data changes outside this process
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, body: bytes, status: int, encoding: Optional[str] = None) -> CachedResponse:
+        """
+        Cache a response and return its entry. Only 200 responses are stored: a 404 or an error
+        must end as soon as the data shows up, and runs outside this process never clear the cache.
+        """
+        entry = CachedResponse(body, status, hashlib.sha1(body).hexdigest(), time.monotonic() + self.ttl, encoding)
+        if status != 200:
+            return entry
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """Drop every entry, called when a scrape or analysis run changes the data."""
+        with self.lock:
+            self.entries.clear()
@@ -1,58 +1,127 @@
 from abc import abstractmethod, ABC
 from bs4 import BeautifulSoup
-from typing import List
-import requests
+from typing import List, Optional
+import asyncio
+import aiohttp
+
+from HttpCache import HttpCache
+
+# Seconds a cached issuer listing is used without asking the server whether it changed
+LISTING_MAX_AGE = 3600
+
+# Seconds allowed for one listing request in the async strategies
+LISTING_TIMEOUT = 15
+
+
+def parse_dropdown_codes(html) -> List[str]:
+    """Issuer codes listed in the symbol dropdown of a symbol history page."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    dropdown = soup.find('select', {'id': 'Code'})
+    if dropdown is None:
+        raise ValueError("Issuer code dropdown not found")
+    options = dropdown.find_all('option')
+    codes = [option['value'] for option in options if option['value']]
+
+    return codes
+
+
+def parse_table_codes(html) -> List[str]:
+    """Issuer codes in the first column of a listing table."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    codes = []
+    table = soup.find('table', {'id': 'otherlisting-table'})
+    if table:
+        rows = table.find_all('tr')
+        for row in rows:
+            columns = row.find_all('td')
+            if columns:  # Make sure row has columns
+                symbol = columns[0].get_text(strip=True)
+                if symbol:
+                    codes.append(symbol)
+    return codes
 
 
 # Abstract Base Class for Strategy
 class IssuerCodeStrategy(ABC):
+    http_cache: Optional[HttpCache] = None
+
+    def fetch(self, url: str) -> bytes:
+        """Download a listing page, through the HTTP cache when one is set."""
+        if self.http_cache is not None:
+            return self.http_cache.get(url, max_age=LISTING_MAX_AGE)
+        import requests  # Only the synchronous strategies use requests; the pipeline uses aiohttp
+
+        response = requests.get(url)
+        response.raise_for_status()
+        return response.content
+
+    async def fetch_async(self, session: aiohttp.ClientSession, url: str) -> bytes:
+        """fetch() on an aiohttp session, limited to LISTING_TIMEOUT seconds."""
+        if self.http_cache is not None:
+            return await self.http_cache.get_async(session, url, max_age=LISTING_MAX_AGE, timeout=LISTING_TIMEOUT)
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=LISTING_TIMEOUT)) as response:
+            response.raise_for_status()
+            return await response.read()
+
     @abstractmethod
     def get_issuer_codes(self) -> List[str]:
         """Fetch issuer codes"""
         pass
 
+    async def get_issuer_codes_async(self, session: aiohttp.ClientSession) -> List[str]:
+        """Fetch issuer codes without blocking the event loop (runs get_issuer_codes in a thread by default)."""
+        return await asyncio.to_thread(self.get_issuer_codes)
+
 
 # Concrete Strategy: Fetch codes from a dropdown
 class DropdownIssuerCodeStrategy(IssuerCodeStrategy):
-    def __init__(self, url: str):
+    def __init__(self, url: str, http_cache: Optional[HttpCache] = None):
         self.url = url
+        self.http_cache = http_cache
 
     def get_issuer_codes(self) -> List[str]:
-        response = requests.get(self.url)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        return parse_dropdown_codes(self.fetch(self.url))
 
-        dropdown = soup.find('select', {'id': 'Code'})
-        options = dropdown.find_all('option')
-        codes = [option['value'] for option in options if option['value']]
-
-        return codes
+    async def get_issuer_codes_async(self, session: aiohttp.ClientSession) -> List[str]:
+        return parse_dropdown_codes(await self.fetch_async(session, self.url))
 
 
 # Concrete Strategy: Fetch codes from a table
 class TableIssuerCodeStrategy(IssuerCodeStrategy):
-    def __init__(self, urls: List[str]):
+    def __init__(self, urls: List[str], http_cache: Optional[HttpCache] = None):
         self.urls = urls
+        self.http_cache = http_cache
 
     def get_issuer_codes(self) -> List[str]:
+        import requests
+
         all_codes = []
         for url in self.urls:
             try:
-                response = requests.get(url)
-                response.raise_for_status()  # Raise an exception for bad status codes
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                table = soup.find('table', {'id': 'otherlisting-table'})
-                if table:
-                    rows = table.find_all('tr')
-                    for row in rows:
-                        columns = row.find_all('td')
-                        if columns:  # Make sure row has columns
-                            symbol = columns[0].get_text(strip=True)
-                            if symbol:
-                                all_codes.append(symbol)
+                # Raises for bad status codes
+                all_codes.extend(parse_table_codes(self.fetch(url)))
             except requests.RequestException as e:
                 print(f"Error fetching data from {url}: {e}")
 
         # Remove duplicates while preserving order
         unique_codes = list(dict.fromkeys(all_codes))
         return unique_codes
+
+    async def get_issuer_codes_async(self, session: aiohttp.ClientSession) -> List[str]:
+        # All listing pages are requested at once; codes keep the order of self.urls
+        pages = await asyncio.gather(*(self.fetch_async(session, url) for url in self.urls), return_exceptions=True)
+
+        all_codes = []
+        for url, page in zip(self.urls, pages):
+            if isinstance(page, (aiohttp.ClientError, asyncio.TimeoutError)):
+                print(f"Error fetching data from {url}: {page}")
+            elif isinstance(page, BaseException):
+                raise page
+            else:
+                all_codes.extend(parse_table_codes(page))
+
+        # Remove duplicates while preserving order
+        unique_codes = list(dict.fromkeys(all_codes))
+        return unique_codes
@@ -1,7 +1,57 @@
+import argparse
+import numpy as np
 import pandas as pd
-import sqlite3
-import ta
+import BarRollup
+import ColumnarStore
+import DatabaseAccess
+import DatabaseManager
+import IndicatorEngine
+import Metrics
+import ProcessPool
+from DatabaseManager import JULIAN_TO_DAY
+from concurrent.futures import as_completed
 from datetime import datetime
+from multiprocessing import shared_memory
+
+PERIODS = ['daily', 'weekly', 'monthly']
+
+# Periods whose bars are maintained at ingest time (see BarRollup)
+BAR_PERIODS = list(BarRollup.BAR_TABLES)
+
+INDICATOR_COLUMNS = [
+    'issuer_code', 'Date', 'time_period', 'Signal', 'SMA_20', 'SMA_50', 'EMA_20', 'EMA_50',
+    'RSI', 'MACD', 'Stoch', 'CCI', 'Williams %R'
+]
+
+# Bars of history reloaded before the last analyzed bar in incremental mode. Covers the
+# longest lookback (SMA_50, the 26-bar MACD EMA) and lets the EMA and RSI state converge
+WARMUP_BARS = 400
+
+# First day of the stored bar WARMUP_BARS bars before the last analyzed one. Bars are counted
+# in the stored rows, not in calendar time: thinly traded issuers have few bars per year
+WARMUP_START_QUERIES = {
+    'daily': '''
+        SELECT day FROM stock_prices WHERE issuer_id = ? AND day <= ?
+        ORDER BY day DESC LIMIT 1 OFFSET ?
+    ''',
+    **{period: f'''
+        SELECT first_day FROM {table} WHERE issuer_id = ? AND bucket <= ?
+        ORDER BY bucket DESC LIMIT 1 OFFSET ?
+    ''' for period, table in BarRollup.BAR_TABLES.items()},
+}
+
+# Columns of latest_snapshot besides the key: the indicators and the last bar's prices
+SNAPSHOT_VALUE_COLUMNS = {
+    'Signal': 'TEXT', 'SMA_20': 'REAL', 'SMA_50': 'REAL', 'EMA_20': 'REAL', 'EMA_50': 'REAL', 'RSI': 'REAL',
+    'MACD': 'REAL', 'Stoch': 'REAL', 'CCI': 'REAL', 'Williams %R': 'REAL',
+    'Last Trade Price': 'REAL', 'Volume': 'REAL', 'Turnover in BEST (denars)': 'REAL',
+}
+
+# Stock data columns placed in shared memory for the worker processes
+SHARED_COLUMNS = ['issuer_code', 'Date', 'Last Trade Price', 'Max', 'Min', 'Volume', 'Turnover in BEST (denars)']
+
+# Chunks handed to each worker; several per worker keep the pool busy when chunk run times differ
+CHUNKS_PER_WORKER = 4
 
 
 # Define technical indicators
@@ -10,6 +60,8 @@ def calculate_indicators(data):
     Calculates technical indicators for the given data.
     Returns the data with indicators and signals.
     """
+    import ta  # Only this reference path uses the ta library; IndicatorEngine computes the same values
+
     print("  Calculating technical indicators...")
 
     print("    - Computing Moving Averages")
@@ -52,19 +104,23 @@ def analyze_for_time_period(data, period):
         resampled_data = data
     elif period == 'weekly':
         print("    - Resampling to weekly data")
-        resampled_data = data.set_index('Date').resample('W').agg({
-            'Last Trade Price': 'mean',
+        resampled_data = data.assign(Open=data['Last Trade Price']).set_index('Date').resample('W').agg({
+            'Open': 'first',
+            'Last Trade Price': 'last',
             'Max': 'max',
             'Min': 'min',
-            'Volume': 'sum'
+            'Volume': 'sum',
+            'Turnover in BEST (denars)': 'sum'
         }).reset_index()
     elif period == 'monthly':
         print("    - Resampling to monthly data")
-        resampled_data = data.set_index('Date').resample('ME').agg({
-            'Last Trade Price': 'mean',
+        resampled_data = data.assign(Open=data['Last Trade Price']).set_index('Date').resample('ME').agg({
+            'Open': 'first',
+            'Last Trade Price': 'last',
             'Max': 'max',
             'Min': 'min',
-            'Volume': 'sum'
+            'Volume': 'sum',
+            'Turnover in BEST (denars)': 'sum'
         }).reset_index()
     else:
         raise ValueError("Invalid period. Must be 'daily', 'weekly', or 'monthly'.")
@@ -74,75 +130,460 @@ def analyze_for_time_period(data, period):
     return analyzed_data
 
 
-def technical_analysis(database_path):
+def ensure_indicator_schema(conn):
+    """
+    Create the technical_indicators table if it doesn't exist. It is clustered on
+    (issuer_code, time_period, Date DESC) as a WITHOUT ROWID table, so the dashboard's
+    "latest n bars of an issuer" reads are a single range scan that covers every column,
+    and incremental runs can upsert on the key.
+    Tables created by older versions (plain to_sql tables) are migrated in place.
+    """
+    existing = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'technical_indicators'"
+    ).fetchone()
+    if existing and 'WITHOUT ROWID' in existing[0].upper():
+        return
+    if existing:
+        conn.execute("ALTER TABLE technical_indicators RENAME TO technical_indicators_old")
+
+    conn.execute('''
+        CREATE TABLE technical_indicators (
+            issuer_code TEXT NOT NULL,
+            "Date" TIMESTAMP NOT NULL,
+            time_period TEXT NOT NULL,
+            "Signal" TEXT,
+            "SMA_20" REAL,
+            "SMA_50" REAL,
+            "EMA_20" REAL,
+            "EMA_50" REAL,
+            "RSI" REAL,
+            "MACD" REAL,
+            "Stoch" REAL,
+            "CCI" REAL,
+            "Williams %R" REAL,
+            PRIMARY KEY (issuer_code, time_period, "Date" DESC)
+        ) WITHOUT ROWID
+    ''')
+
+    if existing:
+        columns = ', '.join(f'"{col}"' for col in INDICATOR_COLUMNS)
+        conn.execute(f"INSERT OR REPLACE INTO technical_indicators ({columns}) "
+                     f"SELECT {columns} FROM technical_indicators_old")
+        conn.execute("DROP TABLE technical_indicators_old")
+
+
+def ensure_snapshot_schema(conn):
+    """
+    Create latest_snapshot: the last analyzed bar of every (issuer, period) with its close,
+    volume and turnover, so market-wide screens read one row per issuer. Clustered on
+    (time_period, issuer_code), a period is one range scan of the table.
+    """
+    snapshot_columns = ',\n'.join(f'            "{col}" {kind}' for col, kind in SNAPSHOT_VALUE_COLUMNS.items())
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS latest_snapshot (
+            issuer_code TEXT NOT NULL,
+            time_period TEXT NOT NULL,
+            "Date" TIMESTAMP NOT NULL,
+{snapshot_columns},
+            PRIMARY KEY (time_period, issuer_code)
+        ) WITHOUT ROWID
+    ''')
+
+
+def refresh_latest_snapshot(conn, issuers=None):
+    """
+    Rebuild the latest_snapshot rows of the given issuers (every issuer when None) from
+    technical_indicators and the daily prices or stored bars of each last bar. Runs in the
+    caller's transaction; returns the rows written.
+    """
+    source = 'technical_indicators'
+    if issuers is None:
+        conn.execute("DELETE FROM latest_snapshot")
+    else:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS snapshot_issuers (issuer_code TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.snapshot_issuers")
+        conn.executemany("INSERT INTO temp.snapshot_issuers VALUES (?)", [(issuer,) for issuer in issuers])
+        conn.execute("DELETE FROM latest_snapshot WHERE issuer_code IN (SELECT issuer_code FROM temp.snapshot_issuers)")
+        source = "technical_indicators WHERE issuer_code IN (SELECT issuer_code FROM temp.snapshot_issuers)"
+
+    indicators = ', '.join(f'"{col}"' for col in INDICATOR_COLUMNS[3:])
+    latest_indicators = ', '.join(f'l."{col}"' for col in INDICATOR_COLUMNS[3:])
+    # With MAX() SQLite takes the bare columns from the row holding the maximum, i.e. the last bar
+    cursor = conn.execute(f'''
+        INSERT INTO latest_snapshot
+        WITH latest AS (
+            SELECT issuer_code, time_period, MAX("Date") AS "Date", {indicators}
+            FROM {source}
+            GROUP BY issuer_code, time_period
+        ), keyed AS (
+            SELECT l.*, i.issuer_id, {JULIAN_TO_DAY.format('l."Date"')} AS day
+            FROM latest l JOIN issuers i ON i.issuer_code = l.issuer_code
+        )
+        SELECT l.issuer_code, l.time_period, l."Date", {latest_indicators},
+               COALESCE(p.last_trade_price, w.close, m.close),
+               COALESCE(p.volume, w.volume, m.volume),
+               COALESCE(p.turnover, w.turnover, m.turnover)
+        FROM keyed l
+        LEFT JOIN stock_prices p
+            ON l.time_period = 'daily' AND p.issuer_id = l.issuer_id AND p.day = l.day
+        LEFT JOIN {BarRollup.BAR_TABLES['weekly']} w
+            ON l.time_period = 'weekly' AND w.issuer_id = l.issuer_id AND w.bucket = (l.day - 3) / 7
+        LEFT JOIN {BarRollup.BAR_TABLES['monthly']} m
+            ON l.time_period = 'monthly' AND m.issuer_id = l.issuer_id
+            AND m.bucket = (CAST(strftime('%Y', l."Date") AS INTEGER) - 1970) * 12
+                           + CAST(strftime('%m', l."Date") AS INTEGER) - 1
+    ''')
+    return cursor.rowcount
+
+
+def get_stock_last_dates(conn):
+    """Last stored trading day per issuer, from the watermark table maintained by DatabaseManager."""
+    has_watermark = conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'issuer_watermark')"
+    ).fetchone()[0]
+    if has_watermark:
+        query = "SELECT issuer_code, last_date FROM issuer_watermark"
+    else:
+        query = 'SELECT issuer_code, MAX("Date") FROM stock_data GROUP BY issuer_code'
+    return {issuer: pd.Timestamp(last_date) for issuer, last_date in conn.execute(query) if last_date}
+
+
+def get_indicator_watermarks(conn):
+    """Last analyzed bar per (issuer, period)."""
+    rows = conn.execute(
+        'SELECT issuer_code, time_period, MAX("Date") FROM technical_indicators GROUP BY issuer_code, time_period'
+    )
+    return {(issuer, period): pd.Timestamp(last_date) for issuer, period, last_date in rows if last_date}
+
+
+def warmup_start(conn, issuer_id, period, watermark):
+    """
+    Start date of the warm-up window of one issuer and period: WARMUP_BARS stored bars before
+    the watermark, or None (the full history) when fewer bars are stored.
+    """
+    if watermark is None:
+        return None
+    day = int(np.datetime64(watermark, 'D').astype(np.int64))
+    key = day if period == 'daily' else int(BarRollup.day_buckets([day], period)[0])
+    row = conn.execute(WARMUP_START_QUERIES[period], (issuer_id, key, WARMUP_BARS)).fetchone()
+    return None if row is None else pd.Timestamp(np.datetime64(row[0], 'D'))
+
+
+def plan_incremental_windows(conn, stock_last_dates, watermarks):
+    """
+    Decide which issuers have new bars and from which date each period's history has to be reloaded.
+    Issuers missing the indicators of a period (e.g. dropped after a bar rebuild) are planned too.
+    Returns {issuer_code: {period: start date, or None for the full history}}.
+    """
+    issuer_ids = dict(conn.execute("SELECT issuer_code, issuer_id FROM issuers"))
+    windows = {}
+    for issuer, last_date in stock_last_dates.items():
+        daily_watermark = watermarks.get((issuer, 'daily'))
+        analyzed = all((issuer, period) in watermarks for period in PERIODS)
+        if analyzed and last_date <= daily_watermark:
+            continue  # Nothing new since the last run
+
+        windows[issuer] = {
+            period: warmup_start(conn, issuer_ids[issuer], period, watermarks.get((issuer, period)))
+            for period in PERIODS
+        }
+    return windows
+
+
+def load_start(period_starts):
+    """Earliest start date over all periods, as stored in stock_data (None loads everything)."""
+    if any(start is None for start in period_starts.values()):
+        return None
+    return min(period_starts.values()).strftime('%Y-%m-%d')
+
+
+def load_start_day(period_starts):
+    """load_start as days since 1970-01-01, the format of stock_prices.day."""
+    start = load_start(period_starts)
+    return None if start is None else int(np.datetime64(start, 'D').astype(np.int64))
+
+
+def period_starts(stock_data, windows, period):
+    """Per-row start date of the period's warm-up window (NaT keeps the issuer's full history)."""
+    return pd.to_datetime(stock_data['issuer_code'].map(
+        {issuer: starts[period] for issuer, starts in windows.items()}
+    ))
+
+
+def load_stock_data(conn, windows=None):
+    """
+    Load the price history. With windows (see plan_incremental_windows) only those issuers
+    are loaded, each from the earliest start date any of its periods needs.
+    Dates are stored as epoch days, so the Date column is built without parsing strings.
+    """
+    query = '''
+    SELECT 
+        i.issuer_code, 
+        p.day, 
+        p.last_trade_price AS "Last Trade Price", 
+        p.max_price AS "Max", 
+        p.min_price AS "Min", 
+        p.volume AS "Volume", 
+        p.turnover AS "Turnover in BEST (denars)" 
+    '''
+    if windows is None:
+        query += '''
+    FROM stock_prices p
+    JOIN issuers i ON i.issuer_id = p.issuer_id
+    '''
+    else:
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS analysis_window (issuer_code TEXT PRIMARY KEY, start_day INTEGER)"
+        )
+        conn.execute("DELETE FROM temp.analysis_window")
+        conn.executemany(
+            "INSERT INTO temp.analysis_window (issuer_code, start_day) VALUES (?, ?)",
+            [(issuer, load_start_day(period_starts)) for issuer, period_starts in windows.items()]
+        )
+        # CROSS JOIN fixes the join order so every issuer is read as one range of the primary key
+        query += '''
+    FROM temp.analysis_window w
+    CROSS JOIN issuers i ON i.issuer_code = w.issuer_code
+    CROSS JOIN stock_prices p ON p.issuer_id = i.issuer_id AND p.day >= IFNULL(w.start_day, -2147483648)
+    '''
+    stock_data = pd.read_sql_query(query, conn)
+    day = stock_data.pop('day').to_numpy(dtype=np.int64)
+    stock_data.insert(1, 'Date', day.astype('datetime64[D]').astype('datetime64[ns]'))
+    return stock_data
+
+
+def save_indicators(conn, results_df):
+    """Upsert indicator rows. The caller commits."""
+    rows = results_df[INDICATOR_COLUMNS].copy()
+    rows['Date'] = rows['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    columns = ', '.join(f'"{col}"' for col in INDICATOR_COLUMNS)
+    placeholders = ', '.join('?' * len(INDICATOR_COLUMNS))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO technical_indicators ({columns}) VALUES ({placeholders})",
+        rows.itertuples(index=False, name=None)
+    )
+
+
+def analyze_frames(stock_data, windows=None, watermarks=None, bars=None):
+    """
+    Analyze issuer-sorted stock data for every period. Yields one DataFrame per period.
+    In incremental mode (windows/watermarks set) only the bars from each watermark onwards are kept.
+    bars ({period: BarRollup.load_bars output}) replaces resampling the daily rows for those periods.
+    """
+    bars = bars or {}
+    for period in PERIODS:
+        if period in bars:
+            analyzed_data = IndicatorEngine.analyze(bars[period], period, resample=False)
+        else:
+            period_data = stock_data
+            if windows is not None:
+                starts = period_starts(stock_data, windows, period)
+                period_data = stock_data[starts.isna() | (stock_data['Date'] >= starts)]
+            analyzed_data = IndicatorEngine.analyze(period_data, period)
+
+        # Warm-up bars were only loaded to seed the indicators; the last analyzed bar is
+        # recomputed because its weekly/monthly bucket may have received new days
+        if windows is not None:
+            # to_datetime keeps the type when no issuer has a watermark yet (an all-NaN float map)
+            period_watermarks = pd.to_datetime(analyzed_data['issuer_code'].map(
+                {issuer: watermark for (issuer, wm_period), watermark in watermarks.items() if wm_period == period}
+            ))
+            analyzed_data = analyzed_data[period_watermarks.isna() | (analyzed_data['Date'] >= period_watermarks)]
+        yield analyzed_data[INDICATOR_COLUMNS]
+
+
+def share_stock_data(stock_data):
+    """
+    Copy the issuer-sorted stock data into one shared memory block, one contiguous float64 row per
+    column of SHARED_COLUMNS (issuer codes as category numbers, dates as epoch days).
+    Returns the block and the issuer categories.
+    """
+    codes, categories = pd.factorize(stock_data['issuer_code'])
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(SHARED_COLUMNS) * len(stock_data) * 8))
+    block = np.ndarray((len(SHARED_COLUMNS), len(stock_data)), dtype=np.float64, buffer=shm.buf)
+    block[0] = codes
+    block[1] = stock_data['Date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    for row, col in enumerate(SHARED_COLUMNS[2:], start=2):
+        block[row] = stock_data[col].to_numpy(dtype=float)
+    del block
+    return shm, list(categories)
+
+
+def analyze_shared_chunk(shm_name, total_rows, start, end, categories, windows, watermarks):
+    """Worker: rebuild rows [start, end) from shared memory and analyze them."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        block = np.ndarray((len(SHARED_COLUMNS), total_rows), dtype=np.float64, buffer=shm.buf)[:, start:end]
+        stock_data = pd.DataFrame({
+            'issuer_code': np.asarray(categories, dtype=object)[block[0].astype(np.int64)],
+            'Date': block[1].astype(np.int64).astype('datetime64[D]').astype('datetime64[ns]'),
+            **{col: block[row].copy() for row, col in enumerate(SHARED_COLUMNS[2:], start=2)}
+        })
+        del block
+    finally:
+        shm.close()
+    return list(analyze_frames(stock_data, windows, watermarks))
+
+
+def chunk_bounds(issuer_codes, chunks):
+    """Split issuer-sorted rows into about `chunks` row ranges of similar size that never split an issuer."""
+    codes = issuer_codes.to_numpy()
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.zeros(0, dtype=int)
+    targets = np.linspace(0, len(codes), chunks + 1)[1:-1]
+    cuts = np.unique(starts[np.clip(np.searchsorted(starts, targets), 0, len(starts) - 1)]) if len(starts) else []
+    bounds = [0, *[int(cut) for cut in cuts if cut > 0], len(codes)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def iter_analysis(stock_data, windows=None, watermarks=None, workers=1, bars=None):
+    """
+    Yield analyzed frames as they become available. With several workers the issuers are split
+    into chunks analyzed in a process pool; workers read their rows from shared memory and
+    resample the weekly and monthly bars themselves.
+    """
+    if workers <= 1:
+        yield from analyze_frames(stock_data, windows, watermarks, bars)
+        return
+
+    bounds = chunk_bounds(stock_data['issuer_code'], workers * CHUNKS_PER_WORKER)
+    shm, categories = share_stock_data(stock_data)
+    try:
+        with ProcessPool.process_pool(workers) as executor:
+            futures = []
+            for start, end in bounds:
+                # Workers only receive the incremental plan of their own issuers
+                chunk_windows = chunk_watermarks = None
+                if windows is not None:
+                    chunk_issuers = set(stock_data['issuer_code'].iloc[start:end])
+                    chunk_windows = {issuer: windows[issuer] for issuer in chunk_issuers}
+                    chunk_watermarks = {key: value for key, value in watermarks.items() if key[0] in chunk_issuers}
+                futures.append(executor.submit(
+                    analyze_shared_chunk, shm.name, len(stock_data), start, end, categories,
+                    chunk_windows, chunk_watermarks
+                ))
+            for done, future in enumerate(as_completed(futures), start=1):
+                print(f"Progress: {done}/{len(futures)} chunks ({done / len(futures) * 100:.1f}%)")
+                yield from future.result()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def technical_analysis(database_path, incremental=False, workers=1, report=None, columnar_path=None):
     """
     Performs technical analysis on stock data stored in the SQLite database.
     Calculates indicators for three time periods: daily, weekly, and monthly.
     Saves the results in a single table called 'technical_indicators'.
+
+    In incremental mode only issuers with new bars are processed. Their history is reloaded from a
+    warm-up window before the last analyzed bar, and only bars from that bar onwards are upserted.
+    With workers > 1 the issuers are analyzed in chunks by a pool of processes.
+    Stock data is read from the columnar store (see ColumnarStore) when one is enabled and in sync.
+    report(**fields) receives the phase and progress (see JobRunner.Job); returns the rows saved.
     """
+    report = report or (lambda **fields: None)
     start_time = datetime.now()
     print(f"\nStarting technical analysis at {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
 
     print("\nConnecting to database...")
-    conn = sqlite3.connect(database_path)
-    cursor = conn.cursor()
+    # Databases that were never written by this version (an original stock_data table) are
+    # migrated to the price schema first, the same way the scraper's DatabaseManager does it
+    DatabaseManager.DatabaseManager(database_path).close()
+    conn = DatabaseAccess.connect(database_path)
+
+    watermarks = {}
+    windows = None
+    if incremental:
+        ensure_indicator_schema(conn)
+        ensure_snapshot_schema(conn)
+        # Databases analyzed before the snapshot existed get it once
+        if not conn.execute("SELECT EXISTS (SELECT 1 FROM latest_snapshot)").fetchone()[0]:
+            refresh_latest_snapshot(conn)
+            conn.commit()
+        watermarks = get_indicator_watermarks(conn)
+        windows = plan_incremental_windows(conn, get_stock_last_dates(conn), watermarks)
+        print(f"{len(windows)} issuers have new data")
+        if not windows:
+            conn.close()
+            print("Technical indicators are up to date")
+            return 0
 
     print("Fetching stock data...")
-    query = '''
-    SELECT 
-        issuer_code, 
-        "Date", 
-        "Last Trade Price", 
-        "Max", 
-        "Min", 
-        "Volume", 
-        "Turnover in BEST (denars)" 
-    FROM stock_data
-    '''
-    stock_data = pd.read_sql_query(query, conn)
+    report(phase='loading stock data')
+    with Metrics.PHASE_SECONDS.time(phase='load stock data'):
+        # Weekly and monthly bars are read from the rollup tables, so only the daily
+        # warm-up window of the price history is needed
+        bars = None
+        load_windows = windows
+        if workers <= 1 and BarRollup.has_bar_tables(conn):
+            bars = {
+                period: BarRollup.load_bars(conn, period, None if windows is None else {
+                    issuer: period_starts[period] for issuer, period_starts in windows.items()
+                })
+                for period in BAR_PERIODS
+            }
+            if windows is not None:
+                load_windows = {issuer: {'daily': period_starts['daily']} for issuer, period_starts in windows.items()}
+
+        store = ColumnarStore.open_store(columnar_path)
+        if store is not None and store.in_sync(get_stock_last_dates(conn)):
+            print(f"Reading the columnar store in {store.path}")
+            stock_data = store.read(None if load_windows is None else {
+                issuer: load_start(period_starts) for issuer, period_starts in load_windows.items()
+            })
+        else:
+            stock_data = load_stock_data(conn, load_windows)
 
     print("Processing data...")
-    stock_data['Date'] = pd.to_datetime(stock_data['Date'])
-    stock_data = stock_data.sort_values(by=['issuer_code', 'Date'])
+    stock_data = stock_data.sort_values(by=['issuer_code', 'Date'], ignore_index=True)
 
     issuers = stock_data['issuer_code'].unique()
-    periods = ['daily', 'weekly', 'monthly']
-    total_combinations = len(issuers) * len(periods)
-    current_combination = 0
-
-    print(f"\nAnalyzing {len(issuers)} issuers for {len(periods)} time periods...")
-    results = []
-    for issuer in issuers:
-        print(f"\nProcessing issuer: {issuer}")
-        issuer_data = stock_data[stock_data['issuer_code'] == issuer].copy()
-
-        for period in periods:
-            current_combination += 1
-            print(
-                f"\nProgress: {current_combination}/{total_combinations} ({(current_combination / total_combinations) * 100:.1f}%)")
-
-            analyzed_data = analyze_for_time_period(issuer_data, period)
-            analyzed_data['issuer_code'] = issuer
-            results.append(analyzed_data)
-
-    print("\nCombining results...")
-    results_df = pd.concat(results, ignore_index=True)
-
-    print("\nSaving results to database...")
-    results_df[['issuer_code', 'Date', 'time_period', 'Signal', 'SMA_20', 'SMA_50', 'EMA_20', 'EMA_50',
-                'RSI', 'MACD', 'Stoch', 'CCI', 'Williams %R']].to_sql(
-        'technical_indicators', conn, if_exists='replace', index=False
-    )
+    print(f"\nAnalyzing {len(issuers)} issuers for {len(PERIODS)} time periods with {workers} worker(s)...")
+    report(phase='analyzing', issuers_total=len(issuers))
 
-    conn.close()
+    # Results are written as they arrive; one transaction keeps the table consistent for readers
+    try:
+        with Metrics.PHASE_SECONDS.time(phase='analyze'):
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            if not incremental:
+                conn.execute("DROP TABLE IF EXISTS technical_indicators")
+                ensure_indicator_schema(conn)
+                ensure_snapshot_schema(conn)
+            rows_written = 0
+            for analyzed_data in iter_analysis(stock_data, windows, watermarks, workers, bars):
+                with DatabaseAccess.WRITE_SECONDS.time(table='technical_indicators'):
+                    save_indicators(conn, analyzed_data)
+                DatabaseAccess.ROWS_WRITTEN.inc(len(analyzed_data), table='technical_indicators')
+                rows_written += len(analyzed_data)
+                report(rows_written=rows_written)
+            # Same transaction: readers never see indicators and snapshot out of step
+            with DatabaseAccess.WRITE_SECONDS.time(table='latest_snapshot'):
+                snapshot_rows = refresh_latest_snapshot(conn, None if windows is None else list(windows))
+            DatabaseAccess.ROWS_WRITTEN.inc(snapshot_rows, table='latest_snapshot')
+            with DatabaseAccess.WRITE_SECONDS.time(table='technical_indicators'):
+                conn.commit()
+        print(f"\nSaved {rows_written} rows")
+    finally:
+        conn.close()
 
     end_time = datetime.now()
     duration = end_time - start_time
     print(f"\nTechnical analysis completed at {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Total duration: {duration}")
     print(f"Results saved to 'technical_indicators' table in {database_path}")
+    return rows_written
 
 
 if __name__ == "__main__":
-    DATABASE_PATH = "mse_stocks.db"
-    technical_analysis(DATABASE_PATH)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Calculate technical indicators for the scraped stock data.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only compute indicators for bars added since the last run")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of processes that analyze the issuers in parallel")
+    parser.add_argument('--columnar', metavar='PATH', default=None,
+                        help="read stock data from this columnar store (defaults to MSE_COLUMNAR_PATH)")
+    args = parser.parse_args()
+
+    technical_analysis(DatabaseAccess.DATABASE_PATH, incremental=args.incremental, workers=args.workers,
+                       columnar_path=args.columnar)
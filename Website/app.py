@@ -1,44 +1,356 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
+from datetime import date, timedelta
+import base64
+import gzip
+import json
 import sqlite3
-import subprocess
-import pandas as pd
+import DatabaseAccess
+import Metrics
+from DatabaseAccess import ConnectionPool
+from JobRunner import JobRunner
+from ResponseCache import ResponseCache
 
 app = Flask(__name__)
 
-DATABASE_PATH = "mse_stocks.db"
+DATABASE_PATH = DatabaseAccess.DATABASE_PATH
+
+# Read-only connections reused across requests
+read_pool = ConnectionPool(DATABASE_PATH)
+
+# Serialized read responses; cleared whenever a scrape or analysis run finishes
+response_cache = ResponseCache(max_entries=1024, ttl=300)
+
+# Scrape and analysis runs execute in the background, one at a time
+job_runner = JobRunner(on_finish=lambda job: response_cache.clear())
+
+# Read queries of the dashboard endpoints; benchmarks/check_query_plans.py checks that they use indexes
+ISSUER_CODES_QUERY = "SELECT issuer_code FROM issuer_watermark ORDER BY issuer_code"
+# Databases created before issuer_watermark existed fall back to scanning stock_data
+LEGACY_ISSUER_CODES_QUERY = "SELECT DISTINCT issuer_code FROM stock_data ORDER BY issuer_code"
+
+LATEST_ANALYSIS_QUERY = """
+    SELECT * FROM technical_indicators 
+    WHERE issuer_code = ? AND time_period = ? 
+    ORDER BY Date DESC LIMIT 1
+"""
+
+HISTORICAL_ANALYSIS_QUERY = """
+    SELECT * FROM technical_indicators 
+    WHERE issuer_code = ? AND time_period = ? 
+    ORDER BY Date DESC LIMIT 100
+"""
+
+VALID_PERIODS = ['daily', 'weekly', 'monthly']
+
+# Columns of technical_indicators that /historical_analysis returns (see TechnicalAnalysis.INDICATOR_COLUMNS);
+# Date, the pagination key, is always included
+INDICATOR_FIELDS = ['Signal', 'SMA_20', 'SMA_50', 'EMA_20', 'EMA_50', 'RSI', 'MACD', 'Stoch', 'CCI', 'Williams %R']
+
+# Rows per /historical_analysis page by default and at most
+HISTORY_PAGE_SIZE = 500
+MAX_HISTORY_PAGE_SIZE = 5000
+
+# Smaller responses are sent uncompressed; the level trades a little ratio for much less CPU than 9
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+
+
+def history_query(fields, order, date_from=False, date_to=False, after=False):
+    """
+    Keyset-paginated read of one issuer and period: the page after the cursor date, in key
+    order, so every page is a range scan of the primary key however deep it is.
+    Parameters: issuer_code, time_period, [from], [to (exclusive)], [cursor date], limit.
+    """
+    conditions = ['issuer_code = ?', 'time_period = ?']
+    if date_from:
+        conditions.append('"Date" >= ?')
+    if date_to:
+        conditions.append('"Date" < ?')
+    if after:
+        conditions.append('"Date" < ?' if order == 'desc' else '"Date" > ?')
+    columns = ', '.join(f'"{field}"' for field in ['Date', *fields])
+    return (f"SELECT {columns} FROM technical_indicators WHERE {' AND '.join(conditions)} "
+            f'ORDER BY "Date" {order.upper()} LIMIT ?')
+
+
+# Screener parameters and the latest_snapshot columns they filter and sort on
+SCREENER_NUMBERS = {
+    'price': 'Last Trade Price', 'volume': 'Volume', 'turnover': 'Turnover in BEST (denars)',
+    'sma_20': 'SMA_20', 'sma_50': 'SMA_50', 'ema_20': 'EMA_20', 'ema_50': 'EMA_50', 'rsi': 'RSI',
+    'macd': 'MACD', 'stoch': 'Stoch', 'cci': 'CCI', 'williams_r': 'Williams %R',
+}
+SCREENER_COLUMNS = ['issuer_code', 'time_period', 'Date', 'Signal', *INDICATOR_FIELDS[1:],
+                    'Last Trade Price', 'Volume', 'Turnover in BEST (denars)']
+SIGNALS = ['Buy', 'Sell', 'Hold']
+
+# Rows returned by /screener by default and at most
+SCREENER_PAGE_SIZE = 100
+MAX_SCREENER_PAGE_SIZE = 1000
+
+
+def screener_query(bounds, signal_count, sort=None, descending=False):
+    """
+    One indexed read of latest_snapshot: the period's rows (a range of the primary key) filtered
+    by bounds [(column, '>=' or '<='), ...] and signal_count signals. Sorting by a column other
+    than issuer_code sorts at most one row per issuer.
+    Parameters: time_period, bound values, signals, limit.
+    """
+    conditions = ['time_period = ?']
+    conditions += [f'"{column}" {operator} ?' for column, operator in bounds]
+    if signal_count:
+        conditions.append(f'"Signal" IN ({", ".join("?" * signal_count)})')
+    order = 'issuer_code'
+    if sort is not None:
+        # Rows without the value go last in both directions
+        order = f'"{sort}" IS NULL, "{sort}" {"DESC" if descending else "ASC"}, issuer_code'
+    columns = ', '.join(f'"{column}"' for column in SCREENER_COLUMNS)
+    return f"SELECT {columns} FROM latest_snapshot WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?"
+
+
+def parse_screener_request(args):
+    """
+    Validated /screener parameters, e.g. time_period=daily&rsi_max=30&signal=Buy&sort=-volume:
+    <number>_min / <number>_max bounds (inclusive, see SCREENER_NUMBERS), signal (comma-separated),
+    sort (a number or issuer_code, '-' for descending) and limit. Raises ValueError with the message.
+    """
+    time_period = args.get('time_period', 'daily')
+    if time_period not in VALID_PERIODS:
+        raise ValueError("Invalid time period selected.")
+
+    bounds, values = [], []
+    for name in sorted(args):
+        number, _, side = name.rpartition('_')
+        if side not in ('min', 'max') or number not in SCREENER_NUMBERS:
+            continue
+        try:
+            values.append(float(args[name]))
+        except ValueError:
+            raise ValueError(f"{name} must be a number.")
+        bounds.append((SCREENER_NUMBERS[number], '>=' if side == 'min' else '<='))
+
+    signals = []
+    if args.get('signal'):
+        signals = sorted({signal.strip().capitalize() for signal in args['signal'].split(',') if signal.strip()})
+        unknown = [signal for signal in signals if signal not in SIGNALS]
+        if unknown:
+            raise ValueError(f"Unknown signals: {', '.join(unknown)}.")
+
+    sort = args.get('sort', 'issuer_code')
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-')
+    if sort != 'issuer_code' and sort not in SCREENER_NUMBERS:
+        raise ValueError(f"sort must be issuer_code or one of {', '.join(SCREENER_NUMBERS)}.")
+    sort_column = None if sort == 'issuer_code' and not descending else SCREENER_NUMBERS.get(sort, sort)
+
+    try:
+        limit = int(args.get('limit', SCREENER_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer.")
+    if not 1 <= limit <= MAX_SCREENER_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_SCREENER_PAGE_SIZE}.")
+
+    return time_period, tuple(bounds), tuple(values), tuple(signals), sort_column, descending, limit
+
+
+def load_screener(time_period, bounds, values, signals, sort_column, descending, limit):
+    query = screener_query(bounds, len(signals), sort_column, descending)
+    with read_pool.connection() as conn:
+        try:
+            rows = conn.execute(query, (time_period, *values, *signals, limit)).fetchall()
+        except sqlite3.OperationalError as e:
+            if 'no such table' not in str(e):
+                raise
+            return {"message": "No analysis snapshot yet; run the technical analysis first."}, 404
+    return {'time_period': time_period, 'count': len(rows),
+            'results': [dict(zip(SCREENER_COLUMNS, row)) for row in rows]}, 200
+
+
+def encode_cursor(order, last_date):
+    return base64.urlsafe_b64encode(json.dumps([order, last_date], separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, order):
+    """Date after which the next page starts; raises ValueError for cursors of another order."""
+    try:
+        cursor_order, last_date = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+    if cursor_order != order or not isinstance(last_date, str):
+        raise ValueError("The cursor belongs to a query with another order.")
+    return last_date
+
+
+def parse_history_request(args):
+    """Validated /historical_analysis parameters; raises ValueError with the message for the client."""
+    issuer_code = args.get('issuer_code')
+    time_period = args.get('time_period')
+    if not all([issuer_code, time_period]):
+        raise ValueError("Missing required parameters.")
+    if time_period not in VALID_PERIODS:
+        raise ValueError("Invalid time period selected.")
+
+    fields = INDICATOR_FIELDS
+    if args.get('fields'):
+        fields = list(dict.fromkeys(field.strip() for field in args['fields'].split(',') if field.strip()))
+        unknown = [field for field in fields if field not in INDICATOR_FIELDS and field != 'Date']
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}.")
+        fields = [field for field in fields if field != 'Date']
+
+    order = args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'.")
+    response_format = args.get('format', 'records')
+    if response_format not in ('records', 'columns'):
+        raise ValueError("format must be 'records' or 'columns'.")
+    try:
+        limit = int(args.get('limit', HISTORY_PAGE_SIZE))
+        # Dates are stored as 'YYYY-MM-DD HH:MM:SS'; to is inclusive, so the bound is the next day
+        date_from = date.fromisoformat(args['from']).isoformat() if args.get('from') else None
+        date_to = (date.fromisoformat(args['to']) + timedelta(days=1)).isoformat() if args.get('to') else None
+    except ValueError:
+        raise ValueError("limit must be an integer and from/to dates in YYYY-MM-DD format.")
+    if not 1 <= limit <= MAX_HISTORY_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_HISTORY_PAGE_SIZE}.")
+    after = decode_cursor(args['cursor'], order) if args.get('cursor') else None
+
+    return issuer_code, time_period, tuple(fields), order, date_from, date_to, after, limit, response_format
+
+
+def load_history(issuer_code, time_period, fields, order, date_from, date_to, after, limit, response_format):
+    query = history_query(fields, order, date_from is not None, date_to is not None, after is not None)
+    params = [issuer_code, time_period, *(value for value in (date_from, date_to, after) if value is not None)]
+    with read_pool.connection() as conn:
+        # One extra row tells whether another page follows
+        rows = conn.execute(query, (*params, limit + 1)).fetchall()
+
+    next_cursor = encode_cursor(order, rows[limit - 1][0]) if len(rows) > limit else None
+    rows = rows[:limit]
+    columns = ['Date', *fields]
+    if response_format == 'columns':
+        # One array per column; key names are sent once instead of once per row
+        values = zip(*rows) if rows else [()] * len(columns)
+        payload = {'fields': columns, 'columns': {column: list(column_values) for column, column_values in zip(columns, values)}}
+    else:
+        payload = {'data': [dict(zip(columns, row)) for row in rows]}
+    payload['next_cursor'] = next_cursor
+    return payload, 200
+
+
+def cached_response(key, build, compress=False):
+    """
+    Serve a JSON response from the cache, building and caching it on a miss (only 200 responses
+    are cached). build() returns (payload, status). Supports ETag / If-None-Match. With compress, clients
+    that accept gzip get larger bodies gzipped (cached separately from the plain ones).
+    """
+    gzipped = compress and 'gzip' in request.accept_encodings
+    if gzipped:
+        key = (*key, 'gzip')
+    entry = response_cache.get(key)
+    if entry is None:
+        payload, status = build()
+        body = app.json.dumps(payload).encode('utf-8')
+        encoding = None
+        if gzipped and len(body) >= GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            encoding = 'gzip'
+        entry = response_cache.put(key, body, status, encoding)
+
+    if entry.etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(entry.body, status=entry.status, mimetype='application/json')
+        if entry.encoding:
+            response.content_encoding = entry.encoding
+    response.set_etag(entry.etag)
+    if compress:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def load_analysis(query, issuer_code, time_period):
+    with read_pool.connection() as conn:
+        cursor = conn.execute(query, (issuer_code, time_period))
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+
+    if not rows:
+        return {"message": "No data available for the selected criteria."}, 404
+
+    # Replace NULL with "No Data"
+    return [{column: "No Data" if value is None else value for column, value in zip(columns, row)}
+            for row in rows], 200
+
+
+def load_issuer_codes():
+    with read_pool.connection() as conn:
+        try:
+            rows = conn.execute(ISSUER_CODES_QUERY).fetchall()
+        except sqlite3.OperationalError:
+            rows = conn.execute(LEGACY_ISSUER_CODES_QUERY).fetchall()
+    return [issuer_code for issuer_code, in rows], 200
+
+
+def scrape_job(job):
+    import asyncio
+    import main  # The scraper stack is only needed once a scrape runs
+
+    rows = asyncio.run(main.run_pipeline(DATABASE_PATH, report=job.update))
+    return f"Data scraped successfully ({rows} rows saved)."
+
+
+def analysis_job(job):
+    import TechnicalAnalysis
+
+    rows = TechnicalAnalysis.technical_analysis(DATABASE_PATH, incremental=True, report=job.update)
+    return f"Technical analysis completed successfully ({rows} rows saved)."
+
+
+def submit_job(kind, func):
+    job, created = job_runner.submit(kind, func)
+    body = job.to_dict()
+    body['status_url'] = f"/jobs/{job.id}"
+    body['message'] = "Job started." if created else "A job of this kind is already running."
+    return jsonify(body), 202
+
 
 # Home page route
 @app.route('/')
 def home():
     return render_template('index.html')
 
-# Route to run main.py (filling issuer_codes table)
+# Route to start the scraping pipeline of main.py; returns the job to poll
 @app.route('/scrape_data', methods=['POST'])
 def scrape_data():
-    try:
-        subprocess.run(["python", "main.py"], check=True)
-        return jsonify({"message": "Data scraped successfully."}), 200
-    except subprocess.CalledProcessError as e:
-        return jsonify({"message": f"Error running main script: {str(e)}"}), 500
+    return submit_job('scrape', scrape_job)
 
-# Route to run TechnicalAnalysis.py
+# Route to start an incremental TechnicalAnalysis run; returns the job to poll
 @app.route('/run_analysis', methods=['POST'])
 def run_analysis():
-    try:
-        subprocess.run(["python", "TechnicalAnalysis.py"], check=True)
-        return jsonify({"message": "Technical analysis completed successfully."}), 200
-    except subprocess.CalledProcessError as e:
-        return jsonify({"message": f"Error running technical analysis script: {str(e)}"}), 500
+    return submit_job('analysis', analysis_job)
+
+# Routes reporting the state and progress of background jobs
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify([job.to_dict() for job in job_runner.list()]), 200
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({"message": "Unknown job."}), 404
+    return jsonify(job.to_dict()), 200
+
+# Route exposing the scrape and analysis metrics of this process in the Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(Metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # Route to fetch issuer codes (for dropdown)
 @app.route('/get_issuer_codes', methods=['GET'])
 def get_issuer_codes():
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        query = "SELECT DISTINCT issuer_code FROM stock_data ORDER BY issuer_code"
-        issuer_codes = pd.read_sql_query(query, conn)['issuer_code'].tolist()
-        conn.close()
-        return jsonify(issuer_codes), 200
+        return cached_response(('get_issuer_codes',), load_issuer_codes)
     except Exception as e:
         return jsonify({"message": f"Error fetching issuer codes: {str(e)}"}), 500
 
@@ -56,23 +368,10 @@ def fetch_latest_analysis():
         if time_period not in valid_periods:
             return jsonify({"message": "Invalid time period selected."}), 400
 
-        query = """
-            SELECT * FROM technical_indicators 
-            WHERE issuer_code = ? AND time_period = ? 
-            ORDER BY Date DESC LIMIT 1
-        """
-
-        conn = sqlite3.connect(DATABASE_PATH)
-        df = pd.read_sql_query(query, conn, params=(issuer_code, time_period))
-        conn.close()
-
-        if df.empty:
-            return jsonify({"message": "No data available for the selected criteria."}), 404
-
-        # Replace NaN/NULL with "No Data"
-        df = df.fillna("No Data")
-
-        return jsonify(df.to_dict(orient='records')), 200
+        return cached_response(
+            ('fetch_latest_analysis', issuer_code, time_period),
+            lambda: load_analysis(LATEST_ANALYSIS_QUERY, issuer_code, time_period)
+        )
     except Exception as e:
         return jsonify({"message": f"Error fetching latest analysis data: {str(e)}"}), 500
 
@@ -90,25 +389,37 @@ def fetch_historical_analysis():
         if time_period not in valid_periods:
             return jsonify({"message": "Invalid time period selected."}), 400
 
-        query = """
-            SELECT * FROM technical_indicators 
-            WHERE issuer_code = ? AND time_period = ? 
-            ORDER BY Date DESC LIMIT 100
-        """
-
-        conn = sqlite3.connect(DATABASE_PATH)
-        df = pd.read_sql_query(query, conn, params=(issuer_code, time_period))
-        conn.close()
-
-        if df.empty:
-            return jsonify({"message": "No data available for the selected criteria."}), 404
-
-        # Replace NaN/NULL with "No Data"
-        df = df.fillna("No Data")
+        return cached_response(
+            ('fetch_historical_analysis', issuer_code, time_period),
+            lambda: load_analysis(HISTORICAL_ANALYSIS_QUERY, issuer_code, time_period)
+        )
+    except Exception as e:
+        return jsonify({"message": f"Error fetching historical analysis data: {str(e)}"}), 500
 
-        return jsonify(df.to_dict(orient='records')), 200
+# Route to page through an issuer's indicator history: from/to dates, keyset cursor, field projection
+# and a columnar format (see parse_history_request)
+@app.route('/historical_analysis', methods=['GET'])
+def historical_analysis():
+    try:
+        params = parse_history_request(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    try:
+        return cached_response(('historical_analysis', *params), lambda: load_history(*params), compress=True)
     except Exception as e:
         return jsonify({"message": f"Error fetching historical analysis data: {str(e)}"}), 500
 
+# Route screening every issuer's last analyzed bar at once (see parse_screener_request)
+@app.route('/screener', methods=['GET'])
+def screener():
+    try:
+        params = parse_screener_request(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    try:
+        return cached_response(('screener', *params), lambda: load_screener(*params), compress=True)
+    except Exception as e:
+        return jsonify({"message": f"Error screening issuers: {str(e)}"}), 500
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""
+Benchmark: weekly/monthly bars read from the rollup tables vs. resampled from daily history.
+
+Writes the synthetic daily prices (synthetic_mse: illiquid issuers with gaps, and listed days
+without prices) through
+DatabaseManager.write_rows in scrape-sized windows, once with the bar tables maintained and
+once without, then rewrites a sample of already stored days with corrected prices. Checks
+that bars_weekly and bars_monthly equal IndicatorEngine.resample_bars over the stored daily
+rows, and times loading the weekly and monthly analysis input both ways, for the full
+history and for the incremental warm-up windows of the last year.
+
+Usage: python benchmarks/bench_bar_rollup.py [--issuers 200] [--years 10] [--window-days 60]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import BarRollup  # noqa: E402
+import DatabaseManager  # noqa: E402
+import IndicatorEngine  # noqa: E402
+import TechnicalAnalysis  # noqa: E402
+import synthetic_mse  # noqa: E402
+
+
+def write_windows(db_path, stock_data, window_days, maintain_bars=True):
+    """Write every issuer's history in windows of window_days rows; returns the seconds spent."""
+    refresh_bars = BarRollup.refresh_bars
+    if not maintain_bars:
+        BarRollup.refresh_bars = lambda *args: None
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_manager = DatabaseManager.DatabaseManager(db_path)
+        elapsed = 0.0
+        for issuer_code, issuer_data in stock_data.groupby('issuer_code', sort=False):
+            for start in range(0, len(issuer_data), window_days):
+                rows = db_manager.prepare_rows(issuer_data.iloc[start:start + window_days], issuer_code)
+                began = time.perf_counter()
+                db_manager.write_rows(rows)
+                elapsed += time.perf_counter() - began
+        db_manager.close()
+    finally:
+        BarRollup.refresh_bars = refresh_bars
+    return elapsed
+
+
+def corrections(stock_data, every=100):
+    """Every so many stored days with new prices, as re-scraped corrections."""
+    corrected = stock_data.iloc[::every].copy()
+    corrected['Last Trade Price'] *= 1.05
+    corrected['Volume'] += 1
+    return corrected
+
+
+def check_bars(conn):
+    stock_data = TechnicalAnalysis.load_stock_data(conn).sort_values(['issuer_code', 'Date'], ignore_index=True)
+    for period in TechnicalAnalysis.BAR_PERIODS:
+        expected = IndicatorEngine.resample_bars(stock_data, period)
+        stored = BarRollup.load_bars(conn, period)
+        pd.testing.assert_frame_equal(stored, expected, check_dtype=False)
+    return len(stock_data)
+
+
+def resampled_input(conn, windows):
+    stock_data = TechnicalAnalysis.load_stock_data(conn, windows)
+    stock_data = stock_data.sort_values(by=['issuer_code', 'Date'], ignore_index=True)
+    bars = {}
+    for period in TechnicalAnalysis.BAR_PERIODS:
+        period_data = stock_data
+        if windows is not None:
+            starts = TechnicalAnalysis.period_starts(stock_data, windows, period)
+            period_data = stock_data[starts.isna() | (stock_data['Date'] >= starts)]
+        bars[period] = IndicatorEngine.resample_bars(period_data, period)
+    return bars
+
+
+def stored_input(conn, windows):
+    return {
+        period: BarRollup.load_bars(conn, period, None if windows is None else {
+            issuer: starts[period] for issuer, starts in windows.items()
+        })
+        for period in TechnicalAnalysis.BAR_PERIODS
+    }
+
+
+def timed(load, conn, windows, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        bars = load(conn, windows)
+        best = min(best, time.perf_counter() - start)
+    return best, sum(len(period_bars) for period_bars in bars.values())
+
+
+def main(args):
+    stock_data = synthetic_mse.stock_data(args.issuers, args.years, empty_rows=True)
+    stock_data['Date'] = stock_data['Date'].dt.strftime('%Y-%m-%d')
+    corrected = corrections(stock_data)
+    print(f"{len(stock_data):,} daily rows for {args.issuers} issuers, written {args.window_days} days at a time")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain_path = os.path.join(tmp, 'plain.db')
+        plain_time = write_windows(plain_path, stock_data, args.window_days, maintain_bars=False)
+        db_path = os.path.join(tmp, 'bars.db')
+        bars_time = write_windows(db_path, stock_data, args.window_days)
+        print(f"write: without bars {plain_time:6.2f}s   maintaining bars {bars_time:6.2f}s   "
+              f"(+{(bars_time / plain_time - 1) * 100:.0f}%)")
+
+        write_windows(db_path, corrected, args.window_days)
+        with sqlite3.connect(db_path) as conn:
+            rows = check_bars(conn)
+        print(f"bars match resample_bars over {rows:,} stored rows after {len(corrected):,} corrections")
+
+        with sqlite3.connect(db_path) as conn:
+            last_dates = TechnicalAnalysis.get_stock_last_dates(conn)
+            # Every issuer was last analyzed a year ago
+            watermarks = {
+                (issuer, period): last_date - pd.Timedelta(days=365)
+                for issuer, last_date in last_dates.items() for period in TechnicalAnalysis.PERIODS
+            }
+            incremental = TechnicalAnalysis.plan_incremental_windows(conn, last_dates, watermarks)
+            for label, windows in (("full", None), ("incremental", incremental)):
+                resample_time, resampled_bars = timed(resampled_input, conn, windows)
+                stored_time, stored_bars = timed(stored_input, conn, windows)
+                print(f"{label:>11}: load + resample {resample_time:6.3f}s ({resampled_bars:,} bars)   "
+                      f"load bars {stored_time:6.3f}s ({stored_bars:,} bars)   "
+                      f"{resample_time / stored_time:5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=200)
+    parser.add_argument('--years', type=float, default=10)
+    parser.add_argument('--window-days', type=int, default=60)
+    main(parser.parse_args())
@@ -0,0 +1,77 @@
+"""
+Benchmark: per-issuer DataFrame.to_sql appends vs. the batched DatabaseWriter stage.
+
+Takes the synthetic stock_data rows of the issuers (synthetic_mse), loads them into a fresh
+database both ways and reports rows/sec. The writer run is repeated a second time on the
+same database to show that re-runs are idempotent.
+
+Usage: python benchmarks/bench_bulk_writer.py [--issuers 800] [--years 10]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import DatabaseManager  # noqa: E402
+import synthetic_mse  # noqa: E402
+from DatabaseWriter import DatabaseWriter  # noqa: E402
+
+
+def load_with_to_sql(db_path, frames):
+    DatabaseManager.DatabaseManager(db_path).close()
+    start = time.perf_counter()
+    for issuer_code, df in frames:
+        save_df = df.copy()
+        save_df.insert(0, 'issuer_code', issuer_code)
+        with sqlite3.connect(db_path) as conn:
+            save_df.to_sql('stock_data', conn, if_exists='append', index=False)
+    return time.perf_counter() - start
+
+
+async def load_with_writer(db_path, frames):
+    db_manager = DatabaseManager.DatabaseManager(db_path)
+    writer = DatabaseWriter(db_manager)
+    start = time.perf_counter()
+    await writer.start()
+    for issuer_code, df in frames:
+        await writer.put(df, issuer_code)
+    await writer.close()
+    elapsed = time.perf_counter() - start
+    db_manager.close()
+    if writer.errors:
+        raise RuntimeError(writer.errors)
+    return elapsed
+
+
+def count_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM stock_data").fetchone()[0]
+
+
+def main(args):
+    frames = list(synthetic_mse.stock_frames(args.issuers, args.years))
+    total = sum(len(df) for _, df in frames)
+    print(f"Loading {total:,} synthetic rows ({args.issuers} issuers x {args.years:g} years)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [
+            ("to_sql per issuer", os.path.join(tmp, 'to_sql.db'), lambda path: load_with_to_sql(path, frames)),
+            ("DatabaseWriter", os.path.join(tmp, 'writer.db'), lambda path: asyncio.run(load_with_writer(path, frames))),
+            ("DatabaseWriter re-run", os.path.join(tmp, 'writer.db'),
+             lambda path: asyncio.run(load_with_writer(path, frames))),
+        ]
+        for label, db_path, load in runs:
+            elapsed = load(db_path)
+            print(f"{label:>22}: {elapsed:.2f}s ({total / elapsed:,.0f} rows/s), {count_rows(db_path):,} rows in table")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=800)
+    parser.add_argument('--years', type=float, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,113 @@
+"""
+Benchmark: per-cell clean_numeric vs. the vectorized clean_numeric_series.
+
+Builds a table of scraped price cells from the synthetic history (synthetic_mse), formatted
+like the symbol history pages (English formatting with thousands separators, whole volumes
+and turnovers, empty cells on days without trades), and checks that clean_numeric_series returns
+exactly what clean_numeric returns for every cell, plus the expected values for Macedonian
+formatted numbers. Then times converting the five numeric columns both ways: the old
+parser path (.apply(clean_numeric) followed by the second .apply pass in DataScraper) and
+the single vectorized conversion.
+
+Usage: python benchmarks/bench_clean_numeric.py [--rows 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import synthetic_mse  # noqa: E402
+from MSEStockScraper import clean_numeric, clean_numeric_series  # noqa: E402
+
+NUMERIC_COLUMNS = ['Last Trade Price', 'Max', 'Min', 'Volume', 'Turnover in BEST (denars)']
+
+# Columns the pages show without decimals
+WHOLE_COLUMNS = ['Volume', 'Turnover in BEST (denars)']
+
+# Macedonian formatted cells and the numbers they stand for
+MACEDONIAN_CASES = {
+    '1.234,56': 1234.56,
+    '21.500,00': 21500.0,
+    '1.234.567': 1234567.0,
+    '1 234,5': 1234.5,
+    '0,75': 0.75,
+    '-12,5': -12.5,
+}
+
+
+def synthetic_table(rows, years=10):
+    """rows symbol history rows of the NUMERIC_COLUMNS as parsed cells (None when empty), issuer after issuer."""
+    # Every issuer lists at least a third of the weekdays
+    issuers = synthetic_mse.issuer_codes(rows // (260 * years // 3) + 1)
+    start = synthetic_mse.history_start(years)
+    table = pd.concat([synthetic_mse.daily_rows(issuer_code, start, date.today()) for issuer_code in issuers],
+                      ignore_index=True).head(rows)
+    return pd.DataFrame({
+        col: pd.Series([synthetic_mse.format_cell(value, 0 if col in WHOLE_COLUMNS else 2) or None
+                        for value in table[col]], dtype=object)
+        for col in NUMERIC_COLUMNS
+    })
+
+
+def check_equivalence(cells):
+    expected = cells.apply(clean_numeric).astype(float)
+    actual = clean_numeric_series(cells)
+    pd.testing.assert_series_equal(actual, expected, check_exact=True)
+
+    # Already converted columns (the old second pass) come back unchanged
+    pd.testing.assert_series_equal(clean_numeric_series(actual), expected.apply(clean_numeric).astype(float))
+
+    macedonian = clean_numeric_series(pd.Series(list(MACEDONIAN_CASES), dtype=object))
+    assert macedonian.tolist() == list(MACEDONIAN_CASES.values()), macedonian.tolist()
+    assert clean_numeric_series(pd.Series(['', '  ', 'n/a'], dtype=object)).isna().all()
+    # Empty cells keep the other values in their rows
+    shifted = clean_numeric_series(pd.Series(['1', '', '2\t3', '4'], dtype=object))
+    assert shifted.isna().tolist() == [False, True, False, False] and shifted[3] == 4, shifted.tolist()
+
+
+def per_cell(table):
+    df = table.copy()
+    for col in NUMERIC_COLUMNS:
+        df[col] = df[col].apply(clean_numeric).astype(float)
+    for col in NUMERIC_COLUMNS:
+        df[col] = df[col].apply(clean_numeric)
+    return df
+
+
+def vectorized(table):
+    df = table.copy()
+    for col in NUMERIC_COLUMNS:
+        df[col] = clean_numeric_series(df[col])
+    for col in NUMERIC_COLUMNS:
+        df[col] = clean_numeric_series(df[col])
+    return df
+
+
+def timed(convert, table):
+    start = time.perf_counter()
+    result = convert(table)
+    return time.perf_counter() - start, result
+
+
+def main(args):
+    table = synthetic_table(args.rows)
+    check_equivalence(pd.concat([table[col] for col in NUMERIC_COLUMNS], ignore_index=True))
+    print(f"clean_numeric_series matches clean_numeric on {table.size:,} cells and Macedonian formats")
+
+    cell_time, from_cells = timed(per_cell, table)
+    vector_time, from_vector = timed(vectorized, table)
+    pd.testing.assert_frame_equal(from_cells, from_vector)
+    cells_total = args.rows * len(NUMERIC_COLUMNS)
+    print(f"{cells_total:,} cells:  per-cell {cell_time:6.2f}s   vectorized {vector_time:6.2f}s   "
+          f"{cell_time / vector_time:5.1f}x, frames match")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    main(parser.parse_args())
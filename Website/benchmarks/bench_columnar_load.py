@@ -0,0 +1,95 @@
+"""
+Benchmark: loading the analysis input from SQLite vs. the columnar store.
+
+Writes the synthetic stock_data (synthetic_mse) through DatabaseManager with a columnar store enabled, then
+times TechnicalAnalysis.load_stock_data (plus the sort the analysis does) against
+ColumnarStore.read for a full load and for an incremental load of the last year, and
+checks that both paths return the same rows.
+
+Usage: python benchmarks/bench_columnar_load.py [--issuers 300] [--years 10]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ColumnarStore  # noqa: E402
+import DatabaseManager  # noqa: E402
+import TechnicalAnalysis  # noqa: E402
+import synthetic_mse  # noqa: E402
+from DatabaseWriter import DatabaseWriter  # noqa: E402
+
+
+async def load_database(db_path, columnar_path, frames):
+    db_manager = DatabaseManager.DatabaseManager(db_path, columnar_path=columnar_path)
+    writer = DatabaseWriter(db_manager)
+    await writer.start()
+    for issuer_code, df in frames:
+        await writer.put(df, issuer_code)
+    await writer.close()
+    db_manager.close()
+    if writer.errors:
+        raise RuntimeError(writer.errors)
+
+
+def load_from_sqlite(db_path, windows):
+    with sqlite3.connect(db_path) as conn:
+        stock_data = TechnicalAnalysis.load_stock_data(conn, windows)
+    return stock_data.sort_values(by=['issuer_code', 'Date'], ignore_index=True)
+
+
+def load_from_store(store, windows):
+    starts = None if windows is None else {
+        issuer: TechnicalAnalysis.load_start(period_starts) for issuer, period_starts in windows.items()
+    }
+    return store.read(starts)
+
+
+def timed(load, repeat=3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = load()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(args):
+    frames = list(synthetic_mse.stock_frames(args.issuers, args.years))
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'columnar.db')
+        store = ColumnarStore.ColumnarStore(os.path.join(tmp, 'columnar'))
+        start = time.perf_counter()
+        asyncio.run(load_database(db_path, store.path, frames))
+        rows = sum(len(df) for _, df in frames)
+        print(f"Wrote {rows:,} rows to SQLite and the store in {time.perf_counter() - start:.2f}s")
+
+        with sqlite3.connect(db_path) as conn:
+            assert store.in_sync(TechnicalAnalysis.get_stock_last_dates(conn)), "store out of sync"
+
+        last_year = synthetic_mse.history_start(1)
+        cases = {
+            'full load': None,
+            'last year': {issuer: {period: last_year for period in TechnicalAnalysis.PERIODS}
+                          for issuer, _ in frames},
+        }
+        for label, windows in cases.items():
+            sqlite_time, from_sqlite = timed(lambda: load_from_sqlite(db_path, windows))
+            store_time, from_store = timed(lambda: load_from_store(store, windows))
+            pd.testing.assert_frame_equal(from_sqlite, from_store, check_dtype=False)
+            print(f"{label:>10}: {len(from_store):>10,} rows   SQLite {sqlite_time:6.2f}s   "
+                  f"columnar {store_time:6.3f}s   {sqlite_time / store_time:6.1f}x, frames match")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=300)
+    parser.add_argument('--years', type=float, default=10)
+    main(parser.parse_args())
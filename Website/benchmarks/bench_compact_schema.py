@@ -0,0 +1,118 @@
+"""
+Benchmark: original TEXT stock_data table vs. the compact issuers/stock_prices schema.
+
+Builds a database in the original layout (TEXT issuer codes and dates), copies it and lets
+DatabaseManager migrate the copy. Reports both file sizes, times loading the analysis input
+(full and for one year of every issuer) from each layout, and checks that the compatibility
+view returns exactly the original rows.
+
+Usage: python benchmarks/bench_compact_schema.py [--issuers 300] [--years 10]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import DatabaseManager  # noqa: E402
+import TechnicalAnalysis  # noqa: E402
+import synthetic_mse  # noqa: E402
+
+ORIGINAL_SCHEMA = '''
+    CREATE TABLE stock_data (
+        issuer_code TEXT,
+        "Date" DATE,
+        "Last Trade Price" REAL,
+        "Max" REAL,
+        "Min" REAL,
+        "Volume" REAL,
+        "Turnover in BEST (denars)" REAL,
+        PRIMARY KEY (issuer_code, "Date")
+    )
+'''
+
+ORIGINAL_QUERY = 'SELECT * FROM stock_data'
+ORIGINAL_RANGE_QUERY = 'SELECT * FROM stock_data WHERE "Date" >= ?'
+
+
+def build_original(db_path, issuers, years):
+    """The synthetic history (synthetic_mse) in the original layout; returns the rows written."""
+    rows_written = 0
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(ORIGINAL_SCHEMA)
+        for issuer_code, df in synthetic_mse.stock_frames(issuers, years):
+            rows_written += len(df)
+            rows = df.assign(Date=df['Date'].astype(str)).itertuples(index=False, name=None)
+            conn.executemany("INSERT INTO stock_data VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             ((issuer_code, *row) for row in rows))
+    return rows_written
+
+
+def load_original(db_path, query, params=()):
+    with sqlite3.connect(db_path) as conn:
+        stock_data = pd.read_sql_query(query, conn, params=params)
+    stock_data['Date'] = pd.to_datetime(stock_data['Date'])
+    return stock_data.sort_values(by=['issuer_code', 'Date'], ignore_index=True)
+
+
+def load_compact(db_path, windows=None):
+    with sqlite3.connect(db_path) as conn:
+        stock_data = TechnicalAnalysis.load_stock_data(conn, windows)
+    return stock_data.sort_values(by=['issuer_code', 'Date'], ignore_index=True)
+
+
+def timed(load, repeat=3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = load()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        original_path = os.path.join(tmp, 'original.db')
+        compact_path = os.path.join(tmp, 'compact.db')
+        rows = build_original(original_path, args.issuers, args.years)
+        shutil.copy(original_path, compact_path)
+
+        start = time.perf_counter()
+        DatabaseManager.DatabaseManager(compact_path).close()
+        print(f"Migrated {rows:,} rows in {time.perf_counter() - start:.2f}s")
+        print(f"File size: original {os.path.getsize(original_path) / 2 ** 20:.1f} MB, "
+              f"compact {os.path.getsize(compact_path) / 2 ** 20:.1f} MB")
+
+        with sqlite3.connect(original_path) as original, sqlite3.connect(compact_path) as compact:
+            query = 'SELECT * FROM stock_data ORDER BY issuer_code, "Date"'
+            pd.testing.assert_frame_equal(pd.read_sql_query(query, original), pd.read_sql_query(query, compact))
+        print("Compatibility view returns the original rows")
+
+        since = synthetic_mse.history_start(1).isoformat()
+        issuers = synthetic_mse.issuer_codes(args.issuers)
+        windows = {issuer: {period: pd.Timestamp(since) for period in TechnicalAnalysis.PERIODS}
+                   for issuer in issuers}
+        cases = [
+            ('full load', lambda: load_original(original_path, ORIGINAL_QUERY), lambda: load_compact(compact_path)),
+            ('since ' + since, lambda: load_original(original_path, ORIGINAL_RANGE_QUERY, (since,)),
+             lambda: load_compact(compact_path, windows)),
+        ]
+        for label, original_load, compact_load in cases:
+            original_time, from_original = timed(original_load)
+            compact_time, from_compact = timed(compact_load)
+            pd.testing.assert_frame_equal(from_original, from_compact)
+            print(f"{label:>16}: {len(from_compact):>10,} rows   original {original_time:6.2f}s   "
+                  f"compact {compact_time:6.2f}s   {original_time / compact_time:5.1f}x, frames match")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=300)
+    parser.add_argument('--years', type=float, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,137 @@
+"""
+Benchmark: paging an issuer's full indicator history through /historical_analysis.
+
+Builds a synthetic database (synthetic_mse) with its technical indicators and downloads the
+whole daily history of one issuer through the Flask test client in several response modes:
+records with every field, the columnar format, columnar + gzip, and columnar + gzip with a
+two-field projection. Every mode is checked against a direct SQL read. Reports the time and
+bytes on the wire of each mode next to the 100-row /fetch_historical_analysis response, and
+the cost of reading a deep page with LIMIT/OFFSET compared with the keyset cursor.
+
+Usage: python benchmarks/bench_history_api.py [--issuers 5] [--years 20] [--page-size 500]
+"""
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+import synthetic_mse  # noqa: E402
+import TechnicalAnalysis  # noqa: E402
+from DatabaseAccess import ConnectionPool  # noqa: E402
+
+MODES = {
+    'records': ('records', None, False),
+    'columns': ('columns', None, False),
+    'columns + gzip': ('columns', None, True),
+    'columns + gzip, Date,RSI': ('columns', 'Date,RSI', True),
+}
+
+
+def download(client, issuer_code, page_size, response_format, fields, compressed):
+    """Follow next_cursor to the end; returns (rows as dicts, bytes received, requests)."""
+    headers = {'Accept-Encoding': 'gzip'} if compressed else {}
+    rows, received, requests, cursor = [], 0, 0, None
+    while True:
+        query = f"/historical_analysis?issuer_code={issuer_code}&time_period=daily&limit={page_size}" \
+                f"&format={response_format}"
+        if fields:
+            query += f"&fields={fields}"
+        if cursor:
+            query += f"&cursor={cursor}"
+        response = client.get(query, headers=headers)
+        body = response.get_data()
+        received += len(body)
+        requests += 1
+        if response.content_encoding == 'gzip':
+            body = gzip.decompress(body)
+        page = json.loads(body)
+        if response_format == 'columns':
+            names = page['fields']
+            rows.extend(dict(zip(names, values)) for values in zip(*(page['columns'][name] for name in names)))
+        else:
+            rows.extend(page['data'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return rows, received, requests
+
+
+def expected_rows(db_path, issuer_code, fields):
+    columns = ['Date', *fields]
+    selected = ', '.join(f'"{column}"' for column in columns)
+    with sqlite3.connect(db_path) as conn:
+        return [dict(zip(columns, row)) for row in conn.execute(
+            f"SELECT {selected} FROM technical_indicators "
+            "WHERE issuer_code = ? AND time_period = 'daily' ORDER BY \"Date\" DESC", (issuer_code,)
+        )]
+
+
+def deep_page(db_path, issuer_code, page_size, rows):
+    """Seconds to read the last page with OFFSET and with the keyset condition."""
+    with sqlite3.connect(db_path) as conn:
+        offset = max(rows - page_size, 0)
+        last_date = conn.execute(
+            "SELECT \"Date\" FROM technical_indicators WHERE issuer_code = ? AND time_period = 'daily' "
+            "ORDER BY \"Date\" DESC LIMIT 1 OFFSET ?", (issuer_code, max(offset - 1, 0))
+        ).fetchone()[0]
+        timings = {}
+        for label, query, params in (
+            ("OFFSET", "SELECT * FROM technical_indicators WHERE issuer_code = ? AND time_period = ? "
+                       "ORDER BY \"Date\" DESC LIMIT ? OFFSET ?", (issuer_code, 'daily', page_size, offset)),
+            ("keyset", app.history_query(app.INDICATOR_FIELDS, 'desc', after=True),
+             (issuer_code, 'daily', last_date, page_size)),
+        ):
+            start = time.perf_counter()
+            for _ in range(200):
+                conn.execute(query, params).fetchall()
+            timings[label] = (time.perf_counter() - start) / 200
+    return timings
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'history.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            synthetic_mse.populate_database(db_path, args.issuers, args.years)
+            TechnicalAnalysis.technical_analysis(db_path)
+
+        app.read_pool = ConnectionPool(db_path)
+        # Every request should reach SQLite
+        app.response_cache.max_entries = 0
+        client = app.app.test_client()
+        issuer_code = synthetic_mse.issuer_codes(1)[0]
+
+        legacy = client.get(f"/fetch_historical_analysis?issuer_code={issuer_code}&time_period=daily").get_data()
+        legacy_rows = len(json.loads(legacy))
+        print(f"/fetch_historical_analysis: {legacy_rows} rows at most, {len(legacy) / legacy_rows:6.1f} bytes/row")
+
+        for label, (response_format, fields, compressed) in MODES.items():
+            start = time.perf_counter()
+            rows, received, requests = download(client, issuer_code, args.page_size, response_format, fields,
+                                                compressed)
+            elapsed = time.perf_counter() - start
+            expected = expected_rows(db_path, issuer_code, fields.split(',')[1:] if fields else app.INDICATOR_FIELDS)
+            assert rows == expected, f"{label}: rows differ from the table"
+            print(f"{label:>26}: {len(rows):,} rows in {requests} pages, {elapsed * 1000:7.1f} ms, "
+                  f"{received / 1024:8.1f} KiB ({received / len(rows):5.1f} bytes/row), rows match")
+        app.read_pool.close()
+
+        timings = deep_page(db_path, issuer_code, args.page_size, len(rows))
+        print(f"last page of {args.page_size}: OFFSET {timings['OFFSET'] * 1000:6.2f} ms   "
+              f"keyset {timings['keyset'] * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=5)
+    parser.add_argument('--years', type=float, default=20)
+    parser.add_argument('--page-size', type=int, default=500)
+    main(parser.parse_args())
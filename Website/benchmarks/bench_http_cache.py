@@ -0,0 +1,56 @@
+"""
+Benchmark: scraping ten years of history twice, with and without the on-disk HTTP cache.
+
+Serves synthetic symbol history pages from a MockMseServer (see mock_mse_server.py), which
+sends an ETag with every page and answers If-None-Match with 304. Each issuer's history is
+scraped twice in a row; the report shows the requests, body bytes and wall-clock time of
+each run. With the cache the second run serves the settled yearly windows from disk and
+only downloads the current one, which is never cached.
+
+Usage: python benchmarks/bench_http_cache.py [--issuers 30]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import MSEStockScraper  # noqa: E402
+from HttpCache import HttpCache  # noqa: E402
+from mock_mse_server import MockMseServer  # noqa: E402
+
+
+async def scrape_all(base_url, codes, http_cache):
+    today = date.today()
+    async with MSEStockScraper.create_session() as session:
+        scrapers = [MSEStockScraper.MSEStockScraper(code, session=session, base_url=base_url, http_cache=http_cache)
+                    for code in codes]
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*(scraper.scrape_historical_data(today - timedelta(days=3650), today)
+                                   for scraper in scrapers))
+
+
+async def main(args):
+    async with MockMseServer(args.issuers) as server:
+        base_url = f"{server.site_url}/en/stats/symbolhistory"
+        with tempfile.TemporaryDirectory() as tmp:
+            for label, http_cache in (("no cache", None), ("HTTP cache", HttpCache(tmp))):
+                for run in ("first run", "re-run"):
+                    server.requests = server.bytes_sent = 0
+                    start = time.perf_counter()
+                    await scrape_all(base_url, server.codes, http_cache)
+                    elapsed = time.perf_counter() - start
+                    print(f"{label:>10} {run:>9}: {server.requests:5} requests, "
+                          f"{server.bytes_sent / 1024:8.1f} KiB of pages, {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=30)
+    asyncio.run(main(parser.parse_args()))
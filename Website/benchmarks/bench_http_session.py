@@ -0,0 +1,60 @@
+"""
+Benchmark: one aiohttp session per request vs. one pooled session shared by all scrapers.
+
+Serves synthetic symbol history pages from a MockMseServer (see mock_mse_server.py) and
+fetches issuers x windows one-month pages both ways, reporting requests/sec and wall-clock
+time.
+
+Usage: python benchmarks/bench_http_session.py [--issuers 50] [--windows 10] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import MSEStockScraper  # noqa: E402
+from mock_mse_server import MockMseServer  # noqa: E402
+
+# One month of history per page, about 20 rows
+WINDOW = {"FromDate": "2024-01-01", "ToDate": "2024-01-31"}
+
+
+async def run(base_url, codes, windows, concurrency, shared):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(scraper):
+        async with semaphore:
+            if scraper.session is not None:
+                return await scraper.fetch_html(scraper.session, WINDOW)
+            async with MSEStockScraper.aiohttp.ClientSession() as session:
+                return await scraper.fetch_html(session, WINDOW)
+
+    session = MSEStockScraper.create_session(limit_per_host=concurrency) if shared else None
+    try:
+        scrapers = [MSEStockScraper.MSEStockScraper(code, session=session, base_url=base_url) for code in codes]
+        start = time.perf_counter()
+        await asyncio.gather(*(fetch(scraper) for scraper in scrapers for _ in range(windows)))
+        return time.perf_counter() - start
+    finally:
+        if session is not None:
+            await session.close()
+
+
+async def main(args):
+    total = args.issuers * args.windows
+    async with MockMseServer(args.issuers) as server:
+        base_url = f"{server.site_url}/en/stats/symbolhistory"
+        for label, shared in (("session per request", False), ("shared pooled session", True)):
+            elapsed = await run(base_url, server.codes, args.windows, args.concurrency, shared)
+            print(f"{label:>22}: {total} requests in {elapsed:.2f}s ({total / elapsed:,.0f} req/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=50)
+    parser.add_argument('--windows', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
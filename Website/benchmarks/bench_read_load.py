@@ -0,0 +1,121 @@
+"""
+Load test: dashboard read throughput with and without a concurrent scrape.
+
+Builds the synthetic database (synthetic_mse), serves app.py on a local threaded server and hammers
+/fetch_historical_analysis from several client threads with the response cache disabled.
+Runs the load with pooled read-only connections and with a new connection per request
+(max_idle=0), each alone and while a DatabaseWriter keeps rewriting stock_data.
+
+Usage: python benchmarks/bench_read_load.py [--issuers 100] [--years 4] [--clients 8] [--seconds 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+import TechnicalAnalysis  # noqa: E402
+import synthetic_mse  # noqa: E402
+from bench_bulk_writer import load_with_writer  # noqa: E402
+from DatabaseAccess import ConnectionPool  # noqa: E402
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def build_database(db_path, issuers, years):
+    frames = list(synthetic_mse.stock_frames(issuers, years))
+    asyncio.run(load_with_writer(db_path, frames))
+    TechnicalAnalysis.technical_analysis(db_path)
+    return frames
+
+
+def background_scrape(db_path, frames, stop):
+    """Keep upserting the synthetic rows until stopped, like a long-running scrape."""
+    while not stop.is_set():
+        asyncio.run(load_with_writer(db_path, frames[:20]))
+
+
+def client(base_url, issuers, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        issuer = random.choice(issuers)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(
+                    f"{base_url}/fetch_historical_analysis?issuer_code={issuer}&time_period=daily") as response:
+                response.read()
+            latencies.append(time.perf_counter() - start)
+        except (urllib.error.URLError, ConnectionError):
+            errors.append(issuer)
+
+
+def run_load(base_url, issuers, clients, seconds):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=client, args=(base_url, issuers, deadline, latencies, errors))
+               for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def main(args):
+    # Every request should reach SQLite
+    app.response_cache.max_entries = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'load.db')
+        print(f"Building database ({args.issuers} issuers x {args.years:g} years)...")
+        frames = build_database(db_path, args.issuers, args.years)
+        issuers = [issuer_code for issuer_code, _ in frames]
+
+        server = make_server('127.0.0.1', 0, app.app, threaded=True, request_handler=QuietRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        try:
+            for pooled in (False, True):
+                for with_scrape in (False, True):
+                    app.read_pool = ConnectionPool(db_path, max_idle=8 if pooled else 0)
+                    stop = threading.Event()
+                    scraper = threading.Thread(target=background_scrape, args=(db_path, frames, stop))
+                    if with_scrape:
+                        scraper.start()
+
+                    latencies, errors = run_load(base_url, issuers, args.clients, args.seconds)
+
+                    stop.set()
+                    if with_scrape:
+                        scraper.join()
+                    app.read_pool.close()
+
+                    label = f"{'pooled' if pooled else 'connect per request'}{' + scrape' if with_scrape else ''}"
+                    p50, p95 = np.percentile(latencies, [50, 95]) * 1000 if latencies else (0, 0)
+                    print(f"{label:>30}: {len(latencies) / args.seconds:8.1f} req/s   "
+                          f"p50 {p50:6.1f} ms   p95 {p95:6.1f} ms   {len(errors)} errors")
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=100)
+    parser.add_argument('--years', type=float, default=4)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    main(parser.parse_args())
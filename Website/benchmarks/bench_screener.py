@@ -0,0 +1,91 @@
+"""
+Benchmark: a market-wide screen as per-issuer round trips vs. one /screener request.
+
+Builds a synthetic database (synthetic_mse) and analyzes it, then runs a few screens on the
+last daily bar of every issuer: once the way the dashboard would have to, calling
+/fetch_latest_analysis for every issuer and filtering the answers, and once with a single
+/screener request per screen. Checks that both return the same issuers and
+reports the time of each, plus the cost of refreshing latest_snapshot for every issuer.
+
+Usage: python benchmarks/bench_screener.py [--issuers 200] [--years 3] [--repeat 20]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+import DatabaseAccess  # noqa: E402
+import synthetic_mse  # noqa: E402
+import TechnicalAnalysis  # noqa: E402
+from DatabaseAccess import ConnectionPool  # noqa: E402
+
+# Screens as /screener query strings and the same condition on a /fetch_latest_analysis row
+SCREENS = {
+    'rsi_max=30': lambda row: row['RSI'] != "No Data" and row['RSI'] <= 30,
+    'signal=Buy': lambda row: row['Signal'] == 'Buy',
+    'rsi_min=50&signal=Buy': lambda row: row['RSI'] != "No Data" and row['RSI'] >= 50 and row['Signal'] == 'Buy',
+}
+
+
+def per_issuer(client, issuers, matches):
+    found = []
+    for issuer in issuers:
+        rows = client.get(f"/fetch_latest_analysis?issuer_code={issuer}&time_period=daily").json
+        if matches(rows[0]):
+            found.append(issuer)
+    return found
+
+
+def screener(client, query):
+    return [row['issuer_code'] for row in client.get(f"/screener?{query}&limit=1000").json['results']]
+
+
+def timed(repeat, run):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'screener.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            synthetic_mse.populate_database(db_path, args.issuers, args.years)
+            TechnicalAnalysis.technical_analysis(db_path)
+
+        app.read_pool = ConnectionPool(db_path)
+        # Every request should reach SQLite
+        app.response_cache.max_entries = 0
+        client = app.app.test_client()
+        issuers = synthetic_mse.issuer_codes(args.issuers)
+
+        for query, matches in SCREENS.items():
+            loop_time, expected = timed(max(1, args.repeat // 10), lambda: per_issuer(client, issuers, matches))
+            screen_time, found = timed(args.repeat, lambda: screener(client, query))
+            assert found == expected, f"{query}: {found} != {expected}"
+            print(f"{query:>22}: {len(found):4} issuers   {args.issuers} round trips {loop_time * 1000:8.1f} ms   "
+                  f"/screener {screen_time * 1000:6.2f} ms   {loop_time / screen_time:6.0f}x, same issuers")
+        app.read_pool.close()
+
+        conn = DatabaseAccess.connect(db_path)
+        refresh_time, rows = timed(3, lambda: TechnicalAnalysis.refresh_latest_snapshot(conn))
+        conn.rollback()
+        conn.close()
+        print(f"refreshing latest_snapshot: {rows} rows in {refresh_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=200)
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    main(parser.parse_args())
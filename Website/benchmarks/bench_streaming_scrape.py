@@ -0,0 +1,119 @@
+"""
+Benchmark: buffered vs. streaming scrape-to-store pipeline.
+
+Serves synthetic symbol history pages from a MockMseServer (see mock_mse_server.py), then
+backfills every issuer to an empty database through DataScraper, once collecting each
+issuer's full history before writing and once streaming every window through the
+clean -> validate -> write stages. Reports the peak Python heap (tracemalloc) and wall-clock
+time for several backfill depths; the streaming peak should stay flat as the depth grows.
+The rows the scraper reports per issuer must add up to the rows written. Finally a streaming
+run in a child process is killed half way (SIGKILL to its process group, so its parse pool
+dies with it) and the database is checked for gaps: every issuer must have all its trading
+days up to its watermark.
+
+Usage: python benchmarks/bench_streaming_scrape.py [--issuers 10] [--years 5 10 20] [--crash-after 5]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import DataScraper  # noqa: E402
+import DatabaseManager  # noqa: E402
+import synthetic_mse  # noqa: E402
+from mock_mse_server import MockMseServer  # noqa: E402
+
+
+def history_start(years):
+    return date.today() - timedelta(days=365 * years)
+
+
+async def backfill(db_path, site_url, codes, years, streaming):
+    """Backfill every issuer; returns the rows written and the rows reported per issuer."""
+    reported = {}
+    data_scraper = DataScraper.DataScraper(
+        DatabaseManager.DatabaseManager(db_path), parse_workers=1, requests_per_second=1000, burst=100,
+        streaming=streaming, base_url=f"{site_url}/en/stats/symbolhistory",
+        progress_callback=lambda code, done, total, rows: reported.__setitem__(code, rows)
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        await data_scraper.update_data({code: history_start(years) for code in codes})
+    data_scraper.db_manager.close()
+    return data_scraper.writer.rows_written, reported
+
+
+def backfill_process(db_path, site_url, codes, years):
+    # A process group of its own: the crash kills the fork server and parse workers it starts too
+    os.setpgrp()
+    asyncio.run(backfill(db_path, site_url, codes, years, streaming=True))
+
+
+def gaps(db_path, years):
+    """Issuers missing trading days of the synthetic history up to their watermark."""
+    with sqlite3.connect(db_path) as conn:
+        stored = pd.read_sql_query("SELECT issuer_code, \"Date\" FROM stock_data", conn, parse_dates=['Date'])
+        watermarks = dict(conn.execute("SELECT issuer_code, last_date FROM issuer_watermark"))
+    broken = []
+    for issuer_code, dates in stored.groupby('issuer_code')['Date']:
+        expected = synthetic_mse.daily_rows(issuer_code, history_start(years),
+                                            date.fromisoformat(watermarks[issuer_code]))
+        expected = expected.dropna(subset=["Last Trade Price"])['Date']
+        if len(pd.DatetimeIndex(expected).difference(pd.DatetimeIndex(dates))):
+            broken.append(issuer_code)
+    return broken, len(stored)
+
+
+async def main(args):
+    async with MockMseServer(args.issuers) as server:
+        with tempfile.TemporaryDirectory() as tmp:
+            for years in args.years:
+                for label, streaming in (("buffered", False), ("streaming", True)):
+                    db_path = os.path.join(tmp, f"{label}-{years}.db")
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    rows, reported = await backfill(db_path, server.site_url, server.codes, years, streaming)
+                    elapsed = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    assert sum(reported.values()) == rows, f"{label}: reported {sum(reported.values())} rows"
+                    print(f"{years:3} years {label:>10}: {rows:>9,} rows in {elapsed:6.2f}s, "
+                          f"peak heap {peak / 2 ** 20:7.1f} MiB, per-issuer rows add up")
+
+    # Crash: the process running a streaming backfill is killed while windows are still in flight
+    async with MockMseServer(args.issuers, latency=0.05) as server:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'crash.db')
+            process = multiprocessing.get_context('spawn').Process(
+                target=backfill_process, args=(db_path, server.site_url, server.codes, max(args.years))
+            )
+            process.start()
+            await asyncio.sleep(args.crash_after)
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                process.kill()  # Killed before it got its own group
+            await asyncio.to_thread(process.join)
+            broken, stored = gaps(db_path, max(args.years))
+            print(f"Killed after {args.crash_after}s: {stored:,} rows kept, "
+                  f"{len(broken)} issuers with gaps below their watermark")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=10)
+    parser.add_argument('--years', type=int, nargs='+', default=[5, 10, 20])
+    parser.add_argument('--crash-after', type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,118 @@
+"""
+Check the cold import time of the entry points against a budget.
+
+Imports each entry point (app for the Flask server, main for the scraper, TechnicalAnalysis
+for the analysis CLI) in a fresh interpreter with -X importtime, takes the best of a few
+runs, and fails if the cumulative import time of the module is over its budget or if it
+pulled in a heavy dependency it should only load lazily (the read endpoints serve plain
+sqlite3 rows, so app must start without pandas). The slowest imports are listed for every
+entry point so a regression points at its cause.
+
+Budgets are milliseconds on a typical development machine; --scale stretches them on
+slower hosts (CI runners, emulated containers).
+
+Usage: python benchmarks/check_import_time.py [app main TechnicalAnalysis] [--runs 5] [--scale 1.0]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+WEBSITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Cumulative import time allowed per entry point, in milliseconds
+BUDGETS_MS = {
+    'app': 400,
+    'main': 1200,
+    'TechnicalAnalysis': 800,
+}
+
+# Modules an entry point must not import at load time; they are imported where they are used
+LAZY_MODULES = {
+    'app': ['pandas', 'numpy', 'ta', 'bs4', 'aiohttp', 'requests', 'main', 'TechnicalAnalysis'],
+    'main': ['ta', 'requests', 'TechnicalAnalysis'],
+    'TechnicalAnalysis': ['ta', 'aiohttp', 'bs4', 'requests'],
+}
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, depth, cumulative microseconds) for every line of -X importtime output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|', 2)
+        if not cumulative.strip().isdigit():
+            continue  # The header line
+        module = name.lstrip()
+        imports.append((module, (len(name) - len(module) - 1) // 2, int(cumulative)))
+    return imports
+
+
+def import_entry_point(module: str) -> List[Tuple[str, int, int]]:
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=WEBSITE_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.splitlines()[-1]}")
+    return parse_importtime(result.stderr)
+
+
+def measure(module: str, runs: int) -> Tuple[int, List[Tuple[str, int, int]]]:
+    """Best cumulative import time of module in microseconds and the imports of that run."""
+    import_entry_point(module)  # Writes the bytecode caches, as a built image would have them
+    best = None
+    for _ in range(runs):
+        imports = import_entry_point(module)
+        total = next(cumulative for name, depth, cumulative in imports if name == module and depth == 0)
+        if best is None or total < best[0]:
+            best = (total, imports)
+    return best
+
+
+def slowest_children(module: str, imports: List[Tuple[str, int, int]], top: int) -> List[Tuple[str, int]]:
+    """The direct imports of module with the largest cumulative times."""
+    # Children are printed before their parent; the parent's direct children have depth 1 just above it
+    end = max(i for i, (name, depth, _) in enumerate(imports) if name == module and depth == 0)
+    start = end
+    while start > 0 and imports[start - 1][1] > 0:
+        start -= 1
+    children: Dict[str, int] = {name: cumulative for name, depth, cumulative in imports[start:end] if depth == 1}
+    return sorted(children.items(), key=lambda item: -item[1])[:top]
+
+
+def check(module: str, runs: int, scale: float, top: int) -> bool:
+    total, imports = measure(module, runs)
+    budget = BUDGETS_MS[module] * scale
+    loaded = {name for name, _, _ in imports}
+    eager = [name for name in LAZY_MODULES[module] if name in loaded]
+    ok = total / 1000 <= budget and not eager
+
+    print(f"{'  ok' if ok else 'FAIL'}  {module}: {total / 1000:7.1f} ms (budget {budget:.0f} ms)")
+    if eager:
+        print(f"      imports at load time: {', '.join(eager)}")
+    for name, cumulative in slowest_children(module, imports, top):
+        print(f"      {cumulative / 1000:7.1f} ms  {name}")
+    return ok
+
+
+def main(args):
+    results = [check(module, args.runs, args.scale, args.top) for module in args.modules or BUDGETS_MS]
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('modules', nargs='*', metavar='MODULE',
+                        help=f"entry points to check (default: {', '.join(BUDGETS_MS)})")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+    unknown = [module for module in args.modules if module not in BUDGETS_MS]
+    if unknown:
+        parser.error(f"no budget for {', '.join(unknown)}")
+    main(args)
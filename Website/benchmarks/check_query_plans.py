@@ -0,0 +1,64 @@
+"""
+Check that the Flask read endpoints are answered from indexes.
+
+Builds a small database with the production schema, runs EXPLAIN QUERY PLAN for every
+dashboard query in app.py and fails (exit code 1) if a plan scans stock_prices,
+technical_indicators or latest_snapshot, or sorts through a temporary b-tree.
+
+Usage: python benchmarks/check_query_plans.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+import DatabaseManager  # noqa: E402
+import TechnicalAnalysis  # noqa: E402
+
+# Plan fragments that mean the query cost grows with the table size
+FORBIDDEN = ('SCAN stock_prices', 'SCAN technical_indicators', 'SCAN latest_snapshot', 'USE TEMP B-TREE')
+
+QUERIES = {
+    '/get_issuer_codes': (app.ISSUER_CODES_QUERY, ()),
+    '/fetch_latest_analysis': (app.LATEST_ANALYSIS_QUERY, ('ALK', 'daily')),
+    '/fetch_historical_analysis': (app.HISTORICAL_ANALYSIS_QUERY, ('ALK', 'daily')),
+    '/historical_analysis': (app.history_query(app.INDICATOR_FIELDS, 'desc'), ('ALK', 'daily', 500)),
+    '/historical_analysis?from&to&cursor': (
+        app.history_query(app.INDICATOR_FIELDS, 'desc', True, True, True),
+        ('ALK', 'daily', '2020-01-01', '2021-01-01', '2020-06-30 00:00:00', 500)
+    ),
+    '/historical_analysis?order=asc&fields&cursor': (
+        app.history_query(['RSI'], 'asc', after=True), ('ALK', 'daily', '2020-06-30 00:00:00', 500)
+    ),
+    '/screener?rsi_max&signal': (app.screener_query([('RSI', '<=')], 1), ('daily', 30, 'Buy', 100)),
+}
+
+
+def build_database(db_path):
+    DatabaseManager.DatabaseManager(db_path).close()
+    with sqlite3.connect(db_path) as conn:
+        TechnicalAnalysis.ensure_indicator_schema(conn)
+        TechnicalAnalysis.ensure_snapshot_schema(conn)
+
+
+def check(db_path):
+    failures = []
+    with sqlite3.connect(db_path) as conn:
+        for endpoint, (query, params) in QUERIES.items():
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+            bad = [detail for detail in plan if detail.startswith(FORBIDDEN)]
+            print(f"{'FAIL' if bad else 'ok':>4}  {endpoint}: {'; '.join(plan)}")
+            if bad:
+                failures.append(endpoint)
+    return failures
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'plans.db')
+        build_database(path)
+        failed = check(path)
+    sys.exit(1 if failed else 0)
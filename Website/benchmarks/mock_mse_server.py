@@ -0,0 +1,138 @@
+"""
+Local aiohttp stand-in for the parts of www.mse.mk the pipeline uses.
+
+Serves /en/stats/symbolhistory/{code} (the symbol dropdown plus the resultsTable rows of
+the FromDate..ToDate window, or of the last 30 days without a window) and the two listing
+pages main.py races against the dropdown, all from synthetic_mse. Every response can be
+delayed (latency plus uniform jitter) and a share of them answered with 503, which the
+scraper retries; both are drawn from a seeded generator so runs are repeatable. Pages carry
+an ETag and a matching If-None-Match is answered with 304, for the HTTP cache.
+
+Point the pipeline at it with main.run_pipeline(site_url=server.site_url), or run it on its
+own for manual testing.
+
+Usage: python benchmarks/mock_mse_server.py [--port 8080] [--issuers 50] [--latency 0.05] [--error-rate 0.02]
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import random
+from datetime import date, timedelta
+
+from aiohttp import web
+
+import synthetic_mse
+
+# Days listed on a symbol history page requested without a date window
+DEFAULT_WINDOW_DAYS = 30
+
+# Symbol history pages kept after building them; retries and re-runs ask for the same windows
+PAGE_CACHE_SIZE = 1024
+
+
+class MockMseServer:
+
+    def __init__(self, issuers: int = 50, seed: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0):
+        self.codes = synthetic_mse.issuer_codes(issuers)
+        self.dropdown_codes = self.codes + synthetic_mse.bond_codes(max(1, issuers // synthetic_mse.BONDS_PER_ISSUERS))
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.history_page = functools.lru_cache(maxsize=PAGE_CACHE_SIZE)(self.build_history_page)
+        self.runner = None
+        self.site_url = None
+        # Traffic counters
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+
+    async def respond(self, request, build):
+        """Delay, fail or send the page (bytes) returned by build(); answers a matching If-None-Match with 304."""
+        self.requests += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        failed = self.random.random() < self.error_rate
+        if delay:
+            await asyncio.sleep(delay)
+        if failed:
+            self.errors += 1
+            return web.Response(status=503, text="Service Unavailable")
+        body = build()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if request.headers.get('If-None-Match') == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        self.bytes_sent += len(body)
+        return web.Response(body=body, content_type='text/html', charset='utf-8', headers={'ETag': etag})
+
+    def build_history_page(self, code: str, start: date, end: date) -> bytes:
+        # Unknown codes get the page without rows, like the real site
+        rows = synthetic_mse.daily_rows(code, start, min(end, date.today()), self.seed)
+        if code not in self.codes:
+            rows = rows.iloc[:0]
+        return synthetic_mse.results_table_html(code, rows, self.dropdown_codes).encode('utf-8')
+
+    async def symbol_history(self, request):
+        code = request.match_info['code']
+        try:
+            end = date.fromisoformat(request.query['ToDate']) if 'ToDate' in request.query else date.today()
+            start = (date.fromisoformat(request.query['FromDate']) if 'FromDate' in request.query
+                     else end - timedelta(days=DEFAULT_WINDOW_DAYS))
+        except ValueError:
+            raise web.HTTPBadRequest(text="Invalid date")
+
+        return await self.respond(request, lambda: self.history_page(code, start, end))
+
+    async def shares_listing(self, request):
+        # Two thirds of the issuers are on the official market, the rest (and a few of those) on the free market
+        official = self.codes[:len(self.codes) * 2 // 3 + 1]
+        return await self.respond(request, lambda: synthetic_mse.listing_html(official).encode('utf-8'))
+
+    async def free_market(self, request):
+        free = self.codes[len(self.codes) * 2 // 3 - 1:]
+        return await self.respond(request, lambda: synthetic_mse.listing_html(free).encode('utf-8'))
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/en/stats/symbolhistory/{code}', self.symbol_history)
+        app.router.add_get('/en/issuers/shares-listing', self.shares_listing)
+        app.router.add_get('/en/issuers/free-market', self.free_market)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Start serving (on a free port by default) and return the site URL."""
+        self.runner = web.AppRunner(self.application(), access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        self.site_url = f"http://{host}:{self.runner.addresses[0][1]}"
+        return self.site_url
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--issuers', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockMseServer(args.issuers, args.seed, args.latency, args.jitter, args.error_rate)
+    web.run_app(server.application(), host='127.0.0.1', port=args.port)
@@ -0,0 +1,375 @@
+"""
+Offline benchmark suite: every pipeline stage against synthetic data and a mock mse.mk.
+
+Runs without network access or an existing mse_stocks.db. A MockMseServer (see
+mock_mse_server.py) serves synthetic_mse pages with the configured latency and error rate,
+and the stages are timed on temporary databases:
+
+  discover              issuer code discovery, dropdown raced against the listing pages
+  scrape                DataScraper backfilling every issuer for --years into an empty database
+  save                  DatabaseWriter storing the same rows without the network
+  analysis              full TechnicalAnalysis run
+  analysis_first        incremental TechnicalAnalysis run on a database never analyzed before
+                        (the dashboard's first Run Analysis), checked against a full run
+  analysis_incremental  incremental TechnicalAnalysis run after one more week of prices,
+                        checked against a full run over the same prices
+  endpoint <path>       Flask read endpoints through the test client, response cache disabled
+  pipeline              main.run_pipeline end to end (ten-year backfill of every issuer)
+
+Each benchmark is repeated --repeat times and reports the median seconds (per request for the
+endpoints). The results are written as JSON to --output; with --baseline a previous results
+file is compared and the exit code is 1 when a benchmark got slower than the tolerance allows.
+
+Usage: python benchmarks/run_benchmarks.py [--issuers 20] [--years 3] [--latency 0.01] [--error-rate 0]
+           [--repeat 3] [--only scrape analysis] [--output benchmark_results.json]
+           [--baseline old.json] [--tolerance 0.25]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+import DatabaseManager  # noqa: E402
+import DataScraper  # noqa: E402
+import HttpCache  # noqa: E402
+import IssuerCodeExtractor  # noqa: E402
+import main as pipeline  # noqa: E402
+import Metrics  # noqa: E402
+import MSEStockScraper  # noqa: E402
+import synthetic_mse  # noqa: E402
+import TechnicalAnalysis  # noqa: E402
+from bench_bulk_writer import load_with_writer  # noqa: E402
+from DatabaseAccess import ConnectionPool  # noqa: E402
+from mock_mse_server import MockMseServer  # noqa: E402
+from Strategies import DropdownIssuerCodeStrategy, TableIssuerCodeStrategy  # noqa: E402
+
+BENCHMARKS = ['discover', 'scrape', 'save', 'analysis', 'endpoints', 'pipeline']
+
+# Days of prices added before the incremental analysis run
+INCREMENTAL_DAYS = 7
+
+# Largest relative difference allowed between incremental and full indicator values; the
+# warm-up window leaves the EMAs a few 1e-8 away from a run over the whole history
+INCREMENTAL_TOLERANCE = 1e-6
+
+
+def result(runs, **fields):
+    return {'seconds': round(statistics.median(runs), 6), 'runs': [round(run, 6) for run in runs], **fields}
+
+
+def quiet():
+    """The stages print progress for every issuer; benchmarks only report their results."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+async def bench_discover(server, args):
+    runs = []
+    for _ in range(args.repeat):
+        extractor = IssuerCodeExtractor.IssuerCodeExtractor(
+            DropdownIssuerCodeStrategy(f"{server.site_url}/en/stats/symbolhistory/ADIN"))
+        racers = [TableIssuerCodeStrategy([server.site_url + path for path in pipeline.LISTING_PATHS])]
+        async with MSEStockScraper.create_session() as session:
+            start = time.perf_counter()
+            with quiet():
+                codes = await extractor.get_issuer_codes_async(session, racers)
+            runs.append(time.perf_counter() - start)
+    return {'discover': result(runs, codes=len(codes))}
+
+
+async def bench_scrape(server, args, tmp):
+    runs = []
+    start_date = synthetic_mse.history_start(args.years)
+    for attempt in range(args.repeat):
+        db_manager = DatabaseManager.DatabaseManager(os.path.join(tmp, f"scrape-{attempt}.db"))
+        scraper = DataScraper.DataScraper(db_manager, requests_per_second=args.requests_per_second, burst=100,
+                                          base_url=f"{server.site_url}/en/stats/symbolhistory")
+        requests_before, errors_before = server.requests, server.errors
+        start = time.perf_counter()
+        with quiet():
+            await scraper.update_data({code: start_date for code in server.codes})
+        runs.append(time.perf_counter() - start)
+        db_manager.close()
+        if scraper.errors:
+            raise RuntimeError(scraper.errors[0])
+    rows = scraper.writer.rows_written
+    return {'scrape': result(runs, rows=rows, rows_per_second=round(rows / statistics.median(runs)),
+                             requests=server.requests - requests_before, server_errors=server.errors - errors_before)}
+
+
+async def bench_save(args, tmp):
+    frames = list(synthetic_mse.stock_frames(args.issuers, args.years))
+    rows = sum(len(df) for _, df in frames)
+    runs = []
+    for attempt in range(args.repeat):
+        with quiet():
+            runs.append(await load_with_writer(os.path.join(tmp, f"save-{attempt}.db"), frames))
+    return {'save': result(runs, rows=rows, rows_per_second=round(rows / statistics.median(runs)))}
+
+
+def prices_database(args, tmp):
+    """Database with prices up to INCREMENTAL_DAYS ago and no indicators; built once."""
+    db_path = os.path.join(tmp, 'prices.db')
+    if not os.path.exists(db_path):
+        with quiet():
+            synthetic_mse.populate_database(db_path, args.issuers, args.years,
+                                            end=date.today() - timedelta(days=INCREMENTAL_DAYS))
+    return db_path
+
+
+def analyzed_database(args, tmp):
+    """prices_database with its indicators; built once."""
+    db_path = os.path.join(tmp, 'analyzed.db')
+    if not os.path.exists(db_path):
+        shutil.copyfile(prices_database(args, tmp), db_path)
+        with quiet():
+            TechnicalAnalysis.technical_analysis(db_path)
+    return db_path
+
+
+def indicator_difference(db_path, reference_path):
+    """
+    Largest relative difference between the technical_indicators of two databases; raises if
+    they have different bars, signals or missing values.
+    """
+    query = 'SELECT * FROM technical_indicators ORDER BY issuer_code, time_period, "Date"'
+    tables = []
+    for path in (db_path, reference_path):
+        with contextlib.closing(sqlite3.connect(path)) as conn:
+            tables.append(pd.read_sql_query(query, conn))
+    indicators, reference = tables
+    keys = ['issuer_code', 'time_period', 'Date', 'Signal']
+    if not indicators[keys].equals(reference[keys]):
+        raise RuntimeError("incremental analysis has other bars or signals than a full run")
+    values = indicators.drop(columns=keys).to_numpy(dtype=float)
+    expected = reference.drop(columns=keys).to_numpy(dtype=float)
+    if not np.array_equal(np.isnan(values), np.isnan(expected)):
+        raise RuntimeError("incremental analysis has missing values where a full run has none, or vice versa")
+    difference = np.nan_to_num(np.abs(values - expected) / np.maximum(np.abs(expected), 1))
+    return float(difference.max()) if difference.size else 0.0
+
+
+def bench_analysis(args, tmp):
+    base_path = analyzed_database(args, tmp)
+    full_runs, first_runs, incremental_runs = [], [], []
+    for attempt in range(args.repeat):
+        # Without indicators an incremental run analyzes every issuer's whole history
+        db_path = os.path.join(tmp, f"analysis-first-{attempt}.db")
+        shutil.copyfile(prices_database(args, tmp), db_path)
+        start = time.perf_counter()
+        with quiet():
+            first_rows = TechnicalAnalysis.technical_analysis(db_path, incremental=True)
+        first_runs.append(time.perf_counter() - start)
+        first_difference = indicator_difference(db_path, base_path)
+        if first_difference > INCREMENTAL_TOLERANCE:
+            raise RuntimeError(f"first incremental indicators differ from a full run by up to {first_difference:.2e}")
+
+        db_path = os.path.join(tmp, f"analysis-{attempt}.db")
+        shutil.copyfile(base_path, db_path)
+        start = time.perf_counter()
+        with quiet():
+            full_rows = TechnicalAnalysis.technical_analysis(db_path)
+        full_runs.append(time.perf_counter() - start)
+
+        # The week between the analyzed history and today arrives
+        db_manager = DatabaseManager.DatabaseManager(db_path)
+        first_new_day = date.today() - timedelta(days=INCREMENTAL_DAYS - 1)
+        for issuer_code in synthetic_mse.issuer_codes(args.issuers):
+            rows = synthetic_mse.daily_rows(issuer_code, first_new_day, date.today())
+            rows = rows.dropna(subset=["Last Trade Price"])[synthetic_mse.STOCK_COLUMNS]
+            db_manager.write_rows(db_manager.prepare_rows(rows, issuer_code))
+        db_manager.close()
+
+        start = time.perf_counter()
+        with quiet():
+            incremental_rows = TechnicalAnalysis.technical_analysis(db_path, incremental=True)
+        incremental_runs.append(time.perf_counter() - start)
+
+    reference_path = os.path.join(tmp, 'analysis-reference.db')
+    shutil.copyfile(db_path, reference_path)
+    with quiet():
+        TechnicalAnalysis.technical_analysis(reference_path)
+    difference = indicator_difference(db_path, reference_path)
+    if difference > INCREMENTAL_TOLERANCE:
+        raise RuntimeError(f"incremental indicators differ from a full run by up to {difference:.2e}")
+    return {
+        'analysis': result(full_runs, rows=full_rows),
+        'analysis_first': result(first_runs, rows=first_rows, max_difference=first_difference),
+        'analysis_incremental': result(incremental_runs, rows=incremental_rows, max_difference=difference),
+    }
+
+
+def bench_endpoints(args, tmp):
+    db_path = analyzed_database(args, tmp)
+    app.read_pool = ConnectionPool(db_path)
+    # Every request should reach SQLite
+    app.response_cache.max_entries = 0
+    client = app.app.test_client()
+
+    codes = synthetic_mse.issuer_codes(args.issuers)
+    paths = {
+        '/get_issuer_codes': lambda i: '/get_issuer_codes',
+        '/fetch_latest_analysis': lambda i: (f"/fetch_latest_analysis?issuer_code={codes[i % len(codes)]}"
+                                             f"&time_period={TechnicalAnalysis.PERIODS[i % 3]}"),
+        '/fetch_historical_analysis': lambda i: (f"/fetch_historical_analysis?issuer_code={codes[i % len(codes)]}"
+                                                 f"&time_period={TechnicalAnalysis.PERIODS[i % 3]}"),
+        '/metrics': lambda i: '/metrics',
+    }
+    results = {}
+    try:
+        for endpoint, path in paths.items():
+            latencies = []
+            for i in range(args.requests):
+                start = time.perf_counter()
+                response = client.get(path(i))
+                response.get_data()
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path(i)} answered {response.status_code}")
+            quantiles = statistics.quantiles(latencies, n=20)
+            results[f"endpoint {endpoint}"] = {
+                'seconds': round(statistics.median(latencies), 6), 'requests': args.requests,
+                'p95_seconds': round(quantiles[18], 6), 'requests_per_second': round(len(latencies) / sum(latencies)),
+            }
+    finally:
+        app.read_pool.close()
+    return results
+
+
+async def bench_pipeline(server, args, tmp):
+    # Nothing may leak into the working directory: no page cache, run summary in tmp
+    HttpCache.HTTP_CACHE_PATH = ''
+    Metrics.RUN_SUMMARY_PATH = os.path.join(tmp, 'run_summary.json')
+    runs = []
+    for attempt in range(args.repeat):
+        requests_before = server.requests
+        start = time.perf_counter()
+        with quiet():
+            rows = await pipeline.run_pipeline(os.path.join(tmp, f"pipeline-{attempt}.db"), site_url=server.site_url,
+                                               requests_per_second=args.requests_per_second, burst=100)
+        runs.append(time.perf_counter() - start)
+    return {'pipeline': result(runs, rows=rows, requests=server.requests - requests_before)}
+
+
+async def run_suite(args):
+    results = {}
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp:
+        async with MockMseServer(args.issuers, args.seed, args.latency, args.jitter, args.error_rate) as server:
+            stages = {
+                'discover': lambda: bench_discover(server, args),
+                'scrape': lambda: bench_scrape(server, args, tmp),
+                'save': lambda: bench_save(args, tmp),
+                'analysis': lambda: asyncio.to_thread(bench_analysis, args, tmp),
+                'endpoints': lambda: asyncio.to_thread(bench_endpoints, args, tmp),
+                'pipeline': lambda: bench_pipeline(server, args, tmp),
+            }
+            for name in args.only or BENCHMARKS:
+                try:
+                    stage_results = await stages[name]()
+                except Exception as e:
+                    failed.append(name)
+                    stage_results = {name: {'error': str(e)}}
+                for benchmark, values in stage_results.items():
+                    results[benchmark] = values
+                    print_result(benchmark, values)
+    return results, failed
+
+
+def print_result(name, values):
+    if 'error' in values:
+        print(f"{name:>34}: FAILED {values['error']}")
+        return
+    extras = '   '.join(f"{key} {value:,}" for key, value in values.items()
+                        if key not in ('seconds', 'runs') and isinstance(value, (int, float)))
+    print(f"{name:>34}: {values['seconds'] * 1000:10.1f} ms   {extras}")
+
+
+def compare(results, baseline, tolerance):
+    """Print the change of every benchmark against the baseline; returns the ones that regressed."""
+    regressions = []
+    print(f"\nCompared with the baseline of {baseline.get('created_at')} (tolerance {tolerance:.0%}):")
+    for name, values in results.items():
+        before = baseline.get('results', {}).get(name, {})
+        if 'seconds' not in values or 'seconds' not in before:
+            continue
+        ratio = values['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        regressed = ratio > 1 + tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"{name:>34}: {before['seconds'] * 1000:10.1f} ms -> {values['seconds'] * 1000:10.1f} ms   "
+              f"{ratio:5.2f}x{'   REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    print(f"Synthetic market: {args.issuers} issuers x {args.years} years, latency {args.latency}s "
+          f"(+{args.jitter}s jitter), error rate {args.error_rate:.0%}\n")
+    results, failed = asyncio.run(run_suite(args))
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'tolerance')}
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': config,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print("Warning: the baseline was run with a different configuration")
+        regressions = compare(results, baseline, args.tolerance)
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issuers', type=int, default=20)
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.01, help="seconds the mock server waits per response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra random delay of up to this many seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of responses answered with 503")
+    parser.add_argument('--requests-per-second', type=float, default=1000,
+                        help="scraper rate limit (the default keeps the limiter out of the way)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=200, help="requests per Flask endpoint")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="previous results file to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the baseline before failing (0.25 = 25%%)")
+    sys.exit(main(parser.parse_args()))
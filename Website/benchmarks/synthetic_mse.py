@@ -0,0 +1,213 @@
+"""
+Deterministic synthetic Macedonian Stock Exchange data for the benchmarks.
+
+Every value is a pure function of (seed, issuer code, day): prices follow two slow cycles
+plus daily noise around an issuer-specific level, and illiquid issuers skip many weekdays.
+Any date window therefore yields the same rows no matter how the history is split into
+requests, so the mock server (see mock_mse_server.py), the stock_data frames and databases
+built here all agree with each other and across runs. Every benchmark builds its data here,
+so their numbers are comparable.
+
+Pages mimic www.mse.mk: the symbol history page has the symbol dropdown (select#Code, with
+bond codes that the issuer filter drops) and table#resultsTable with English formatted
+numbers, newest day first; the listing pages have table#otherlisting-table.
+"""
+import html
+import os
+import sys
+import zlib
+from datetime import date, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import DatabaseManager  # noqa: E402
+
+# Symbol history columns in the order of the resultsTable cells (see MSEStockScraper)
+RESULT_COLUMNS = [
+    "Date", "Last Trade Price", "Max", "Min", "Avg. Price", "%chg.", "Volume",
+    "Turnover in BEST (denars)", "Total turnover (denars)"
+]
+
+# Columns of the stored stock_data rows
+STOCK_COLUMNS = ["Date", "Last Trade Price", "Max", "Min", "Volume", "Turnover in BEST (denars)"]
+
+# Share of non-trading weekdays still listed with empty prices (the scraper drops them)
+EMPTY_ROW_RATE = 0.05
+
+# One bond-like code (containing digits) in the dropdown per this many issuers
+BONDS_PER_ISSUERS = 10
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def issuer_codes(count: int) -> List[str]:
+    """count distinct letter-only issuer codes (BAB, BAC, ...), the same for every run."""
+    codes = []
+    for number in range(1, count + 1):
+        letters = ''
+        number += 26 ** 2  # Three letters at least, like most MSE codes
+        while number:
+            number, letter = divmod(number, 26)
+            letters = chr(ord('A') + letter) + letters
+        codes.append(letters)
+    return codes
+
+
+def bond_codes(count: int) -> List[str]:
+    """Codes of bonds and other instruments listed in the dropdown; they contain digits."""
+    return [f"RMDEN{number:02d}" for number in range(count)]
+
+
+def issuer_key(issuer_code: str, seed: int = 0) -> int:
+    return zlib.crc32(f"{seed}:{issuer_code}".encode())
+
+
+def uniform(key: int, days: np.ndarray, stream: int) -> np.ndarray:
+    """Uniform [0, 1) values hashed from (key, day, stream) with splitmix64; no state involved."""
+    salt = np.uint64(((key << 8) | stream) * 0xBF58476D1CE4E5B9 % 2 ** 64)
+    x = days.astype(np.uint64) * _GOLDEN ^ salt
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+class IssuerModel:
+    """Price level, cycles and liquidity of one synthetic issuer."""
+
+    def __init__(self, issuer_code: str, seed: int = 0):
+        self.key = issuer_key(issuer_code, seed)
+        rng = np.random.default_rng(self.key)
+        self.level = 100 * 10 ** rng.uniform(0, 2.5)  # 100 to ~30,000 denars
+        self.long_period, self.short_period = rng.uniform(200, 900), rng.uniform(20, 80)
+        self.long_amplitude, self.short_amplitude = rng.uniform(0.1, 0.4), rng.uniform(0.02, 0.08)
+        self.long_phase, self.short_phase = rng.uniform(0, 2 * np.pi, 2)
+        self.liquidity = rng.uniform(0.3, 1.0)  # Share of weekdays with trades
+
+    def price(self, days: np.ndarray) -> np.ndarray:
+        cycles = ((1 + self.long_amplitude * np.sin(2 * np.pi * days / self.long_period + self.long_phase))
+                  * (1 + self.short_amplitude * np.sin(2 * np.pi * days / self.short_period + self.short_phase)))
+        noise = 1 + 0.02 * (uniform(self.key, days, 0) - 0.5)
+        return np.round(self.level * cycles * noise, 2)
+
+
+def daily_rows(issuer_code: str, start: date, end: date, seed: int = 0) -> pd.DataFrame:
+    """
+    Symbol history rows of one issuer between start and end (inclusive), oldest first, with the
+    RESULT_COLUMNS as numbers (Date as datetime64). Rows of days without trades have no prices.
+    """
+    model = IssuerModel(issuer_code, seed)
+    first, last = (np.datetime64(day, 'D').astype(np.int64) for day in (start, end))
+    days = np.arange(first, last + 1, dtype=np.int64)
+    days = days[(days + 3) % 7 < 5]  # Epoch day 0 was a Thursday; keep Monday..Friday
+
+    traded = uniform(model.key, days, 1) < model.liquidity
+    listed = traded | (uniform(model.key, days, 2) < EMPTY_ROW_RATE)
+    days, traded = days[listed], traded[listed]
+
+    price = model.price(days)
+    high = np.round(price * (1 + 0.02 * uniform(model.key, days, 3)), 2)
+    low = np.round(price * (1 - 0.02 * uniform(model.key, days, 4)), 2)
+    average = np.round((high + low + price) / 3, 2)
+    change = np.round((price / model.price(days - 1) - 1) * 100, 2)
+    volume = np.floor(10 ** (1 + 2.5 * uniform(model.key, days, 5)))
+    turnover = np.round(volume * average)
+    # Block trades add to the total turnover only
+    block = uniform(model.key, days, 6) < 0.1
+    total_turnover = turnover + np.where(block, np.round(turnover * 5 * uniform(model.key, days, 7)), 0)
+
+    rows = pd.DataFrame({
+        "Date": days.astype('datetime64[D]').astype('datetime64[ns]'),
+        "Last Trade Price": price, "Max": high, "Min": low, "Avg. Price": average, "%chg.": change,
+        "Volume": volume, "Turnover in BEST (denars)": turnover, "Total turnover (denars)": total_turnover,
+    })
+    rows.loc[~traded, ["Last Trade Price", "Max", "Min", "Avg. Price", "%chg."]] = np.nan
+    rows.loc[~traded, ["Volume", "Turnover in BEST (denars)", "Total turnover (denars)"]] = 0.0
+    return rows
+
+
+def format_cell(value, decimals: int) -> str:
+    if value != value:  # NaN
+        return ''
+    return f"{value:,.{decimals}f}"
+
+
+def results_table_html(issuer_code: str, rows: pd.DataFrame, codes: List[str]) -> str:
+    """A symbol history page: the symbol dropdown listing codes and the rows, newest first."""
+    options = ''.join(f'<option value="{html.escape(code)}">{html.escape(code)}</option>' for code in codes)
+    header = ''.join(f"<th>{html.escape(column)}</th>" for column in RESULT_COLUMNS)
+    dates = rows["Date"].dt
+    cells = zip(
+        (f"{month}/{day}/{year}" for month, day, year in zip(dates.month, dates.day, dates.year)),
+        *([format_cell(value, 2) for value in rows[column]]
+          for column in ("Last Trade Price", "Max", "Min", "Avg. Price", "%chg.")),
+        *([format_cell(value, 0) for value in rows[column]]
+          for column in ("Volume", "Turnover in BEST (denars)", "Total turnover (denars)")),
+    )
+    body = ''.join('<tr>' + ''.join(f"<td>{cell}</td>" for cell in row) + '</tr>' for row in reversed(list(cells)))
+    return (
+        f"<!DOCTYPE html><html><head><title>Symbol history - {html.escape(issuer_code)}</title></head><body>"
+        f'<form method="get"><select id="Code" name="Code"><option value="">Select</option>{options}</select>'
+        f'<input type="date" name="FromDate"><input type="date" name="ToDate"></form>'
+        f'<table id="resultsTable" class="table"><thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>'
+        f"</body></html>"
+    )
+
+
+def listing_html(codes: List[str]) -> str:
+    """A listing page (shares or free market) with one code per row of table#otherlisting-table."""
+    rows = ''.join(f"<tr><td>{html.escape(code)}</td><td>{html.escape(code)} AD Skopje</td></tr>"
+                   for code in codes)
+    return (
+        "<!DOCTYPE html><html><body><table id=\"otherlisting-table\">"
+        f"<thead><tr><th>Symbol</th><th>Issuer</th></tr></thead><tbody>{rows}</tbody></table></body></html>"
+    )
+
+
+def history_start(years: float, end: Optional[date] = None) -> date:
+    return (end or date.today()) - timedelta(days=round(365 * years))
+
+
+def stock_frames(issuers: int, years: float, end: Optional[date] = None, seed: int = 0,
+                 empty_rows: bool = False) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    (issuer_code, DataFrame) pairs as the scraper hands them to DatabaseWriter: traded days only,
+    unless empty_rows also keeps the listed days without prices (as databases written before
+    the scraper dropped them have).
+    """
+    end = end or date.today()
+    start = history_start(years, end)
+    for issuer_code in issuer_codes(issuers):
+        rows = daily_rows(issuer_code, start, end, seed)
+        if not empty_rows:
+            rows = rows.dropna(subset=["Last Trade Price", "Max", "Min"])
+        rows = rows[STOCK_COLUMNS].copy()
+        rows["Date"] = rows["Date"].dt.date
+        yield issuer_code, rows.reset_index(drop=True)
+
+
+def stock_data(issuers: int, years: float, end: Optional[date] = None, seed: int = 0,
+               empty_rows: bool = False) -> pd.DataFrame:
+    """All stock_frames in one frame with an issuer_code column, as TechnicalAnalysis.load_stock_data returns them."""
+    data = pd.concat([rows.assign(issuer_code=issuer_code)
+                      for issuer_code, rows in stock_frames(issuers, years, end, seed, empty_rows)], ignore_index=True)
+    data = data[["issuer_code", *STOCK_COLUMNS]]
+    data["Date"] = pd.to_datetime(data["Date"])
+    return data
+
+
+def populate_database(db_path: str, issuers: int, years: float, end: Optional[date] = None, seed: int = 0) -> int:
+    """Write the synthetic history of every issuer into db_path; returns the rows written."""
+    db_manager = DatabaseManager.DatabaseManager(db_path)
+    rows_written = 0
+    try:
+        for issuer_code, rows in stock_frames(issuers, years, end, seed):
+            db_manager.write_rows(db_manager.prepare_rows(rows, issuer_code))
+            rows_written += len(rows)
+    finally:
+        db_manager.close()
+    return rows_written
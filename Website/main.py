@@ -2,35 +2,97 @@ import IssuerCodeExtractor
 from Strategies import *
 import DatabaseManager
 import DataScraper
+import HttpCache
+import Metrics
+import MSEStockScraper
+from DatabaseAccess import DATABASE_PATH
 import asyncio
+import time
 
+# Root of the exchange website (benchmarks point the pipeline at a local mock server)
+SITE_URL = "https://www.mse.mk"
 
-async def main():
-    try:
+# Listing pages raced against the dropdown when discovering issuer codes
+LISTING_PATHS = [
+    "/en/issuers/shares-listing",
+    "/en/issuers/free-market",
+]
+
+
+async def run_pipeline(db_path=DATABASE_PATH, report=None, site_url=SITE_URL, **scraper_options):
+    """
+    Scrape every issuer that has missing data into db_path and return the number of rows saved.
+    report(**fields) is called with the current phase and progress (see JobRunner.Job).
+    scraper_options are passed on to DataScraper (e.g. requests_per_second).
+    A JSON summary of the run's metrics is written to Metrics.RUN_SUMMARY_PATH.
+    """
+    report = report or (lambda **fields: None)
+    metrics_before = Metrics.REGISTRY.snapshot()
+    started_at = time.time()
+    status = 'failed'
+
+    # Pages already downloaded by earlier runs are revalidated or reused instead of downloaded again
+    http_cache = HttpCache.open_cache()
+
+    # The dropdown is the primary strategy; the listing tables race it and win if it's slow or failing
+    strategy = DropdownIssuerCodeStrategy(f"{site_url}/en/stats/symbolhistory/ADIN", http_cache)
+    racers = [TableIssuerCodeStrategy([site_url + path for path in LISTING_PATHS], http_cache)]
 
-        # Strategy can be selected in runtime but for the current requirements there's no need
-        strategy = DropdownIssuerCodeStrategy("https://www.mse.mk/en/stats/symbolhistory/ADIN")
+    rows_saved = 0
 
-        first_pipe = IssuerCodeExtractor.IssuerCodeExtractor(strategy)
-        second_pipe = DatabaseManager.DatabaseManager()
-        third_pipe = DataScraper.DataScraper(second_pipe)
+    def on_issuer_done(issuer_code, issuers_done, issuers_total, rows):
+        nonlocal rows_saved
+        rows_saved += rows
+        report(issuers_done=issuers_done, issuers_total=issuers_total, rows_written=rows_saved)
 
-        print("Getting issuer codes...")
-        issuer_codes = first_pipe.get_issuer_codes()
+    first_pipe = IssuerCodeExtractor.IssuerCodeExtractor(strategy)
+    second_pipe = DatabaseManager.DatabaseManager(db_path)
+    third_pipe = DataScraper.DataScraper(second_pipe, progress_callback=on_issuer_done, http_cache=http_cache,
+                                         base_url=f"{site_url}/en/stats/symbolhistory", **scraper_options)
+
+    try:
+        # Issuer discovery (network) and the watermark lookup (database) run at the same time
+        print("Getting issuer codes and checking data currency...")
+        report(phase='getting issuer codes')
+        with Metrics.PHASE_SECONDS.time(phase='discover issuers'):
+            async with MSEStockScraper.create_session() as session:
+                issuer_codes, last_dates = await asyncio.gather(
+                    first_pipe.get_issuer_codes_async(session, racers),
+                    asyncio.to_thread(second_pipe.get_last_dates)
+                )
         print(f"Found {len(issuer_codes)} valid issuer codes\n")
 
-        print("Checking data currency...")
-        update_info = second_pipe.check_data_currency(issuer_codes)
+        report(phase='checking data currency')
+        update_info = second_pipe.check_data_currency(issuer_codes, last_dates)
         print(f"{len(update_info)} issuers need updating\n")
 
         if update_info:
             print("Starting data update...\n")
-            await third_pipe.update_data(update_info=update_info)
+            report(phase='scraping', issuers_total=len(update_info))
+            with Metrics.PHASE_SECONDS.time(phase='scrape'):
+                await third_pipe.update_data(update_info=update_info)
             print("\nData update completed\n")
+            if http_cache is not None:
+                print(f"HTTP cache: {http_cache.hits} pages reused, {http_cache.misses} downloaded\n")
         else:
             print("All data is up to date")
+        status = 'succeeded'
+    finally:
+        second_pipe.close()
+        try:
+            summary = Metrics.write_run_summary(Metrics.RUN_SUMMARY_PATH, metrics_before, started_at, status=status,
+                                                rows_saved=rows_saved, errors=len(third_pipe.errors))
+            if summary is not None:
+                print(f"Run summary written to {Metrics.RUN_SUMMARY_PATH}")
+        except OSError as e:
+            print(f"Could not write the run summary: {str(e)}")
+
+    return rows_saved
 
 
+async def main():
+    try:
+        await run_pipeline()
     except Exception as e:
         print(f"An error occurred: {str(e)}")
 